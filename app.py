@@ -1,8 +1,36 @@
+import hashlib
 import streamlit as st
 import pandas as pd
 import altair as alt
 from truth.tools.discussion_parser import DiscussionParser
 from truth import VerifierAgent
+from truth.cache import MemoryCache
+
+# Verified discussions kept across reruns and sessions
+VERIFICATION_CACHE_SIZE = 32
+
+
+@st.cache_resource
+def get_agent(model):
+    # Verifications run in their own context, so one agent serves every session
+    return VerifierAgent(model=model)
+
+
+@st.cache_resource
+def verification_cache():
+    # Shared by every session; MemoryCache is locked and evicts the least recently used
+    return MemoryCache(max_entries=VERIFICATION_CACHE_SIZE, default_ttl=None)
+
+
+@st.cache_data(show_spinner=False)
+def parse_discussion(transcript_hash, model, _transcript):
+    parser = DiscussionParser(model=model)
+    parsed = parser.parse_from_str(_transcript)
+    return parsed, parser.calculate_metrics()
+
+
+def transcript_hash(transcript):
+    return hashlib.sha256(transcript.encode("utf-8")).hexdigest()
 
 
 def visualize_metrics(metrics):
@@ -52,10 +80,15 @@ def visualize_metrics(metrics):
         )
 
 
-def verify_votes(parsed_data, selected_model):
+def verify_votes(parsed_data, selected_model, key):
     st.header("Vote Verification Results")
-    agent = VerifierAgent(model=selected_model)
+    cache = verification_cache()
+    cache_key = f"{selected_model}:{key}"
+    entry = cache.get(cache_key)
+    discussion = entry["value"] if entry else None
 
+    # One slot per message, filled in as soon as its vote is judged
+    slots = []
     for i, message in enumerate(parsed_data["messages"]):
         st.subheader(f"Message {i+1} - User: {message.get('user', 'Unknown')}")
         col1, col2 = st.columns(2)
@@ -65,24 +98,43 @@ def verify_votes(parsed_data, selected_model):
             st.write(f"P value submitted: {message.get('P', 'Not specified')}")
 
         with col2:
-            with st.spinner("Verifying vote..."):
-                res = agent.verify_uma_vote(
-                    contract_description=parsed_data["description"], message=message
-                )
-
-            result_color = "green" if res["is_correct"] else "red"
-            st.markdown(
-                f"<h4 style='color: {result_color};'>{'Correct' if res['is_correct'] else 'Incorrect'}</h4>",
-                unsafe_allow_html=True,
-            )
-            st.write(f"Confidence: {res['confidence']}")
-            st.write(f"Explanation: {res['explanation']}")
+            slots.append(st.empty())
+            if discussion is None:
+                slots[-1].info("Verifying...")
 
         with st.expander("Show full message"):
             st.json(message)
 
         st.divider()
 
+    if discussion is None:
+        # Sources cited by several voters are fetched once for the whole discussion
+        with st.spinner("Fetching sources and verifying votes..."):
+            discussion = get_agent(selected_model).verify_discussion(
+                parsed_data,
+                on_result=lambda index, res: show_result(slots[index], res),
+            )
+        cache.set(cache_key, discussion)
+    else:
+        for slot, res in zip(slots, discussion["results"]):
+            show_result(slot, res)
+
+    st.caption(
+        f"{discussion['usage']['unique_sources']} unique sources fetched for "
+        f"{discussion['usage']['votes']} votes"
+    )
+
+
+def show_result(slot, res):
+    with slot.container():
+        result_color = "green" if res["is_correct"] else "red"
+        st.markdown(
+            f"<h4 style='color: {result_color};'>{'Correct' if res['is_correct'] else 'Incorrect'}</h4>",
+            unsafe_allow_html=True,
+        )
+        st.write(f"Confidence: {res['confidence']}")
+        st.write(f"Explanation: {res['explanation']}")
+
 
 def main():
     st.set_page_config(layout="wide", page_title="UMA Vote Verifier Demo")
@@ -104,15 +156,17 @@ def main():
         # Submit button
         if st.button("Evaluate"):
             if contract_description:
+                key = transcript_hash(contract_description)
                 with st.spinner("Parsing discussion and calculating metrics..."):
-                    parser = DiscussionParser(model=selected_model)
-                    parsed = parser.parse_from_str(contract_description)
-                    metrics = parser.calculate_metrics()
+                    parsed, metrics = parse_discussion(
+                        key, selected_model, contract_description
+                    )
 
                 # Store data in session state
                 st.session_state.metrics = metrics
                 st.session_state.parsed = parsed
                 st.session_state.selected_model = selected_model
+                st.session_state.transcript_hash = key
             else:
                 st.warning("Please enter a contract discussion before submitting.")
     with metrics_col:
@@ -121,7 +175,11 @@ def main():
 
     # Full width section for verification results
     if "parsed" in st.session_state:
-        verify_votes(st.session_state.parsed, st.session_state.selected_model)
+        verify_votes(
+            st.session_state.parsed,
+            st.session_state.selected_model,
+            st.session_state.transcript_hash,
+        )
 
     # Display raw parsed data (optional)
     if "parsed" in st.session_state:
@@ -0,0 +1,360 @@
+"""
+Local stand-ins for Mistral, Brave search and the web, so the verification
+pipeline can be benchmarked offline and without paying for API calls.
+
+One threaded HTTP server answers:
+    POST /v1/chat/completions   Mistral-compatible chat endpoint
+    GET  /res/v1/web/search     Brave-compatible search results
+    GET  /pages/<n>             static HTML pages of a fixed size
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from truth.tools.transcript import MESSAGE_HEADER, split_messages
+
+FILLER = (
+    "The quick brown fox jumps over the lazy dog while analysts review the "
+    "evidence gathered from public sources about the disputed market outcome. "
+)
+
+
+class FakeServices:
+    """
+    Parameters:
+        llm_latency (float): Seconds each chat completion takes.
+        llm_jitter (float): Extra random latency, uniform in [0, llm_jitter].
+        token_latency (float): Extra seconds per completion token, i.e. generation time.
+        prompt_tokens (int, optional): Reported prompt tokens; estimated from the prompt if None.
+        completion_tokens (int, optional): Reported completion tokens per reply (per
+            vote for packed replies); estimated from the reply if None.
+        search_latency (float): Seconds each search request takes.
+        page_latency (float): Seconds each page request takes.
+        num_results (int): Pages returned per search.
+        page_bytes (int): Approximate size of each page.
+        chat_concurrency_limit (int, optional): Chat requests served at once;
+            requests beyond it get a 429, like a provider's throughput ceiling.
+        retry_after (float, optional): Retry-After seconds sent with each 429.
+    """
+
+    def __init__(
+        self,
+        llm_latency: float = 0.2,
+        llm_jitter: float = 0.0,
+        token_latency: float = 0.0,
+        prompt_tokens: int | None = None,
+        completion_tokens: int | None = None,
+        search_latency: float = 0.05,
+        page_latency: float = 0.05,
+        num_results: int = 3,
+        page_bytes: int = 20_000,
+        chat_concurrency_limit: int | None = None,
+        retry_after: float | None = None,
+    ):
+        self.llm_latency = llm_latency
+        self.llm_jitter = llm_jitter
+        self.token_latency = token_latency
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.search_latency = search_latency
+        self.page_latency = page_latency
+        self.num_results = num_results
+        self.page = _build_page(page_bytes)
+        self.chat_concurrency_limit = chat_concurrency_limit
+        self.retry_after = retry_after
+        self.chat_in_flight = 0
+        self.requests = {"chat": 0, "search": 0, "page": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def mistral_url(self) -> str:
+        return self.url
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.url}/res/v1/web/search"
+
+    def start(self):
+        services = self
+
+        class Handler(_Handler):
+            pass
+
+        Handler.services = services
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def admit_chat(self) -> bool:
+        """Takes a chat slot, or counts a throttled request if none is free."""
+        with self._lock:
+            limit = self.chat_concurrency_limit
+            if limit is not None and self.chat_in_flight >= limit:
+                self.requests["throttled"] += 1
+                return False
+            self.chat_in_flight += 1
+            self.requests["chat"] += 1
+            return True
+
+    def release_chat(self):
+        with self._lock:
+            self.chat_in_flight -= 1
+
+    def chat_reply(self, prompt: str) -> str:
+        """A plausible reply for each of the prompts the library sends."""
+        if prompt.startswith("Convert the following statement"):
+            return prompt.strip().splitlines()[-1].rstrip(".") + "?"
+        if '"search_query"' in prompt:
+            statement = prompt.split("Statement:\n", 1)[-1].split("\n", 1)[0]
+            return json.dumps(
+                {
+                    "question": statement.rstrip(".") + "?",
+                    "search_query": statement.rstrip("."),
+                    "preferred_sources": [],
+                }
+            )
+        if '"action_plan"' in prompt:
+            links = prompt.split("Links:\n", 1)[-1].split("\n\n", 1)[0]
+            return json.dumps(
+                {
+                    "action_plan": [
+                        {
+                            "action_name": "read_webpage_content",
+                            "params": {"url": link},
+                            "reason": "",
+                        }
+                        for link in links.splitlines()
+                        if link.startswith("http")
+                    ]
+                }
+            )
+        if '"votes"' in prompt:
+            votes = re.findall(
+                r"^\[\d+\]\n(?:.*\n){2}P value submitted: (.*)$", prompt, re.M
+            )
+            return json.dumps(
+                {
+                    "votes": [
+                        {
+                            "vote": number,
+                            "voted_P": voted,
+                            "is_correct": True,
+                            "confidence": "High",
+                            "explanation": "The sources support the vote.",
+                        }
+                        for number, voted in enumerate(votes, start=1)
+                    ]
+                }
+            )
+        if "UMA vote" in prompt:
+            voted = re.search(r"P value submitted: (P\d)", prompt)
+            return json.dumps(
+                {
+                    "voted_P": voted.group(1) if voted else "",
+                    "is_correct": True,
+                    "confidence": "High",
+                    "explanation": "The sources support the vote.",
+                }
+            )
+        if '"index"' in prompt:
+            numbered = re.findall(r"^\s*\[(\d+)\] \S+: (.*)$", prompt, re.M)
+            return json.dumps(
+                {
+                    "messages": [
+                        {"index": int(index), "evidence": text, "rationale": ""}
+                        for index, text in numbered
+                    ]
+                }
+            )
+        if "Discord discussion" in prompt:
+            return json.dumps(_parse_discussion(prompt))
+        statement = re.search(r'"statement": "(.*)"', prompt)
+        return json.dumps(
+            {
+                "statement": statement.group(1) if statement else "",
+                "result": "Yes",
+                "confidence": "High",
+                "explanation": "The sources support the statement.",
+                "sources": [],
+            }
+        )
+
+    def search_results(self, query: str):
+        return {
+            "query": {"original": query},
+            "web": {
+                "results": [
+                    {"url": f"{self.url}/pages/{abs(hash((query, i))) % 10_000}"}
+                    for i in range(self.num_results)
+                ]
+            },
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    services: FakeServices
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        services = self.services
+        if not self.path.startswith("/v1/chat/completions"):
+            return self._send(404, b"{}", "application/json")
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not services.admit_chat():
+            headers = {}
+            if services.retry_after is not None:
+                headers["Retry-After"] = str(services.retry_after)
+            error = json.dumps({"message": "Requests rate limit exceeded"})
+            return self._send(429, error.encode(), "application/json", headers)
+        try:
+            self._complete(body)
+        finally:
+            services.release_chat()
+
+    def _complete(self, body):
+        services = self.services
+        prompt = body["messages"][-1]["content"]
+        content = services.chat_reply(prompt)
+        prompt_tokens = services.prompt_tokens or len(prompt) // 4 + 1
+        if services.completion_tokens is None:
+            completion_tokens = len(content) // 4 + 1
+        else:
+            votes = max(1, content.count('"vote":'))
+            completion_tokens = services.completion_tokens * votes
+        time.sleep(
+            services.llm_latency
+            + random.uniform(0, services.llm_jitter)
+            + services.token_latency * completion_tokens
+        )
+        reply = {
+            "id": "bench",
+            "object": "chat.completion",
+            "model": body.get("model", "mistral-small-latest"),
+            "created": int(time.time()),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        self._send(200, json.dumps(reply).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        services = self.services
+        url = urlparse(self.path)
+        if url.path == "/res/v1/web/search":
+            services.count("search")
+            time.sleep(services.search_latency)
+            query = parse_qs(url.query).get("q", [""])[0]
+            payload = json.dumps(services.search_results(query)).encode("utf-8")
+            return self._send(200, payload, "application/json")
+        if url.path.startswith("/pages/"):
+            services.count("page")
+            time.sleep(services.page_latency)
+            return self._send(200, services.page, "text/html; charset=utf-8")
+        self._send(404, b"not found", "text/plain")
+
+    def _send(self, status: int, body: bytes, content_type: str, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _build_page(page_bytes: int) -> bytes:
+    paragraph = f"<p>{FILLER * 4}</p>\n"
+    count = max(1, page_bytes // len(paragraph))
+    return (
+        "<html><head><title>Bench page</title><script>var x = 1;</script></head>"
+        f"<body><nav>Menu</nav>{paragraph * count}</body></html>"
+    ).encode("utf-8")
+
+
+def _parse_discussion(prompt: str):
+    """Structures the transcript embedded in a DiscussionParser prompt."""
+    transcript = prompt.split("Here's the Discord discussion to analyze:")[-1]
+    transcript = re.split(
+        r"This is a later part|Please provide the structured", transcript
+    )[0]
+    preamble, blocks = split_messages(transcript)
+    description = re.search(r"Description: (.*)", preamble)
+    later_chunk = "This is a later part" in prompt
+    messages = []
+    for block in blocks:
+        header = MESSAGE_HEADER.search(block)
+        text = block[header.end() :].replace("Discord user avatar", "").strip()
+        p_value = re.search(r"\bP[1-4]\b", text)
+        messages.append(
+            {
+                "user": header["user"],
+                "timestamp": header["timestamp"],
+                "P": p_value.group(0) if p_value else "",
+                "evidence": text,
+                "sources": re.findall(r"https?://\S+", text),
+                "rationale": "",
+            }
+        )
+    return {
+        "description": description.group(1) if description and not later_chunk else "",
+        "messages": messages,
+    }
+
+
+def build_discussion(num_messages: int, page_url: str) -> str:
+    """A synthetic transcript in the copied Discord format DiscussionParser expects."""
+    lines = [
+        "Discussion",
+        "bruna.uma 2024-10-01, 9:00 AM",
+        "Description: Will the benchmark finish in time? P1: No. P2: Yes.",
+        "",
+    ]
+    for i in range(num_messages):
+        lines += [
+            "Discord user avatar",
+            f"User{i % 7} 2024-10-0{1 + i // 60 % 9}, 10:{i % 60:02d} AM",
+            f"P{1 + i % 4} based on {page_url}/pages/{i}",
+            "",
+        ]
+    return "\n".join(lines)
@@ -0,0 +1,284 @@
+"""
+Offline throughput/latency benchmark for verify_statement, verify_uma_vote and
+DiscussionParser.parse against the local stand-ins in fake_services.
+
+    python -m benchmarks.run --items 32 --concurrency 1,4,16 --llm-latency 0.2
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+from loguru import logger
+from benchmarks.fake_services import FakeServices, build_discussion
+from truth import VerifierAgent
+from truth.http import HTTPTransport
+from truth.metrics import Histogram, MetricsRegistry
+from truth.tools.discussion_parser import DiscussionParser
+
+
+def measure(
+    task: Callable[[int], None], items: int, concurrency: int, trace_memory=True
+) -> Dict:
+    """
+    Runs task(0..items-1) with `concurrency` threads.
+    tracemalloc slows threaded code considerably, so peak memory is taken from
+    a second, traced run rather than from the timed one.
+    Returns:
+        dict: items/sec, latency percentiles (seconds) and peak traced memory (MB).
+    """
+    latencies = []
+
+    def timed(index):
+        start_time = time.perf_counter()
+        task(index)
+        latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(items)))
+    wall_time = time.perf_counter() - start_time
+
+    histogram = Histogram(window=items)
+    for latency in latencies:
+        histogram.observe(latency)
+    summary = histogram.summary()
+    result = {
+        "concurrency": concurrency,
+        "items": items,
+        "wall_time": round(wall_time, 3),
+        "items_per_sec": round(items / wall_time, 2),
+        "p50": round(summary["p50"], 4),
+        "p95": round(summary["p95"], 4),
+        "p99": round(summary["p99"], 4),
+        "peak_memory_mb": None,
+    }
+    if trace_memory:
+        tracemalloc.start()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(task, range(items)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_memory_mb"] = round(peak / 1024 / 1024, 2)
+    return result
+
+
+def build_agent(services: FakeServices, concurrency: int, **kwargs) -> VerifierAgent:
+    return VerifierAgent(
+        mistral_api_key="bench",
+        brave_api_key="bench",
+        mistral_server_url=services.mistral_url,
+        brave_search_url=services.search_url,
+        transport=HTTPTransport(max_connections_per_host=max(10, concurrency * 3)),
+        metrics=MetricsRegistry(),
+        **kwargs,
+    )
+
+
+def bench_statements(services, items, concurrency, trace_memory=True, **kwargs):
+    agent = build_agent(services, concurrency, **kwargs)
+    return measure(
+        lambda i: agent.verify_statement(f"Benchmark statement number {i}."),
+        items,
+        concurrency,
+        trace_memory,
+    )
+
+
+def bench_statements_llm_planner(services, items, concurrency, trace_memory=True):
+    return bench_statements(services, items, concurrency, trace_memory, planner="llm")
+
+
+def bench_statements_speculative(services, items, concurrency, trace_memory=True):
+    return bench_statements(
+        services, items, concurrency, trace_memory, planner="llm", speculative=True
+    )
+
+
+def bench_statements_fast(services, items, concurrency, trace_memory=True):
+    return bench_statements(services, items, concurrency, trace_memory, fast=True)
+
+
+def bench_votes(services, items, concurrency, trace_memory=True):
+    agent = build_agent(services, concurrency)
+    description = "Will the benchmark finish in time? P1: No. P2: Yes."
+
+    def vote(i):
+        message = {
+            "user": f"User{i}",
+            "timestamp": "2024-10-01, 10:00 AM",
+            "P": "P2",
+            "evidence": "The run finished early.",
+            "rationale": "See the logs.",
+            "sources": [f"{services.url}/pages/{i}"],
+        }
+        agent.verify_uma_vote(description, message)
+
+    return measure(vote, items, concurrency, trace_memory)
+
+
+def bench_discussion(services, items, concurrency, trace_memory=True, messages=40):
+    """Each item verifies a whole discussion whose votes cite 5 shared pages."""
+    agent = build_agent(services, concurrency)
+
+    def verify(i):
+        parsed = {
+            "description": "Will the benchmark finish in time? P1: No. P2: Yes.",
+            "messages": [
+                {
+                    "user": f"User{m}",
+                    "timestamp": "2024-10-01, 10:00 AM",
+                    "P": f"P{1 + m % 2}",
+                    "evidence": "The run finished early.",
+                    "rationale": "See the logs.",
+                    "sources": [f"{services.url}/pages/{i}-{m % 5}"],
+                }
+                for m in range(messages)
+            ],
+        }
+        agent.verify_discussion(parsed, concurrency=concurrency)
+
+    # Discussions run one at a time; concurrency applies to the votes within
+    return measure(verify, items, 1, trace_memory) | {"concurrency": concurrency}
+
+
+def bench_parse(
+    services,
+    items,
+    concurrency,
+    trace_memory=True,
+    messages=120,
+    chunk_chars=None,
+    mode="llm",
+):
+    transcript = build_discussion(messages, services.url)
+
+    def parse(i):
+        parser = DiscussionParser(api_key="bench", server_url=services.mistral_url)
+        parser.parse_from_str(transcript, chunk_chars=chunk_chars, mode=mode)
+        parser.calculate_metrics()
+
+    return measure(parse, items, concurrency, trace_memory)
+
+
+def bench_parse_chunked(services, items, concurrency, trace_memory=True):
+    return bench_parse(
+        services, items, concurrency, trace_memory, chunk_chars=2000
+    )
+
+
+def bench_parse_hybrid(services, items, concurrency, trace_memory=True):
+    return bench_parse(services, items, concurrency, trace_memory, mode="hybrid")
+
+
+def bench_parse_structural(services, items, concurrency, trace_memory=True):
+    return bench_parse(services, items, concurrency, trace_memory, mode="structural")
+
+
+BENCHMARKS = {
+    "verify_statement": bench_statements,
+    "verify_statement_llm_planner": bench_statements_llm_planner,
+    "verify_statement_speculative": bench_statements_speculative,
+    "verify_statement_fast": bench_statements_fast,
+    "verify_uma_vote": bench_votes,
+    "verify_discussion": bench_discussion,
+    "discussion_parse": bench_parse,
+    "discussion_parse_chunked": bench_parse_chunked,
+    "discussion_parse_hybrid": bench_parse_hybrid,
+    "discussion_parse_structural": bench_parse_structural,
+}
+
+
+def run(
+    benchmarks: List[str],
+    items: int,
+    concurrency_levels: List[int],
+    services: FakeServices,
+    trace_memory=True,
+) -> Dict[str, List[Dict]]:
+    results = {}
+    for name in benchmarks:
+        results[name] = [
+            BENCHMARKS[name](services, items, concurrency, trace_memory)
+            for concurrency in concurrency_levels
+        ]
+    return results
+
+
+def print_report(results: Dict[str, List[Dict]]):
+    header = f"{'benchmark':<30}{'conc':>6}{'items/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'peak MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, rows in results.items():
+        for row in rows:
+            print(
+                f"{name:<30}{row['concurrency']:>6}{row['items_per_sec']:>10}"
+                f"{row['p50']:>9}{row['p95']:>9}{row['p99']:>9}{str(row['peak_memory_mb']):>10}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS))
+    parser.add_argument("--items", type=int, default=32)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per call")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--prompt-tokens", type=int, default=None)
+    parser.add_argument(
+        "--token-latency", type=float, default=0.01, help="Seconds per completion token"
+    )
+    parser.add_argument(
+        "--completion-tokens",
+        type=int,
+        default=None,
+        help="Fixed completion tokens per reply (default: estimated from the reply)",
+    )
+    parser.add_argument("--search-latency", type=float, default=0.05)
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--page-bytes", type=int, default=20_000)
+    parser.add_argument(
+        "--chat-concurrency-limit",
+        type=int,
+        default=None,
+        help="Throttle chat requests beyond this many at once with a 429",
+    )
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument(
+        "--skip-memory", action="store_true", help="Skip the traced memory run"
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    # Per-call logging would dominate the measurements
+    logger.remove()
+    services = FakeServices(
+        llm_latency=args.llm_latency,
+        llm_jitter=args.llm_jitter,
+        token_latency=args.token_latency,
+        prompt_tokens=args.prompt_tokens,
+        completion_tokens=args.completion_tokens,
+        search_latency=args.search_latency,
+        page_latency=args.page_latency,
+        page_bytes=args.page_bytes,
+        chat_concurrency_limit=args.chat_concurrency_limit,
+        retry_after=args.retry_after,
+    )
+    with services:
+        results = run(
+            args.benchmarks.split(","),
+            args.items,
+            [int(level) for level in args.concurrency.split(",")],
+            services,
+            trace_memory=not args.skip_memory,
+        )
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,10 +26,10 @@ statements = [
     # "Photosynthesis is the process by which plants convert sunlight into energy.",
 ]
 
-# Verify each statement
-for statement in statements:
-    logger.info(f"Verifying: '{statement}'")
-    output = agent.verify_statement(statement)
+# Verify the statements concurrently; results come back in input order
+batch = agent.verify_statements(statements, concurrency=4)
+for output in batch["results"]:
     print(
         f"Result: {output['result']}\nConfidence: {output['confidence']}\nSources: {output['sources']}\nExplanation: {output['explanation']}\n\n"
     )
+print(f"Batch usage: {batch['usage']}")
@@ -0,0 +1,138 @@
+import threading
+import time
+import tracemalloc
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from truth import actions
+from truth.http import HTTPTransport
+
+
+class TestWikiReader(unittest.TestCase):
+    def test_reads_intro_through_transport(self):
+        transport = HTTPTransport()
+        response = mock.Mock()
+        response.json.return_value = {
+            "query": {
+                "pages": {
+                    "1": {
+                        "extract": "Paris is the capital of France.",
+                        "fullurl": "https://en.wikipedia.org/wiki/Paris",
+                    }
+                }
+            }
+        }
+        with mock.patch.object(transport, "get", return_value=response) as get:
+            result = actions.read_wiki_entry(
+                "https://en.wikipedia.org/wiki/Paris", max_chars=5, transport=transport
+            )
+        self.assertTrue(result["success"])
+        self.assertEqual(result["content"], "Paris")
+        self.assertEqual(get.call_args.kwargs["params"]["titles"], "Paris")
+
+    def test_missing_page(self):
+        result = actions._wiki_result(
+            "https://en.wikipedia.org/wiki/Nope", {"query": {"pages": {"-1": {"missing": ""}}}}
+        )
+        self.assertFalse(result["success"])
+        self.assertTrue(result["error"].startswith("PageError"))
+
+
+class TestRouteLinks(unittest.TestCase):
+    def test_routes_by_url_pattern(self):
+        plan, unrouted = actions.route_links(
+            [
+                "https://en.wikipedia.org/wiki/Earth",
+                "https://www.youtube.com/watch?v=abc",
+                "https://youtu.be/abc",
+                "https://example.com/page",
+                "ftp://example.com/file",
+            ]
+        )
+        self.assertEqual(
+            [action["action_name"] for action in plan],
+            [
+                "read_wiki_entry",
+                "read_youtube_transcript",
+                "read_youtube_transcript",
+                "read_webpage_content",
+            ],
+        )
+        self.assertEqual(unrouted, ["ftp://example.com/file"])
+
+
+class TestWebpageReader(unittest.TestCase):
+    def fetch(self, chunks, content_type="text/html; charset=utf-8"):
+        transport = HTTPTransport()
+        response = mock.Mock(status_code=200, headers={"Content-Type": content_type})
+        response.iter_content.return_value = iter(chunks)
+        with mock.patch.object(transport, "get", return_value=response) as get:
+            result = actions.read_webpage_content("https://e.com", transport=transport)
+        self.assertTrue(get.call_args.kwargs["stream"])
+        response.close.assert_called_once()
+        return result, response
+
+    def test_extracts_text_and_reports_stats(self):
+        html = b"<html><style>p{}</style><p>One  Two</p>\n<div>Three</div></html>"
+        result, _ = self.fetch([html])
+        self.assertEqual(result["content"], "One\nTwo\nThree")
+        self.assertEqual(result["stats"]["bytes"], len(html))
+        self.assertFalse(result["stats"]["truncated"])
+
+    def test_body_is_capped(self):
+        with mock.patch.object(actions, "MAX_PAGE_BYTES", 10):
+            result, _ = self.fetch([b"<p>abcdef</p>", b"<p>never read</p>"])
+        self.assertTrue(result["stats"]["truncated"])
+        self.assertEqual(result["stats"]["bytes"], 10)
+        self.assertNotIn("never", result["content"])
+
+    def test_rejects_binary_content_type_without_reading(self):
+        result, response = self.fetch([b"%PDF"], content_type="application/pdf")
+        self.assertFalse(result["success"])
+        self.assertIn("application/pdf", result["error"])
+        response.iter_content.assert_not_called()
+
+    def test_memory_is_measured_one_page_at_a_time(self):
+        running, peak, lock = 0, 0, threading.Lock()
+        extract = actions._extract_page
+
+        def tracked(*args):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            return extract(*args)
+
+        with mock.patch.object(actions, "MEASURE_PAGE_MEMORY", True), mock.patch.object(
+            actions, "_extract_page", tracked
+        ), ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(
+                executor.map(
+                    lambda i: actions._page_result(
+                        "https://e.com", b"<p>x</p>" * 100, "text/html", 0.0, False
+                    ),
+                    range(4),
+                )
+            )
+        self.assertEqual(peak, 1)
+        self.assertTrue(all(r["stats"]["peak_heap_bytes"] > 0 for r in results))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_memory_is_not_measured_under_another_tracer(self):
+        tracemalloc.start()
+        try:
+            with mock.patch.object(actions, "MEASURE_PAGE_MEMORY", True):
+                result = actions._page_result(
+                    "https://e.com", b"<p>x</p>", "text/html", 0.0, False
+                )
+            self.assertTrue(tracemalloc.is_tracing())
+        finally:
+            tracemalloc.stop()
+        self.assertNotIn("peak_heap_bytes", result["stats"])
+
+
+if __name__ == "__main__":
+    unittest.main()
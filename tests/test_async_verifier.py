@@ -0,0 +1,285 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+import httpx
+from benchmarks.fake_services import FakeServices
+from truth import AsyncVerifierAgent, VerificationContext
+from truth.metrics import MetricsRegistry
+from truth.similarity import StatementIndex
+
+
+def fake_response(content, prompt_tokens=10, completion_tokens=5):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        ),
+    )
+
+
+class FakeAsyncChat:
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    async def complete_async(self, model, messages, **kwargs):
+        self.prompts.append(messages[0]["content"])
+        return fake_response(self.replies.pop(0))
+
+
+def handler(request: httpx.Request):
+    if request.url.host == "api.search.brave.com":
+        return httpx.Response(
+            200, json={"web": {"results": [{"url": "https://example.com/a"}]}}
+        )
+    return httpx.Response(
+        200, html="<html><script>x</script><p>The Earth is round.</p></html>"
+    )
+
+
+class TestAsyncVerifierAgent(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.agent = AsyncVerifierAgent(
+            mistral_api_key="test",
+            brave_api_key="test",
+            http_client=client,
+            planner="llm",
+            metrics=MetricsRegistry(),
+        )
+        self.chat = FakeAsyncChat(
+            [
+                "Is the Earth flat?",
+                json.dumps(
+                    {
+                        "action_plan": [
+                            {
+                                "action_name": "read_webpage_content",
+                                "params": {"url": "https://example.com/a"},
+                                "reason": "",
+                            }
+                        ]
+                    }
+                ),
+                json.dumps(
+                    {
+                        "statement": "The Earth is flat.",
+                        "result": "No",
+                        "confidence": "High",
+                        "explanation": "",
+                        "sources": ["https://example.com/a"],
+                    }
+                ),
+            ]
+        )
+        self.agent.mistral_client = SimpleNamespace(chat=self.chat)
+
+    async def asyncTearDown(self):
+        await self.agent.http_client.aclose()
+
+    async def test_verify_statement(self):
+        ctx = VerificationContext()
+        result = await self.agent.verify_statement("The Earth is flat.", ctx)
+        self.assertEqual(result["result"], "No")
+        self.assertEqual(result["total_prompt_tokens"], 30)
+        observation = ctx.observations["read_webpage_content"][0]
+        self.assertTrue(observation["success"])
+        self.assertEqual(observation["content"], "The Earth is round.")
+        self.assertIn("The Earth is round.", self.chat.prompts[-1])
+
+        stages = [span["stage"] for span in result["spans"]]
+        self.assertEqual(
+            stages,
+            [
+                "formulate_question",
+                "web_search",
+                "plan_actions",
+                "action",
+                "verdict",
+                "verify_statement",
+            ],
+        )
+        action = result["spans"][3]
+        self.assertEqual(action["url"], "https://example.com/a")
+        self.assertFalse(action["cache_hit"])
+        self.assertGreater(action["bytes"], 0)
+        self.assertEqual(result["spans"][0]["prompt_tokens"], 10)
+        verdicts = self.agent.metrics.histogram(
+            "truth_stage_duration_seconds", stage="verdict"
+        )
+        self.assertGreaterEqual(verdicts.count, 1)
+
+    async def test_speculative_prefetch_is_reused(self):
+        self.agent.speculative = True
+        ctx = VerificationContext()
+        result = await self.agent.verify_statement("The Earth is flat.", ctx)
+        self.assertEqual(result["result"], "No")
+        actions = [span for span in ctx.spans if span["stage"] == "action"]
+        self.assertEqual(len(actions), 1)
+        self.assertTrue(actions[0]["prefetch"])
+        self.assertEqual(len(ctx.observations["read_webpage_content"]), 1)
+        self.assertEqual(ctx.prefetches, {})
+
+    async def test_fast_mode_skips_planning_call(self):
+        self.agent.fast = True
+        query = {"question": "Is the Earth flat?", "search_query": "earth shape"}
+        self.chat.replies[:2] = [json.dumps(query)]
+        result = await self.agent.verify_statement("The Earth is flat.")
+        self.assertEqual(result["result"], "No")
+        self.assertEqual(len(self.chat.prompts), 2)
+        self.assertIn("Is the Earth flat?", self.chat.prompts[-1])
+
+    async def test_near_duplicate_reuses_the_verdict(self):
+        self.agent.statement_index = StatementIndex()
+        await self.agent.verify_statement("The Earth is flat.")
+        result = await self.agent.verify_statement("Is the Earth flat?")
+        self.assertEqual(result["result"], "No")
+        self.assertEqual(result["reused_from"]["statement"], "The Earth is flat.")
+        self.assertEqual(len(self.chat.prompts), 3)
+
+    async def test_rule_planner_skips_planning_call(self):
+        self.agent.planner = "rules"
+        del self.chat.replies[1]  # no planning round-trip
+        ctx = VerificationContext()
+        result = await self.agent.verify_statement("The Earth is flat.", ctx)
+        self.assertEqual(result["result"], "No")
+        self.assertEqual(len(self.chat.prompts), 2)
+        self.assertEqual(ctx.action_plan[0]["action_name"], "read_webpage_content")
+
+    async def test_verify_statements_batch(self):
+        class PlanlessChat:
+            async def complete_async(self, model, messages, **kwargs):
+                prompt = messages[0]["content"]
+                if "action_plan" in prompt:
+                    return fake_response(json.dumps({"action_plan": []}))
+                if prompt.startswith("Convert"):
+                    return fake_response(prompt.splitlines()[-1] + "?")
+                return fake_response(json.dumps({"result": "Unknown", "sources": []}))
+
+        self.agent.mistral_client = SimpleNamespace(chat=PlanlessChat())
+        statements = [f"Statement {i}" for i in range(5)]
+        batch = await self.agent.verify_statements(statements, concurrency=2)
+        self.assertEqual(len(batch["results"]), 5)
+        for result in batch["results"]:
+            self.assertEqual(result["usage"]["total_prompt_tokens"], 30)
+        self.assertEqual(batch["usage"]["total_prompt_tokens"], 150)
+        self.assertEqual(self.agent.usage_summary()["total_prompt_tokens"], 150)
+
+    async def test_concurrent_calls_keep_separate_contexts(self):
+        class EchoChat:
+            async def complete_async(self, model, messages, **kwargs):
+                prompt = messages[0]["content"]
+                await asyncio.sleep(0.01)
+                if prompt.startswith("Convert"):
+                    return fake_response(prompt.splitlines()[-1] + "?")
+                return fake_response(json.dumps({"result": "Yes", "sources": []}))
+
+        self.agent.mistral_client = SimpleNamespace(chat=EchoChat())
+        self.agent.planner = "rules"
+        contexts = [VerificationContext() for _ in range(3)]
+        await asyncio.gather(
+            *(
+                self.agent.verify_statement(f"Statement {i}", ctx)
+                for i, ctx in enumerate(contexts)
+            )
+        )
+        for ctx in contexts:
+            self.assertEqual(len(ctx.observations["read_webpage_content"]), 1)
+            self.assertEqual(ctx.usage.total_prompt_tokens, 20)
+        self.assertEqual(self.agent.usage_summary()["total_prompt_tokens"], 60)
+
+    async def test_take_actions_merges_in_plan_order(self):
+        async def slow_reader(url, transport=None):
+            await asyncio.sleep(0.05 if url.endswith("1") else 0)
+            return {"success": True, "content": url, "url": url, "error": None}
+
+        self.agent.available_actions = {
+            "read": {"function": None, "async_function": slow_reader}
+        }
+        plan = [
+            {"action_name": "read", "params": {"url": f"https://e.com/{i}"}}
+            for i in range(1, 4)
+        ]
+        ctx = VerificationContext()
+        await self.agent.take_actions(plan, ctx)
+        urls = [obs["url"] for obs in ctx.observations["read"]]
+        self.assertEqual(urls, [f"https://e.com/{i}" for i in range(1, 4)])
+
+    async def test_sync_only_actions_run_in_a_thread(self):
+        def reader(url, transport=None):
+            if url.endswith("2"):
+                raise ValueError("unreadable")
+            return {"success": True, "content": url, "url": url, "error": None}
+
+        self.agent.available_actions = {"read": {"function": reader}}
+        plan = [
+            {"action_name": "read", "params": {"url": f"https://e.com/{i}"}}
+            for i in range(1, 4)
+        ]
+        ctx = VerificationContext()
+        await self.agent.take_actions(plan, ctx)
+        urls = [obs["url"] for obs in ctx.observations["read"]]
+        self.assertEqual(urls, ["https://e.com/1", "https://e.com/3"])
+
+    async def test_deadline_cancels_slow_actions(self):
+        cancelled = []
+
+        async def reader(url, transport=None):
+            try:
+                await asyncio.sleep(5 if url.endswith("2") else 0)
+            except asyncio.CancelledError:
+                cancelled.append(url)
+                raise
+            return {"success": True, "content": url, "url": url, "error": None}
+
+        self.agent.available_actions = {
+            "read": {"function": None, "async_function": reader}
+        }
+        plan = [
+            {"action_name": "read", "params": {"url": f"https://e.com/{i}"}}
+            for i in range(1, 4)
+        ]
+        ctx = VerificationContext(deadline=0.5)
+        await self.agent.take_actions(plan, ctx)
+        self.assertEqual(cancelled, ["https://e.com/2"])
+        self.assertEqual(ctx.dropped_sources, ["https://e.com/2"])
+        self.assertEqual(len(ctx.observations["read"]), 2)
+
+
+class TestAsyncDiscussion(unittest.IsolatedAsyncioTestCase):
+    async def test_verify_discussion(self):
+        with FakeServices(llm_latency=0, search_latency=0, page_latency=0) as services:
+            agent = AsyncVerifierAgent(
+                mistral_api_key="test",
+                brave_api_key="test",
+                mistral_server_url=services.mistral_url,
+                brave_search_url=services.search_url,
+                metrics=MetricsRegistry(),
+            )
+            parsed = {
+                "description": "P1: No. P2: Yes.",
+                "messages": [
+                    {
+                        "user": f"User{i}",
+                        "timestamp": "2024-10-01, 10:00 AM",
+                        "P": f"P{1 + i % 2}",
+                        "evidence": "",
+                        "rationale": "",
+                        "sources": [f"{services.url}/pages/{i}"],
+                    }
+                    for i in range(3)
+                ],
+            }
+            streamed = {}
+            discussion = await agent.verify_discussion(
+                parsed, on_result=lambda i, result: streamed.setdefault(i, result)
+            )
+        results = discussion["results"]
+        self.assertEqual([r["voted_P"] for r in results], ["P1", "P2", "P1"])
+        self.assertEqual(discussion["usage"]["votes"], 3)
+        self.assertEqual([streamed[i] for i in sorted(streamed)], results)
+
+
+if __name__ == "__main__":
+    unittest.main()
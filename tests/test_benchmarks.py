@@ -0,0 +1,24 @@
+import unittest
+from benchmarks.fake_services import FakeServices
+from benchmarks.run import run
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run_reports_every_level(self):
+        services = FakeServices(
+            llm_latency=0, search_latency=0, page_latency=0, page_bytes=2000
+        )
+        with services:
+            results = run(["verify_statement", "discussion_parse"], 4, [1, 2], services)
+        for rows in results.values():
+            self.assertEqual([row["concurrency"] for row in rows], [1, 2])
+            for row in rows:
+                self.assertGreater(row["items_per_sec"], 0)
+                self.assertLessEqual(row["p50"], row["p99"])
+                self.assertGreater(row["peak_memory_mb"], 0)
+        # One search per statement, timed and traced run, two levels
+        self.assertEqual(services.requests["search"], 4 * 2 * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import tempfile
+import time
+import unittest
+import zlib
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from truth import actions, VerifierAgent
+from truth.cache import MemoryCache, SQLiteCache
+from truth.http import HTTPTransport
+from truth.verifier import normalize_query
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache(Path(self.tmpdir.name) / "cache.sqlite")
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_round_trip_and_expiry(self):
+        self.cache.set("k", {"content": "x" * 1000}, ttl=60, meta={"etag": "1"})
+        entry = self.cache.get("k")
+        self.assertEqual(entry["value"], {"content": "x" * 1000})
+        self.assertEqual(entry["meta"], {"etag": "1"})
+        self.assertFalse(entry["stale"])
+        # Compressed on disk
+        self.assertLess(self.cache.size(), 1000)
+
+        self.cache.set("old", "v", ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("old"))
+        self.assertTrue(self.cache.get("old", allow_stale=True)["stale"])
+
+    def test_lru_eviction_by_size(self):
+        self.cache.max_bytes = 3 * len(self._blob_for(0))
+        for i in range(3):
+            self.cache.set(f"k{i}", f"value-{i}")
+            time.sleep(0.01)
+        self.cache.get("k0")  # k1 becomes least recently used
+        self.cache.set("k3", "value-3")
+        self.assertIsNone(self.cache.get("k1"))
+        for key in ("k0", "k2", "k3"):
+            self.assertIsNotNone(self.cache.get(key))
+
+    def _blob_for(self, i):
+        return zlib.compress(json.dumps(f"value-{i}").encode())
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_ttl_and_lru(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a")["value"], 1)
+
+        cache.set("d", 4, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("d"))
+        self.assertTrue(cache.get("d", allow_stale=True)["stale"])
+
+
+class TestLLMCache(unittest.TestCase):
+    def test_repeated_prompt_is_served_from_cache(self):
+        complete = mock.Mock(
+            return_value=SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="Q?"))],
+                usage=SimpleNamespace(prompt_tokens=100_000, completion_tokens=10),
+            )
+        )
+        agent = VerifierAgent(mistral_api_key="test", llm_cache=MemoryCache())
+        agent.mistral_client = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+
+        self.assertEqual(agent.formulate_question("Statement"), "Q?")
+        self.assertEqual(agent.formulate_question("Statement"), "Q?")
+        self.assertEqual(complete.call_count, 1)
+        usage = agent.usage_summary()
+        self.assertEqual(usage["total_prompt_tokens"], 100_000)
+        self.assertEqual(usage["llm_cache_hits"], 1)
+        self.assertEqual(usage["cached_prompt_tokens"], 100_000)
+        self.assertGreater(usage["saved_cost"], 0)
+
+        agent.model = "mistral-large-latest"
+        agent.formulate_question("Statement")
+        self.assertEqual(complete.call_count, 2)
+
+
+class TestSearchCache(unittest.TestCase):
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("Is the Earth flat?"), "earth flat")
+        self.assertEqual(normalize_query("  is EARTH   flat "), "earth flat")
+        self.assertEqual(normalize_query("Who is it?"), "who is it")
+
+    def test_reformulated_question_hits_cache(self):
+        agent = VerifierAgent(
+            mistral_api_key="test", search_cache=MemoryCache(max_entries=10)
+        )
+        response = mock.Mock()
+        response.json.return_value = {"web": {"results": [{"url": "https://a"}]}}
+        with mock.patch.object(HTTPTransport, "get", return_value=response) as get:
+            first = agent.perform_web_search("Is the Earth flat?")
+            second = agent.perform_web_search("is earth flat")
+        self.assertEqual(first, ["https://a"])
+        self.assertEqual(second, ["https://a"])
+        self.assertEqual(get.call_count, 1)
+
+
+class TestWebpageRevalidation(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache(Path(self.tmpdir.name) / "cache.sqlite")
+        actions.set_source_cache(self.cache)
+
+    def tearDown(self):
+        actions.set_source_cache(None)
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def test_fresh_hit_and_304_revalidation(self):
+        page = mock.Mock(
+            status_code=200, headers={"ETag": '"v1"', "Content-Type": "text/html"}
+        )
+        page.iter_content.return_value = [b"<p>Hello</p>"]
+        with mock.patch.object(HTTPTransport, "get", return_value=page) as get:
+            first = actions.read_webpage_content("https://example.com")
+            second = actions.read_webpage_content("https://example.com", max_chars=3)
+        self.assertEqual(first["content"], "Hello")
+        self.assertEqual(second["content"], "Hel")
+        self.assertEqual(get.call_count, 1)
+
+        # Expire the entry, then the server answers 304 Not Modified
+        self.cache.touch("webpage:https://example.com", ttl=-1)
+        not_modified = mock.Mock(status_code=304, headers={})
+        with mock.patch.object(
+            HTTPTransport, "get", return_value=not_modified
+        ) as get:
+            third = actions.read_webpage_content("https://example.com")
+        self.assertEqual(third["content"], "Hello")
+        self.assertEqual(get.call_args.kwargs["headers"]["If-None-Match"], '"v1"')
+        self.assertFalse(self.cache.get("webpage:https://example.com")["stale"])
+
+
+if __name__ == "__main__":
+    unittest.main()
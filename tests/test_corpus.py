@@ -0,0 +1,95 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from truth.tools.discussion_parser import DiscussionParser
+
+try:
+    from truth.tools.corpus import DiscussionCorpus
+except ImportError:
+    DiscussionCorpus = None
+
+
+def message(user, timestamp, p_value, evidence="", sources=(), rationale=""):
+    return {
+        "user": user,
+        "timestamp": timestamp,
+        "P": p_value,
+        "evidence": evidence,
+        "sources": list(sources),
+        "rationale": rationale,
+    }
+
+
+DISCUSSIONS = {
+    "walz-gun": {
+        "description": 'Will Walz say "gun"?',
+        "messages": [
+            message(
+                "bowtune_18048",
+                "2024-10-03, 5:37 PM",
+                "P2",
+                "mentioned at 1:02:21",
+                ["https://www.youtube.com/live/VAGZGQg31hs"],
+            ),
+            message("angeldeln111", "2024-10-04, 2:24 AM", "P4", rationale="Too early"),
+            message("d0wn10ad", "2024-10-04, 4:16 AM", "P4"),
+            message("bruna.uma", "2024-10-05, 9:00 AM", ""),
+        ],
+    },
+    "btc-100k": {
+        "description": "Will BTC reach 100k?",
+        "messages": [
+            message("d0wn10ad", "2024-11-01, 10:00 AM", "P1", "price feed", ["a", "b"]),
+            message("batuy.", "2024-11-03, 11:30 PM", "P1"),
+        ],
+    },
+    "empty": {"description": "No votes yet", "messages": []},
+}
+
+
+@unittest.skipIf(DiscussionCorpus is None, "numpy/pandas/pyarrow not installed")
+class TestDiscussionCorpus(unittest.TestCase):
+    def setUp(self):
+        self.corpus = DiscussionCorpus.from_parsed(DISCUSSIONS)
+
+    def test_metrics_match_calculate_metrics(self):
+        for dispute, parsed in DISCUSSIONS.items():
+            parser = DiscussionParser(api_key="test")
+            parser.parsed = parsed
+            self.assertEqual(
+                self.corpus.dispute_metrics(dispute),
+                parser.calculate_metrics(),
+                dispute,
+            )
+
+    def test_aggregates(self):
+        aggregates = self.corpus.aggregates()
+        self.assertEqual(aggregates["disputes"], 3)
+        self.assertEqual(aggregates["messages"], 6)
+        self.assertEqual(aggregates["unique_users"], 4)
+        self.assertEqual(aggregates["repeat_users"], 1)
+        self.assertEqual(aggregates["p_value_share"]["P4"], 0.4)
+        self.assertEqual(aggregates["evidence_rate"], 0.4)
+        self.assertEqual(aggregates["messages_per_dispute"]["max"], 4)
+
+    def test_files_round_trip_through_parquet(self):
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            for dispute, parsed in DISCUSSIONS.items():
+                (root / dispute).mkdir()
+                with open(root / dispute / "parsed_discussions.json", "w") as f:
+                    json.dump(parsed, f)
+            corpus = DiscussionCorpus.from_directory(root)
+            corpus.save(root / "corpus")
+            loaded = DiscussionCorpus.load(root / "corpus")
+
+        self.assertEqual(sorted(loaded.disputes.index), sorted(DISCUSSIONS))
+        self.assertEqual(len(loaded.messages), 6)
+        self.assertEqual(
+            loaded.dispute_metrics("walz-gun"), self.corpus.dispute_metrics("walz-gun")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
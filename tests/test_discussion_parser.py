@@ -0,0 +1,232 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+from truth.tools.discussion_parser import DiscussionParser
+from truth.tools.transcript import (
+    chunk_transcript,
+    preparse,
+    render_message,
+    split_messages,
+)
+
+TRANSCRIPT = """Discussion
+bruna.uma 2024-10-02, 4:59 PM
+Description: Will Walz say "gun"? p1: No, p2: Yes.
+
+bowtune_18048 2024-10-03, 5:37 PM
+P2 - YES
+
+mentioned at 1:02:21 https://www.youtube.com/live/VAGZGQg31hs
+
+Discord user avatar
+angeldeln111 2024-10-04, 2:24 AM
+P4 Too Early
+
+Discord user avatar
+d0wn10ad 2024-10-04, 4:16 AM
+P4
+"""
+
+
+def message(user, timestamp, p_value):
+    return {
+        "user": user,
+        "timestamp": timestamp,
+        "P": p_value,
+        "evidence": "",
+        "sources": [],
+        "rationale": "",
+    }
+
+
+class TestTranscript(unittest.TestCase):
+    def test_split_keeps_description_in_preamble(self):
+        preamble, blocks = split_messages(TRANSCRIPT)
+        self.assertTrue(preamble.startswith("Discussion\nbruna.uma"))
+        self.assertIn("Description:", preamble)
+        self.assertEqual(len(blocks), 3)
+        self.assertTrue(blocks[0].startswith("bowtune_18048 2024-10-03, 5:37 PM"))
+
+    def test_chunks_are_whole_messages_with_description(self):
+        chunks = chunk_transcript(TRANSCRIPT, 150)
+        self.assertEqual(len(chunks), 3)
+        for chunk in chunks:
+            self.assertIn("Description:", chunk)
+        for user in ("bowtune_18048", "angeldeln111", "d0wn10ad"):
+            self.assertEqual(sum(user in chunk for chunk in chunks), 1)
+        self.assertEqual(chunk_transcript(TRANSCRIPT, 10_000), [TRANSCRIPT])
+
+
+class TestChunkedParse(unittest.TestCase):
+    def test_chunks_are_merged_in_order_without_seam_duplicates(self):
+        replies = {
+            "bowtune_18048": {
+                "description": 'Will Walz say "gun"?',
+                "messages": [message("bowtune_18048", "2024-10-03, 5:37 PM", "P2")],
+            },
+            "angeldeln111": {
+                "description": "",
+                "messages": [
+                    # The description author and the previous chunk's last message repeated
+                    message("bruna.uma", "2024-10-02, 4:59 PM", ""),
+                    message("bowtune_18048", "2024-10-03, 5:37 PM", "P2"),
+                    message("angeldeln111", "2024-10-04, 2:24 AM", "P4"),
+                ],
+            },
+            "d0wn10ad": {
+                "description": "",
+                "messages": [message("d0wn10ad", "2024-10-04, 4:16 AM", "P4")],
+            },
+        }
+
+        def complete(model, messages, **kwargs):
+            chunk = messages[0]["content"].split("analyze:")[1]
+            user = next(user for user in replies if user in chunk)
+            content = json.dumps(replies[user])
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+            )
+
+        client = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+        with mock.patch("truth.tools.discussion_parser.Mistral", return_value=client):
+            parser = DiscussionParser(api_key="test")
+            parsed = parser.parse_from_str(TRANSCRIPT, chunk_chars=150)
+
+        self.assertEqual(parsed["description"], 'Will Walz say "gun"?')
+        self.assertEqual(
+            [m["user"] for m in parsed["messages"]],
+            ["bowtune_18048", "angeldeln111", "d0wn10ad"],
+        )
+
+
+class TestPreparse(unittest.TestCase):
+    def test_extracts_mechanical_fields(self):
+        parsed = preparse(TRANSCRIPT)
+        self.assertEqual(parsed["description"], 'Will Walz say "gun"? p1: No, p2: Yes.')
+        self.assertEqual(
+            [(m["user"], m["P"]) for m in parsed["messages"]],
+            [("bowtune_18048", "P2"), ("angeldeln111", "P4"), ("d0wn10ad", "P4")],
+        )
+        first = parsed["messages"][0]
+        self.assertEqual(first["timestamp"], "2024-10-03, 5:37 PM")
+        self.assertEqual(first["sources"], ["https://www.youtube.com/live/VAGZGQg31hs"])
+        self.assertNotIn("Discord user avatar", first["text"])
+
+    def test_only_a_leading_p_token_is_a_vote(self):
+        transcript = TRANSCRIPT + (
+            "\nnavi 2024-10-04, 7:51 AM\n"
+            "can someone explain why p4? (see https://x.io/a).\n"
+        )
+        message = preparse(transcript)["messages"][-1]
+        self.assertEqual(message["P"], "")
+        self.assertEqual(message["sources"], ["https://x.io/a"])
+
+    def test_structural_mode_makes_no_llm_call(self):
+        with mock.patch("truth.tools.discussion_parser.Mistral") as client:
+            parser = DiscussionParser(api_key="test")
+            parser.parse_from_str(TRANSCRIPT, mode="structural")
+            metrics = parser.calculate_metrics()
+        client.assert_not_called()
+        self.assertEqual(metrics["unique_users"], 3)
+        self.assertEqual(metrics["p_value_distribution"]["P4"], 2)
+        self.assertEqual(metrics["time_span"], "10:39:00")
+
+    def test_hybrid_mode_sends_only_messages_beyond_the_vote(self):
+        prompts = []
+
+        def complete(model, messages, **kwargs):
+            prompts.append(messages[0]["content"])
+            content = json.dumps(
+                {
+                    "messages": [
+                        {
+                            "index": 1,
+                            "evidence": "mentioned at 1:02:21",
+                            "rationale": "",
+                        }
+                    ]
+                }
+            )
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+            )
+
+        client = SimpleNamespace(chat=SimpleNamespace(complete=complete))
+        with mock.patch("truth.tools.discussion_parser.Mistral", return_value=client):
+            parser = DiscussionParser(api_key="test")
+            parsed = parser.parse_from_str(TRANSCRIPT, mode="hybrid")
+
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("[1] bowtune_18048", prompts[0])
+        self.assertNotIn("d0wn10ad", prompts[0])
+        self.assertEqual(parsed["messages"][0]["evidence"], "mentioned at 1:02:21")
+        self.assertEqual(parsed["messages"][2]["evidence"], "")
+
+    def test_unknown_mode(self):
+        parser = DiscussionParser(api_key="test")
+        with self.assertRaises(ValueError):
+            parser.parse_from_str(TRANSCRIPT, mode="fast")
+
+
+class TestIncrementalParse(unittest.TestCase):
+    def test_appended_messages_update_metrics(self):
+        parser = DiscussionParser(api_key="test")
+        head, rest = TRANSCRIPT.split("Discord user avatar\nangeldeln111", 1)
+        self.assertEqual(len(parser.append(head)), 1)
+        self.assertEqual(parser.metrics["p_value_distribution"]["P2"], 1)
+
+        # A discord.py-like feed of whole messages
+        feed = [
+            ("angeldeln111", datetime(2024, 10, 4, 2, 24), "P4 Too Early"),
+            ("d0wn10ad", datetime(2024, 10, 4, 16, 16), "P4"),
+            ("d0wn10ad", datetime(2024, 10, 5, 9, 5), "P4 see https://x.io/b"),
+        ]
+        for user, created_at, content in feed:
+            self.assertEqual(
+                len(parser.append(render_message(user, created_at, content))), 1
+            )
+
+        metrics = parser.metrics
+        self.assertEqual(metrics["total_messages"], 4)
+        self.assertEqual(metrics["unique_users"], 3)
+        self.assertEqual(metrics["p_value_distribution"]["P4"], 3)
+        self.assertEqual(metrics["time_span"], "1 day, 15:28:00")
+        message = parser.parsed["messages"][3]
+        self.assertEqual(message["timestamp"], "2024-10-05, 9:05 AM")
+        self.assertEqual(parser.calculate_metrics(), metrics)
+
+    def test_partial_text_waits_for_the_next_header(self):
+        parser = DiscussionParser(api_key="test")
+        self.assertEqual(parser.append(TRANSCRIPT[:120], complete=False), [])
+        messages = parser.append(TRANSCRIPT[120:], complete=False)
+        self.assertEqual(
+            [m["user"] for m in messages], ["bowtune_18048", "angeldeln111"]
+        )
+        self.assertIn("VAGZGQg31hs", messages[0]["text"])
+        self.assertEqual([m["user"] for m in parser.flush()], ["d0wn10ad"])
+        self.assertEqual(parser.parsed, preparse(TRANSCRIPT))
+
+    def test_follow_tails_a_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "discussions.txt")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(TRANSCRIPT)
+            stop = threading.Event()
+            stop.set()
+            parser = DiscussionParser(api_key="test")
+            batches = list(parser.follow(path, poll_interval=0, stop=stop))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertEqual(parser.metrics["p_value_distribution"]["P4"], 2)
+
+    def test_llm_mode_is_not_incremental(self):
+        with self.assertRaises(ValueError):
+            DiscussionParser(api_key="test").append(TRANSCRIPT, mode="llm")
+
+
+if __name__ == "__main__":
+    unittest.main()
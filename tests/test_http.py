@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+from unittest import mock
+import httpx
+from truth.http import HTTPTransport
+
+
+class TestHTTPTransport(unittest.TestCase):
+    def test_session_is_pooled_and_reused(self):
+        transport = HTTPTransport(max_connections_per_host=3)
+        session = transport.session
+        self.assertIs(session, transport.session)
+        adapter = session.get_adapter("https://example.com")
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertFalse(adapter._pool_block)
+
+    def test_default_timeout_is_applied(self):
+        transport = HTTPTransport(timeout=7, connect_timeout=2)
+        with mock.patch.object(transport.session, "get") as get:
+            transport.get("https://example.com")
+        self.assertEqual(get.call_args.kwargs["timeout"], (2, 7))
+
+    def test_async_client_is_created_per_event_loop(self):
+        transport = HTTPTransport()
+
+        async def client():
+            return transport.async_client
+
+        first = asyncio.run(client())
+        second = asyncio.run(client())
+        self.assertIsNot(first, second)
+
+    def test_per_host_limit(self):
+        active = {"now": 0, "peak": 0}
+
+        async def handler(request):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            return httpx.Response(200)
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            transport = HTTPTransport(max_connections_per_host=2, async_client=client)
+            await asyncio.gather(
+                *(transport.aget("https://example.com/") for _ in range(6))
+            )
+            await client.aclose()
+
+        asyncio.run(run())
+        self.assertEqual(active["peak"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
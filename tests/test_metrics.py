@@ -0,0 +1,49 @@
+import unittest
+from truth.metrics import Histogram, MetricsRegistry
+
+
+class TestHistogram(unittest.TestCase):
+    def test_quantiles(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.observe(value)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["sum"], 5050)
+        self.assertEqual((summary["p50"], summary["p95"], summary["p99"]), (50, 95, 99))
+
+    def test_window_bounds_samples(self):
+        histogram = Histogram(window=10)
+        for value in range(100):
+            histogram.observe(value)
+        self.assertEqual(len(histogram.samples), 10)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.quantile(0.5), 94)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_prometheus_export(self):
+        metrics = MetricsRegistry()
+        metrics.observe("truth_stage_duration_seconds", 0.5, stage="web_search")
+        metrics.observe("truth_stage_duration_seconds", 1.5, stage="web_search")
+        metrics.inc("truth_cache_lookups_total", stage="web_search", result="hit")
+        text = metrics.to_prometheus()
+        self.assertIn("# TYPE truth_stage_duration_seconds summary", text)
+        self.assertIn(
+            'truth_stage_duration_seconds{stage="web_search",quantile="0.99"} 1.5',
+            text,
+        )
+        self.assertIn('truth_stage_duration_seconds_count{stage="web_search"} 2', text)
+        self.assertIn("# TYPE truth_cache_lookups_total counter", text)
+        self.assertIn(
+            'truth_cache_lookups_total{result="hit",stage="web_search"} 1', text
+        )
+
+    def test_label_values_are_escaped(self):
+        metrics = MetricsRegistry()
+        metrics.inc("requests_total", url='https://e.com/"x"')
+        self.assertIn('url="https://e.com/\\"x\\""', metrics.to_prometheus())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from types import SimpleNamespace
+from benchmarks.fake_services import FakeServices
+from truth import VerifierAgent
+from truth.context import DeadlineExceeded
+from truth.metrics import MetricsRegistry
+from truth.ratelimit import LLMScheduler, TokenBucket, _retry_after
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"Status {status_code}")
+        self.status_code = status_code
+        self.headers = {"retry-after": retry_after} if retry_after else {}
+
+
+def response(total_tokens=10):
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault("base_delay", 0.001)
+    return LLMScheduler(metrics=MetricsRegistry(), **kwargs)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve_books_debt(self):
+        bucket = TokenBucket(per_minute=600)  # 10 per second, burst of 10
+        self.assertEqual(bucket.reserve(10), 0.0)
+        self.assertAlmostEqual(bucket.reserve(5), 0.5, places=2)
+
+    def test_unlimited(self):
+        self.assertEqual(TokenBucket().reserve(10**6), 0.0)
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def test_retries_throttled_calls(self):
+        calls = []
+
+        def flaky():
+            calls.append(time.monotonic())
+            if len(calls) < 3:
+                raise ProviderError(429)
+            return response()
+
+        limiter = scheduler(initial_concurrency=8)
+        self.assertIsNotNone(limiter.call(flaky))
+        self.assertEqual(len(calls), 3)
+        summary = limiter.summary()
+        self.assertEqual((summary["retries"], summary["throttled"]), (2, 2))
+        # Both throttles came from calls started after the previous cut
+        self.assertEqual(summary["concurrency"], 2)
+        self.assertEqual(summary["in_flight"], 0)
+
+    def test_respects_retry_after(self):
+        calls = []
+
+        def throttled_once():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise ProviderError(429, retry_after="0.2")
+            return response()
+
+        scheduler().call(throttled_once)
+        self.assertGreaterEqual(calls[1] - calls[0], 0.2)
+
+    def test_client_errors_are_not_retried(self):
+        limiter = scheduler()
+
+        def bad_request():
+            raise ProviderError(400)
+
+        with self.assertRaises(ProviderError):
+            limiter.call(bad_request)
+        self.assertEqual(limiter.summary()["failed"], 1)
+        self.assertEqual(limiter.summary()["in_flight"], 0)
+
+    def test_gives_up_after_max_retries(self):
+        limiter = scheduler(max_retries=2)
+
+        def unavailable():
+            raise ProviderError(503)
+
+        with self.assertRaises(ProviderError):
+            limiter.call(unavailable)
+        self.assertEqual(limiter.summary()["retries"], 2)
+
+    def test_concurrency_grows_while_saturated(self):
+        limiter = scheduler(initial_concurrency=2, max_concurrency=4)
+
+        def slow():
+            time.sleep(0.01)
+            return response()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: limiter.call(slow), range(64)))
+        self.assertEqual(limiter.summary()["concurrency"], 4)
+
+    def test_acall(self):
+        limiter = scheduler()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ProviderError(502)
+            return response()
+
+        self.assertIsNotNone(asyncio.run(limiter.acall(flaky)))
+        self.assertEqual(len(attempts), 2)
+
+    def test_waiting_coroutines_are_served_in_order(self):
+        limiter = scheduler(initial_concurrency=1, max_concurrency=1)
+        order = []
+
+        async def run():
+            async def call(i):
+                await asyncio.sleep(0.001 * i)
+                order.append(i)
+                return response()
+
+            waiters = [
+                asyncio.create_task(limiter.acall(lambda i=i: call(i)))
+                for i in range(20)
+            ]
+            await asyncio.sleep(0.001)
+            cancelled = waiters.pop(5)
+            cancelled.cancel()
+            await asyncio.gather(*waiters)
+
+        asyncio.run(run())
+        self.assertEqual(order, [i for i in range(20) if i != 5])
+        self.assertEqual(limiter.summary()["in_flight"], 0)
+        self.assertFalse(limiter._async_waiters)
+
+    def test_waiting_for_a_slot_respects_the_deadline(self):
+        limiter = scheduler(initial_concurrency=1, max_concurrency=1)
+        release = threading.Event()
+
+        def held():
+            release.wait(3)
+            return response()
+
+        async def noop():
+            return response()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(limiter.call, held)
+            time.sleep(0.05)
+            start = time.monotonic()
+            with self.assertRaises(DeadlineExceeded):
+                limiter.call(response, deadline=time.monotonic() + 0.2)
+            self.assertLess(time.monotonic() - start, 0.5)
+            with self.assertRaises(DeadlineExceeded):
+                asyncio.run(limiter.acall(noop, deadline=time.monotonic() + 0.2))
+            self.assertLess(time.monotonic() - start, 1.0)
+            release.set()
+        self.assertEqual(limiter.summary()["in_flight"], 0)
+
+    def test_retry_after_formats(self):
+        self.assertEqual(_retry_after({"retry-after": "3"}), 3.0)
+        self.assertIsNone(_retry_after({}))
+        date = formatdate(time.time() + 60, usegmt=True)
+        self.assertAlmostEqual(_retry_after({"retry-after": date}), 60, delta=2)
+
+
+class TestThrottledProvider(unittest.TestCase):
+    def test_verifications_survive_a_concurrency_ceiling(self):
+        with FakeServices(
+            llm_latency=0.02, search_latency=0, page_latency=0, chat_concurrency_limit=2
+        ) as services:
+            limiter = scheduler(initial_concurrency=8, max_retries=10)
+            agent = VerifierAgent(
+                mistral_api_key="test",
+                brave_api_key="test",
+                mistral_server_url=services.mistral_url,
+                brave_search_url=services.search_url,
+                llm_scheduler=limiter,
+                metrics=MetricsRegistry(),
+            )
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(
+                    executor.map(
+                        lambda i: agent.verify_statement(f"Statement {i}."), range(16)
+                    )
+                )
+        self.assertTrue(all(result["result"] == "Yes" for result in results))
+        self.assertGreater(services.requests["throttled"], 0)
+        self.assertLess(limiter.summary()["concurrency"], 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from truth.retrieval import BM25Index, chunk_text, estimate_tokens, select_passages
+
+
+class TestRetrieval(unittest.TestCase):
+    def test_chunk_text_overlaps(self):
+        words = [f"w{i}" for i in range(250)]
+        chunks = chunk_text(" ".join(words), max_words=100, overlap=10)
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(chunks[1].startswith("w90 "))
+        self.assertTrue(chunks[-1].endswith("w249"))
+
+    def test_bm25_prefers_matching_documents(self):
+        index = BM25Index()
+        index.add("earth", "The Earth is an oblate spheroid orbiting the Sun.")
+        index.add("cake", "Mix flour, eggs and sugar to bake a cake.")
+        index.add("moon", "The Moon orbits the Earth.")
+        ranked = index.search("Is the Earth round or flat?")
+        self.assertEqual({doc_id for doc_id, _ in ranked}, {"earth", "moon"})
+        self.assertEqual(index.search("sugar cake", top_k=1)[0][0], "cake")
+
+    def test_select_passages_respects_budget_and_order(self):
+        filler = " ".join(["lorem ipsum dolor sit amet"] * 200)
+        page = f"{filler} The boiling point of water is 100 degrees at sea level. {filler}"
+        context = {
+            "read_webpage_content": [
+                {"success": True, "content": page, "url": "https://a", "error": None},
+                {"success": False, "content": None, "url": "https://b", "error": "403"},
+            ]
+        }
+        selected = select_passages(
+            context, "boiling point of water", top_k=3, token_budget=200
+        )
+        self.assertEqual(selected[0]["url"], "https://a")
+        text = " ".join(selected[0]["passages"])
+        self.assertIn("boiling point of water", text)
+        self.assertLessEqual(sum(estimate_tokens(p) for p in selected[0]["passages"]), 200)
+        self.assertEqual(selected[1], {"action": "read_webpage_content", "url": "https://b", "error": "403"})
+
+
+    def test_select_passages_keeps_evidence_without_shared_words(self):
+        context = {
+            "read_webpage_content": [
+                {
+                    "success": True,
+                    "content": "The vote passed 52 to 48 in the Senate.",
+                    "url": "https://a",
+                    "error": None,
+                }
+            ]
+        }
+        query = "Did the bill get approved by lawmakers?"
+        selected = select_passages(context, query, token_budget=100)
+        self.assertEqual(selected[0]["passages"], ["The vote passed 52 to 48 in the Senate."])
+
+        filler = " ".join(["lorem ipsum dolor sit amet"] * 100)
+        context["read_webpage_content"].append(
+            {"success": True, "content": f"Bill approved. {filler}", "url": "https://b"}
+        )
+        selected = select_passages(context, query, top_k=1, token_budget=200)
+        self.assertEqual([source["url"] for source in selected], ["https://a", "https://b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import time
+import unittest
+from benchmarks.fake_services import FakeServices
+from truth import VerificationContext, VerifierAgent
+from truth.metrics import MetricsRegistry
+from truth.similarity import (
+    StatementIndex,
+    jaccard,
+    statement_tokens,
+    statement_words,
+)
+
+
+class TestStatementIndex(unittest.TestCase):
+    def test_paraphrases_share_tokens(self):
+        a = statement_tokens("Will Walz say gun during the debate?")
+        b = statement_tokens("Walz says gun during the debate.")
+        self.assertEqual(a, b)
+        self.assertIn("not", statement_words("Walz doesn't say gun"))
+
+    def test_reversed_roles_do_not_match(self):
+        index = StatementIndex(threshold=0.8, seed_threshold=0.5)
+        index.add("Will the Lakers beat the Celtics on Friday?", "lakers")
+        self.assertIsNone(index.query("Will the Celtics beat the Lakers on Friday?"))
+        index.add("Will the Celtics beat the Lakers on Friday?", "celtics")
+        self.assertEqual(len(index), 2)
+        match = index.query("The Celtics beat the Lakers on Friday.")
+        self.assertEqual(match["value"], "celtics")
+
+    def test_finds_near_duplicates(self):
+        index = StatementIndex(threshold=0.7)
+        index.add("The Eiffel Tower is taller than the Statue of Liberty.", "tower")
+        index.add("Bitcoin closes above 100k on Friday.", "bitcoin")
+        match = index.query("Is the Eiffel Tower taller than the Statue of Liberty?")
+        self.assertEqual(match["value"], "tower")
+        self.assertEqual(match["similarity"], 1.0)
+        self.assertIsNone(index.query("The Statue of Liberty is in Paris."))
+
+    def test_numbers_and_negations_must_agree(self):
+        index = StatementIndex(threshold=0.5)
+        index.add("Bitcoin closes above 100k on Friday 2024-11-01.", "bitcoin")
+        self.assertIsNone(index.query("Bitcoin closes above 90k on Friday 2024-11-01."))
+        self.assertIsNone(
+            index.query("Bitcoin does not close above 100k on Friday 2024-11-01.")
+        )
+        self.assertIsNotNone(index.query("Bitcoin closes above 100k Friday 2024-11-01"))
+
+    def test_seed_threshold_lowers_the_bar(self):
+        index = StatementIndex(threshold=0.9, seed_threshold=0.5)
+        index.add("SpaceX launches Starship from Texas in October.", "starship")
+        match = index.query("SpaceX launches Starship in October.")
+        self.assertLess(match["similarity"], 0.9)
+        self.assertGreaterEqual(match["similarity"], 0.5)
+
+    def test_least_recently_used_are_evicted(self):
+        index = StatementIndex(max_entries=2)
+        index.add("Apples are red.", 1)
+        index.add("Bananas are yellow.", 2)
+        index.query("Apples are red.")
+        index.add("Cherries are dark red.", 3)
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.query("Bananas are yellow."))
+        self.assertEqual(index.query("Apples are red.")["value"], 1)
+        self.assertTrue(all(len(bucket) <= 2 for bucket in index._buckets))
+
+    def test_expired_entries_are_dropped(self):
+        index = StatementIndex(default_ttl=0.01)
+        index.add("Apples are red.", 1)
+        time.sleep(0.02)
+        self.assertIsNone(index.query("Apples are red."))
+        self.assertEqual(len(index), 0)
+
+    def test_jaccard(self):
+        self.assertEqual(jaccard(frozenset("ab"), frozenset("bc")), 1 / 3)
+
+
+class TestReuse(unittest.TestCase):
+    def verify(self, index, statements):
+        with FakeServices(llm_latency=0, search_latency=0, page_latency=0) as services:
+            agent = VerifierAgent(
+                mistral_api_key="test",
+                brave_api_key="test",
+                mistral_server_url=services.mistral_url,
+                brave_search_url=services.search_url,
+                statement_index=index,
+                metrics=MetricsRegistry(),
+            )
+            results = []
+            for statement in statements:
+                ctx = VerificationContext()
+                results.append((agent.verify_statement(statement, ctx), ctx))
+        return results, services.requests
+
+    def test_near_duplicates_reuse_the_verdict(self):
+        index = StatementIndex(threshold=0.8)
+        results, requests = self.verify(
+            index, ["Will Walz say gun in the debate?", "Walz says gun in the debate."]
+        )
+        (first, _), (second, ctx) = results
+        self.assertNotIn("reused_from", first)
+        self.assertEqual(second["result"], first["result"])
+        self.assertEqual(second["statement"], "Walz says gun in the debate.")
+        self.assertEqual(second["reused_from"]["similarity"], 1.0)
+        self.assertEqual(second["total_prompt_tokens"], 0)
+        self.assertEqual(len(ctx.observations["read_webpage_content"]), 3)
+        self.assertEqual(requests["chat"], 2)
+        self.assertEqual(requests["page"], 3)
+
+    def test_entries_keep_only_the_selected_passages(self):
+        index = StatementIndex()
+        self.verify(index, ["Will Walz say gun in the debate?"])
+        value = index.query("Will Walz say gun in the debate?")["value"]
+        observations = value["observations"]["read_webpage_content"]
+        self.assertEqual(len(observations), 3)
+        stored = sum(len(observation["content"]) for observation in observations)
+        # Three 20 kB pages, cut down to the verdict's 2000 token budget
+        self.assertLess(stored, 2000 * 5)
+
+    def test_weaker_matches_seed_the_evidence(self):
+        index = StatementIndex(threshold=0.95, seed_threshold=0.5)
+        results, requests = self.verify(
+            index,
+            [
+                "SpaceX launches Starship from Texas in October.",
+                "SpaceX launches Starship in October.",
+            ],
+        )
+        second, ctx = results[1]
+        self.assertIn("seeded_from", second)
+        self.assertEqual(second["result"], "Yes")
+        stages = [span["stage"] for span in ctx.spans]
+        self.assertNotIn("web_search", stages)
+        self.assertEqual(requests["search"], 1)
+        self.assertEqual(requests["chat"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,376 @@
+import threading
+import time
 import unittest
-from truth import Verifier
+from benchmarks.fake_services import FakeServices
+from truth import VerificationContext, VerifierAgent
+from truth.http import HTTPTransport
+from truth.metrics import MetricsRegistry
+from truth.verifier import _pack_by_budget, direct_query, parse_query
+
 
 class TestVerifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.services = FakeServices(
+            llm_latency=0,
+            completion_tokens=50,
+            search_latency=0,
+            page_latency=0,
+            page_bytes=2000,
+        ).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.services.stop()
+
     def setUp(self):
-        self.verifier = Verifier()
+        self.verifier = VerifierAgent(
+            mistral_api_key="test",
+            brave_api_key="test",
+            mistral_server_url=self.services.mistral_url,
+            brave_search_url=self.services.search_url,
+            transport=HTTPTransport(),
+            metrics=MetricsRegistry(),
+        )
+
+    def tearDown(self):
+        self.verifier.transport.close()
 
     def test_verify(self):
-        result = self.verifier.verify("The Earth is round.")
-        self.assertIsNotNone(result)
+        ctx = VerificationContext()
+        result = self.verifier.verify_statement("The Earth is round.", ctx)
+        self.assertEqual(result["result"], "Yes")
+        self.assertEqual(len(ctx.observations["read_webpage_content"]), 3)
+        self.assertEqual(result["total_completion_tokens"], 100)
+
+    def test_verify_uma_vote(self):
+        message = {
+            "user": "User1",
+            "timestamp": "2024-10-01, 10:00 AM",
+            "P": "P2",
+            "evidence": "",
+            "rationale": "",
+            "sources": [f"{self.services.url}/pages/1"],
+        }
+        result = self.verifier.verify_uma_vote("P1: No. P2: Yes.", message)
+        self.assertTrue(result["is_correct"])
+        self.assertEqual(result["voted_P"], "P2")
+
+    def test_vote_prompts_render_the_parsed_fields(self):
+        message = {"P": "P2", "evidence": "Final score 3-1", "rationale": "P2 won"}
+        prompt = self.verifier.build_uma_vote_prompt(
+            "P1: No. P2: Yes.", message, VerificationContext()
+        )
+        self.assertIn("evidence: Final score 3-1", prompt)
+        self.assertIn("rationale: P2 won", prompt)
+
+    def test_verify_discussion_fetches_each_source_once(self):
+        urls = [f"{self.services.url}/pages/{i}" for i in range(5)]
+        parsed = {
+            "description": "P1: No. P2: Yes.",
+            "messages": [
+                {
+                    "user": f"User{i}",
+                    "timestamp": "2024-10-01, 10:00 AM",
+                    "P": "P2",
+                    "evidence": "",
+                    "rationale": "",
+                    "sources": [urls[i % 5], urls[(i + 1) % 5]],
+                }
+                for i in range(40)
+            ],
+        }
+        pages_before = self.services.requests["page"]
+        discussion = self.verifier.verify_discussion(parsed, concurrency=8)
+        self.assertEqual(self.services.requests["page"] - pages_before, 5)
+        self.assertEqual(discussion["sources"], urls)
+        self.assertEqual(len(discussion["results"]), 40)
+        self.assertTrue(all(r["is_correct"] for r in discussion["results"]))
+        self.assertEqual(discussion["usage"]["votes"], 40)
+        self.assertEqual(discussion["usage"]["total_completion_tokens"], 40 * 50)
+
+    def test_packed_votes_share_prompts(self):
+        parsed = {
+            "description": "P1: No. P2: Yes.",
+            "messages": [
+                {
+                    "user": f"User{i}",
+                    "timestamp": "2024-10-01, 10:00 AM",
+                    "P": f"P{1 + i % 2}",
+                    "evidence": "x" * 400,
+                    "rationale": "",
+                    "sources": [],
+                }
+                for i in range(10)
+            ],
+        }
+        chats_before = self.services.requests["chat"]
+        streamed = {}
+        discussion = self.verifier.verify_discussion(
+            parsed,
+            pack_token_budget=4000,
+            on_result=lambda index, result: streamed.setdefault(index, result),
+        )
+        self.assertEqual(
+            [streamed[i] for i in sorted(streamed)], discussion["results"]
+        )
+        prompts = self.services.requests["chat"] - chats_before
+        self.assertEqual(discussion["usage"]["prompts"], prompts)
+        self.assertGreater(prompts, 1)
+        self.assertLess(prompts, 10)
+        self.assertEqual(
+            [r["voted_P"] for r in discussion["results"]],
+            [f"P{1 + i % 2}" for i in range(10)],
+        )
+        self.assertTrue(all(r["is_correct"] for r in discussion["results"]))
+
+
+class TestSpeculativePrefetch(unittest.TestCase):
+    def test_pages_are_read_while_planning(self):
+        with FakeServices(
+            llm_latency=0.3, search_latency=0, page_latency=0.3
+        ) as services:
+            agent = VerifierAgent(
+                mistral_api_key="test",
+                brave_api_key="test",
+                mistral_server_url=services.mistral_url,
+                brave_search_url=services.search_url,
+                planner="llm",
+                speculative=True,
+                metrics=MetricsRegistry(),
+            )
+            ctx = VerificationContext()
+            result = agent.verify_statement("The Earth is round.", ctx)
+        self.assertEqual(result["result"], "Yes")
+        self.assertEqual(services.requests["page"], 3)
+        self.assertEqual(len(ctx.observations["read_webpage_content"]), 3)
+        spans = {span["stage"]: span for span in ctx.spans}
+        self.assertLess(spans["action"]["start"], spans["verdict"]["start"] - 0.3)
+        actions = [span for span in ctx.spans if span["stage"] == "action"]
+        self.assertTrue(all(span.get("prefetch") for span in actions))
+        used = agent.metrics.counter("truth_prefetch_total", result="used")
+        self.assertEqual(used, 3)
+
+    def test_unused_prefetches_are_discarded(self):
+        reads = []
+
+        def reader(url, transport=None):
+            reads.append(url)
+            return {"success": True, "content": url, "url": url, "error": None}
+
+        agent = VerifierAgent(
+            mistral_api_key="test",
+            brave_api_key="test",
+            planner="llm",
+            speculative=True,
+            metrics=MetricsRegistry(),
+        )
+        agent.available_actions = {
+            "read": {"function": reader, "fallback": True, "description": ""}
+        }
+        ctx = VerificationContext()
+        executor = agent._start_prefetch(["https://e.com/1", "https://e.com/2"], ctx)
+        self.assertEqual(executor._max_workers, agent.max_concurrent_actions)
+        plan = [{"action_name": "read", "params": {"url": "https://e.com/1"}}]
+        agent.take_actions(plan, ctx, executor)
+        executor.shutdown()
+        self.assertEqual(reads.count("https://e.com/1"), 1)
+        self.assertEqual(len(ctx.observations["read"]), 1)
+        self.assertEqual(ctx.prefetches, {})
+        counter = agent.metrics.counter
+        self.assertEqual(counter("truth_prefetch_total", result="used"), 1)
+        self.assertEqual(counter("truth_prefetch_total", result="wasted"), 1)
+
+    def test_prefetches_count_against_the_action_limit(self):
+        lock = threading.Lock()
+        running, peak = [0], [0]
+
+        def reader(url, transport=None):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return {"success": True, "content": url, "url": url, "error": None}
+
+        agent = VerifierAgent(
+            mistral_api_key="test",
+            brave_api_key="test",
+            planner="llm",
+            speculative=True,
+            max_concurrent_actions=2,
+            metrics=MetricsRegistry(),
+        )
+        agent.available_actions = {
+            "read": {"function": reader, "fallback": True, "description": ""}
+        }
+        ctx = VerificationContext()
+        urls = [f"https://e.com/{i}" for i in range(4)]
+        executor = agent._start_prefetch(urls, ctx)
+        plan = [{"action_name": "read", "params": {"url": url}} for url in urls]
+        agent.take_actions(plan, ctx, executor)
+        executor.shutdown()
+        self.assertEqual(len(ctx.observations["read"]), 4)
+        self.assertEqual(peak[0], 2)
+
+
+class TestFastMode(unittest.TestCase):
+    def verify(self, statement):
+        with FakeServices(llm_latency=0, search_latency=0, page_latency=0) as services:
+            agent = VerifierAgent(
+                mistral_api_key="test",
+                brave_api_key="test",
+                mistral_server_url=services.mistral_url,
+                brave_search_url=services.search_url,
+                planner="llm",
+                fast=True,
+                metrics=MetricsRegistry(),
+            )
+            ctx = VerificationContext()
+            result = agent.verify_statement(statement, ctx)
+        return result, ctx, services.requests["chat"]
+
+    def test_query_and_plan_take_one_call(self):
+        result, ctx, calls = self.verify("The Earth is round.")
+        self.assertEqual(result["result"], "Yes")
+        self.assertEqual(calls, 2)
+        self.assertEqual(len(ctx.observations["read_webpage_content"]), 3)
+        stages = [span["stage"] for span in ctx.spans]
+        self.assertNotIn("plan_actions", stages)
+
+    def test_questions_are_not_reformulated(self):
+        result, ctx, calls = self.verify("Is the Earth round?")
+        self.assertEqual(result["result"], "Yes")
+        self.assertEqual(calls, 1)
+
+    def test_parse_query(self):
+        query = parse_query(
+            '{"question": "Is it?", "preferred_sources": ["wikipedia.org"]}', "It is."
+        )
+        self.assertEqual(query["search_query"], "Is it?")
+        self.assertEqual(query["preferred_sources"], ["wikipedia.org"])
+        self.assertEqual(parse_query("not json", "It is.")["question"], "It is.")
+        self.assertIsNone(direct_query("Is it? Then it was."))
+
+    def test_preferred_sources_are_read_first(self):
+        agent = VerifierAgent(
+            mistral_api_key="test", brave_api_key="test", metrics=MetricsRegistry()
+        )
+        query = {"question": "", "search_query": "", "preferred_sources": ["b.org"]}
+        links = [f"https://a.com/{i}" for i in range(4)] + [
+            "ftp://c.net/z",
+            "https://b.org/y",
+        ]
+        plan = agent.plan_from_query(query, links)
+        urls = [action["params"]["url"] for action in plan]
+        self.assertEqual(
+            urls, ["https://b.org/y", "https://a.com/0", "https://a.com/1"]
+        )
+
+
+class TestDeadlines(unittest.TestCase):
+    def agent(self, services):
+        return VerifierAgent(
+            mistral_api_key="test",
+            brave_api_key="test",
+            mistral_server_url=services.mistral_url,
+            brave_search_url=services.search_url,
+            metrics=MetricsRegistry(),
+        )
+
+    def test_slow_sources_are_dropped(self):
+        with FakeServices(llm_latency=0, search_latency=0, page_latency=2) as services:
+            start = time.monotonic()
+            result = self.agent(services).verify_statement(
+                "The Earth is round.", deadline=1
+            )
+            elapsed = time.monotonic() - start
+            spans = len(result["spans"])
+            # The abandoned reads finish after the result was returned
+            time.sleep(1.2)
+        self.assertEqual(len(result["spans"]), spans)
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(result["result"], "Yes")
+        self.assertTrue(result["partial"])
+        self.assertEqual(len(result["dropped_sources"]), 3)
+
+    def test_late_verdict_is_unknown(self):
+        with FakeServices(
+            llm_latency=1.5, search_latency=0, page_latency=0
+        ) as services:
+            start = time.monotonic()
+            result = self.agent(services).verify_statement(
+                "The Earth is round.", deadline=1
+            )
+            elapsed = time.monotonic() - start
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(result["result"], "Unknown")
+        self.assertTrue(result["partial"])
+
+    def test_no_deadline_keeps_the_result_format(self):
+        with FakeServices(llm_latency=0, search_latency=0, page_latency=0) as services:
+            result = self.agent(services).verify_statement("The Earth is round.")
+        self.assertNotIn("partial", result)
+
+
+class TestBatch(unittest.TestCase):
+    def test_results_keep_input_order(self):
+        class LastFirst(VerifierAgent):
+            def verify_statement(self, statement, ctx=None, deadline=None):
+                result = super().verify_statement(statement, ctx, deadline)
+                # Each statement finishes only after the next one has
+                index = int(statement.split()[-1])
+                if index + 1 < len(done):
+                    done[index + 1].wait(5)
+                done[index].set()
+                return result
+
+        with FakeServices(llm_latency=0, search_latency=0, page_latency=0) as services:
+            agent = LastFirst(
+                mistral_api_key="test",
+                brave_api_key="test",
+                mistral_server_url=services.mistral_url,
+                brave_search_url=services.search_url,
+                metrics=MetricsRegistry(),
+            )
+            statements = [
+                "The Earth is round, says statement 0",
+                "Water boils at 100 degrees Celsius at sea level, says statement 1",
+                "Is the Moon made of rock? Asks statement 2",
+                "Mount Everest is the tallest mountain on Earth, says statement 3",
+            ]
+            done = [threading.Event() for _ in statements]
+            completed = [
+                index for index, _ in agent.iter_verify_statements(statements, 4)
+            ]
+            done = [threading.Event() for _ in statements]
+            batch = agent.verify_statements(statements, concurrency=4)
+        self.assertEqual(completed, [3, 2, 1, 0])
+        results = batch["results"]
+        self.assertEqual([r["statement"] for r in results], statements)
+        prompt_tokens = [r["usage"]["total_prompt_tokens"] for r in results]
+        self.assertTrue(all(tokens > 0 for tokens in prompt_tokens))
+        self.assertEqual(len(set(prompt_tokens)), len(statements))
+        self.assertEqual(batch["usage"]["statements"], len(statements))
+        for key in ("total_prompt_tokens", "total_completion_tokens"):
+            self.assertEqual(
+                batch["usage"][key], sum(r["usage"][key] for r in results)
+            )
+
+
+class TestVotePacking(unittest.TestCase):
+    def test_pack_by_budget(self):
+        self.assertEqual(_pack_by_budget([3, 3, 3, 9, 1], 6), [[0, 1], [2], [3], [4]])
+
+    def test_missing_votes_are_marked_failed(self):
+        agent = VerifierAgent(mistral_api_key="test")
+        messages = [{"P": "P1"}, {"P": "P2"}, {"P": "P3"}]
+        content = '{"votes": [{"vote": "2", "voted_P": "P2", "is_correct": true}]}'
+        results = agent._parse_uma_votes_result(content, messages)
+        self.assertEqual([r["voted_P"] for r in results], ["P1", "P2", "P3"])
+        self.assertEqual([r["is_correct"] for r in results], [False, True, False])
+
 
-if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+from .context import VerificationContext
 from .verifier import VerifierAgent
+from .async_verifier import AsyncVerifierAgent
 
-__all__ = ["VerifierAgent"]
+__all__ = ["VerifierAgent", "AsyncVerifierAgent", "VerificationContext"]
 __version__ = "0.1.0"
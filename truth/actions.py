@@ -1,42 +1,293 @@
-import wikipedia
+import asyncio
+import re
+import threading
+import tracemalloc
 from urllib.parse import unquote, urlparse, parse_qs
 from youtube_transcript_api import YouTubeTranscriptApi
+import httpx
 import requests
 from bs4 import BeautifulSoup
 import time
+from .http import get_transport
 
+try:
+    import lxml  # noqa: F401
 
-def read_wiki_entry(url, max_chars: int | None = None):
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+WEBPAGE_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+        " AppleWebKit/537.36 (KHTML, like Gecko)"
+        " Chrome/91.0.4472.124 Safari/537.36"
+    )
+}
+MAX_RETRIES = 3
+RETRY_DELAY = 2
+# Webpage bodies are streamed and cut off after this many bytes
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+TEXT_CONTENT_TYPES = (
+    "text/html",
+    "application/xhtml+xml",
+    "text/plain",
+    "text/xml",
+    "application/xml",
+)
+# Record the peak traced Python heap of each page extraction in its stats as
+# peak_heap_bytes. tracemalloc is process-wide: measured extractions run one at
+# a time, allocations of other threads during one still count, and nothing is
+# measured while someone else (e.g. a benchmark) is already tracing.
+MEASURE_PAGE_MEMORY = False
+_MEMORY_LOCK = threading.Lock()
+
+# Time-to-live (seconds) of cached reader results, per source
+SOURCE_CACHE_TTLS = {
+    "webpage": 24 * 3600,
+    "wiki": 7 * 24 * 3600,
+    "youtube": 30 * 24 * 3600,
+}
+_source_cache = None
+
+
+def set_source_cache(cache):
     """
-    Reads the summary of a Wikipedia entry from the given URL.
-    Parameters:
-        url (str): The URL of the Wikipedia page.
-        max_chars (int, optional): Maximum number of characters to return.
-    Returns:
-        dict: A dictionary containing the success status, content, URL, and any error.
+    Installs the cache shared by all source readers, e.g. truth.cache.SQLiteCache().
+    Any object with get(key, allow_stale)/set(key, value, ttl, meta)/touch(key, ttl)
+    works. Pass None to disable caching.
     """
-    try:
-        # Extract the page title from the URL
-        parsed_url = urlparse(url)
-        page_title = unquote(parsed_url.path.split("/")[-1])
+    global _source_cache
+    _source_cache = cache
+
+
+def get_source_cache():
+    return _source_cache
+
+
+def _cache_lookup(source, url, allow_stale=False):
+    if _source_cache is None:
+        return None
+    return _source_cache.get(f"{source}:{url}", allow_stale=allow_stale)
+
+
+def _cache_store(source, url, result, meta=None):
+    if _source_cache is not None and result["success"]:
+        _source_cache.set(
+            f"{source}:{url}", result, ttl=SOURCE_CACHE_TTLS[source], meta=meta
+        )
+
+
+def _cache_refresh(source, url):
+    if _source_cache is not None:
+        _source_cache.touch(f"{source}:{url}", ttl=SOURCE_CACHE_TTLS[source])
+
+
+def _truncate(result, max_chars):
+    if max_chars and result.get("content"):
+        return {**result, "content": result["content"][:max_chars]}
+    return result
+
+
+def _cached_result(entry, max_chars=None):
+    """A result served from the source cache, flagged as such for timing spans."""
+    return {**_truncate(entry["value"], max_chars), "cached": True}
+
+
+def _revalidation_headers(entry):
+    """Conditional request headers for a stale cached page."""
+    if entry is None:
+        return {}
+    headers = {}
+    if entry["meta"].get("etag"):
+        headers["If-None-Match"] = entry["meta"]["etag"]
+    if entry["meta"].get("last_modified"):
+        headers["If-Modified-Since"] = entry["meta"]["last_modified"]
+    return headers
+
+
+def _validators(response_headers):
+    return {
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+    }
+
+
+def _wiki_title(url):
+    parsed_url = urlparse(url)
+    return unquote(parsed_url.path.split("/")[-1])
+
+
+def _youtube_video_id(url):
+    parsed_url = urlparse(url)
+    return (
+        parse_qs(parsed_url.query).get("v", [None])[0]
+        or parsed_url.path.split("/")[-1]
+    )
+
+
+def _clean_strings(strings):
+    """Splits strings on newlines and double spaces and drops empty fragments, in one pass."""
+    phrases = []
+    for string in strings:
+        for line in string.splitlines():
+            for phrase in line.split("  "):
+                phrase = phrase.strip()
+                if phrase:
+                    phrases.append(phrase)
+    return "\n".join(phrases)
+
+
+def _extract_text(html, parser: str | None = None):
+    soup = BeautifulSoup(html, parser or HTML_PARSER)
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
 
-        # Use Wikipedia API to get the page content
-        page = wikipedia.page(page_title, auto_suggest=False)
+    return _clean_strings(soup.stripped_strings)
 
+
+def _is_text_content(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    return not media_type or media_type in TEXT_CONTENT_TYPES
+
+
+def _unsupported_content(url, content_type):
+    return {
+        "success": False,
+        "content": None,
+        "url": url,
+        "error": f"Unsupported content type: {content_type}",
+    }
+
+
+def _read_capped(chunks, max_bytes: int):
+    """Joins streamed chunks until max_bytes. Returns (body, truncated)."""
+    body = bytearray()
+    for chunk in chunks:
+        body.extend(chunk)
+        if len(body) >= max_bytes:
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+def _extract_page(body: bytes, content_type: str):
+    """Extracts the text of a page body. Returns (text, extract_time)."""
+    start_time = time.perf_counter()
+    if content_type.split(";")[0].strip().lower() == "text/plain":
+        text = _clean_strings([body.decode("utf-8", errors="replace")])
+    else:
+        text = _extract_text(body)
+    return text, time.perf_counter() - start_time
+
+
+def _page_result(url, body: bytes, content_type: str, fetch_time: float, truncated: bool):
+    """Extracts the text of a fetched page and attaches per-page extraction stats."""
+    if b"\x00" in body[:1024]:
+        return _unsupported_content(url, content_type or "binary")
+
+    peak_heap = None
+    if MEASURE_PAGE_MEMORY:
+        with _MEMORY_LOCK:
+            if tracemalloc.is_tracing():
+                # Not our tracer; resetting its peak would corrupt its numbers
+                text, extract_time = _extract_page(body, content_type)
+            else:
+                tracemalloc.start()
+                try:
+                    text, extract_time = _extract_page(body, content_type)
+                    peak_heap = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+    else:
+        text, extract_time = _extract_page(body, content_type)
+
+    stats = {
+        "bytes": len(body),
+        "truncated": truncated,
+        "fetch_time": round(fetch_time, 4),
+        "extract_time": round(extract_time, 4),
+        "extract_mb_per_s": round(len(body) / 1e6 / extract_time, 2)
+        if extract_time
+        else None,
+    }
+    if peak_heap is not None:
+        stats["peak_heap_bytes"] = peak_heap
+    return {
+        "success": True,
+        "content": text,
+        "url": url,
+        "error": None,
+        "stats": stats,
+    }
+
+
+def _wiki_query(url):
+    """MediaWiki API endpoint and parameters for the intro of a Wikipedia URL."""
+    api_url = f"https://{urlparse(url).netloc or 'en.wikipedia.org'}/w/api.php"
+    params = {
+        "action": "query",
+        "format": "json",
+        "prop": "extracts|info|pageprops",
+        "exintro": "",
+        "explaintext": "",
+        "inprop": "url",
+        "ppprop": "disambiguation",
+        "redirects": "",
+        "titles": _wiki_title(url),
+    }
+    return api_url, params
+
+
+def _wiki_result(url, payload):
+    page_title = _wiki_title(url)
+    pages = payload.get("query", {}).get("pages", {})
+    page = next(iter(pages.values()), {})
+    if "missing" in page or not page:
         return {
-            "success": True,
-            "content": page.summary[:max_chars] if max_chars else page.summary,
-            "url": page.url,
-            "error": None,
+            "success": False,
+            "content": None,
+            "error": f'PageError: Page id "{page_title}" does not match any pages. Try another id!',
         }
-    except wikipedia.exceptions.DisambiguationError as e:
+    if "disambiguation" in page.get("pageprops", {}):
         return {
             "success": False,
             "content": None,
-            "error": f"DisambiguationError: {str(e)}",
+            "error": f"DisambiguationError: {page_title} may refer to several pages",
         }
-    except wikipedia.exceptions.PageError as e:
-        return {"success": False, "content": None, "error": f"PageError: {str(e)}"}
+    return {
+        "success": True,
+        "content": page.get("extract", "").strip(),
+        "url": page.get("fullurl", url),
+        "error": None,
+    }
+
+
+def read_wiki_entry(url, max_chars: int | None = None, transport=None):
+    """
+    Reads the summary of a Wikipedia entry from the given URL.
+    Parameters:
+        url (str): The URL of the Wikipedia page.
+        max_chars (int, optional): Maximum number of characters to return.
+        transport (HTTPTransport, optional): Defaults to the shared transport.
+    Returns:
+        dict: A dictionary containing the success status, content, URL, and any error.
+    """
+    cached = _cache_lookup("wiki", url)
+    if cached:
+        return _cached_result(cached, max_chars)
+
+    try:
+        api_url, params = _wiki_query(url)
+        response = (transport or get_transport()).get(
+            api_url, params=params, headers=WEBPAGE_HEADERS
+        )
+        response.raise_for_status()
+        result = _wiki_result(url, response.json())
+        _cache_store("wiki", url, result)
+        return _truncate(result, max_chars)
     except Exception as e:
         return {
             "success": False,
@@ -45,28 +296,40 @@ def read_wiki_entry(url, max_chars: int | None = None):
         }
 
 
-def read_youtube_transcript(url):
+def _fetch_transcript(video_id, session):
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        # youtube_transcript_api < 1.0 only offers the classmethod API
+        return YouTubeTranscriptApi.get_transcript(video_id)
+    fetched = YouTubeTranscriptApi(http_client=session).fetch(video_id)
+    return fetched.to_raw_data()
+
+
+def read_youtube_transcript(url, transport=None):
     """
     Retrieves the transcript of a YouTube video from the given URL.
     Parameters:
         url (str): The URL of the YouTube video.
+        transport (HTTPTransport, optional): Defaults to the shared transport.
     Returns:
         dict: A dictionary containing the success status, transcript content, URL, and any error.
     """
+    cached = _cache_lookup("youtube", url)
+    if cached:
+        return _cached_result(cached)
+
     try:
-        parsed_url = urlparse(url)
-        video_id = (
-            parse_qs(parsed_url.query).get("v", [None])[0]
-            or parsed_url.path.split("/")[-1]
-        )
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        video_id = _youtube_video_id(url)
+        session = (transport or get_transport()).session
+        transcript = _fetch_transcript(video_id, session)
         transcript_text = " ".join([entry["text"] for entry in transcript])
-        return {
+        result = {
             "success": True,
             "content": transcript_text,
             "url": url,
             "error": None,
         }
+        _cache_store("youtube", url, result)
+        return result
     except Exception as e:
         return {
             "success": False,
@@ -75,50 +338,50 @@ def read_youtube_transcript(url):
         }
 
 
-def read_webpage_content(url, max_chars: int | None = None):
+def read_webpage_content(url, max_chars: int | None = None, transport=None):
     """
     Fetches and extracts the text content from a webpage.
     Parameters:
         url (str): The URL of the webpage.
         max_chars (int, optional): Maximum number of characters to return.
+        transport (HTTPTransport, optional): Defaults to the shared transport.
     Returns:
         dict: A dictionary containing the success status, content, URL, and any error.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-            " AppleWebKit/537.36 (KHTML, like Gecko)"
-            " Chrome/91.0.4472.124 Safari/537.36"
-        )
-    }
-    max_retries = 3
-    retry_delay = 2
+    max_retries = MAX_RETRIES
+    retry_delay = RETRY_DELAY
+    transport = transport or get_transport()
+
+    # Fresh hits are served locally; stale ones are revalidated below
+    cached = _cache_lookup("webpage", url, allow_stale=True)
+    if cached and not cached["stale"]:
+        return _cached_result(cached, max_chars)
+    headers = {**WEBPAGE_HEADERS, **_revalidation_headers(cached)}
 
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()  # Raise an HTTPError for bad responses
-
-            soup = BeautifulSoup(response.content, "html.parser")
+            start_time = time.perf_counter()
+            response = transport.get(url, headers=headers, stream=True)
+            try:
+                if cached and response.status_code == 304:
+                    _cache_refresh("webpage", url)
+                    return _cached_result(cached, max_chars)
+                response.raise_for_status()  # Raise an HTTPError for bad responses
 
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
+                # Reject binaries before downloading them
+                content_type = response.headers.get("Content-Type", "")
+                if not _is_text_content(content_type):
+                    return _unsupported_content(url, content_type)
+                body, truncated = _read_capped(
+                    response.iter_content(STREAM_CHUNK_SIZE), MAX_PAGE_BYTES
+                )
+            finally:
+                response.close()
 
-            # Extract text
-            text = soup.get_text(separator="\n", strip=True)
-
-            # Basic text cleaning
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = "\n".join(chunk for chunk in chunks if chunk)
-
-            return {
-                "success": True,
-                "content": text[:max_chars] if max_chars else text,
-                "url": url,
-                "error": None,
-            }
+            fetch_time = time.perf_counter() - start_time
+            result = _page_result(url, body, content_type, fetch_time, truncated)
+            _cache_store("webpage", url, result, _validators(response.headers))
+            return _truncate(result, max_chars)
 
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 403:
@@ -150,17 +413,175 @@ def read_webpage_content(url, max_chars: int | None = None):
     }
 
 
+async def aread_wiki_entry(url, max_chars: int | None = None, transport=None):
+    """
+    Async variant of read_wiki_entry.
+    Parameters:
+        url (str): The URL of the Wikipedia page.
+        max_chars (int, optional): Maximum number of characters to return.
+        transport (HTTPTransport, optional): Defaults to the shared transport.
+    Returns:
+        dict: A dictionary containing the success status, content, URL, and any error.
+    """
+    cached = _cache_lookup("wiki", url)
+    if cached:
+        return _cached_result(cached, max_chars)
+
+    try:
+        api_url, params = _wiki_query(url)
+        response = await (transport or get_transport()).aget(
+            api_url, params=params, headers=WEBPAGE_HEADERS
+        )
+        response.raise_for_status()
+        result = _wiki_result(url, response.json())
+        _cache_store("wiki", url, result)
+        return _truncate(result, max_chars)
+    except Exception as e:
+        return {
+            "success": False,
+            "content": None,
+            "error": f"Unexpected error: {str(e)}",
+        }
+
+
+async def aread_youtube_transcript(url, transport=None):
+    """
+    Async variant of read_youtube_transcript.
+    youtube_transcript_api only ships a blocking client, so the lookup runs in
+    a worker thread to keep the event loop free.
+    Parameters:
+        url (str): The URL of the YouTube video.
+        transport (HTTPTransport, optional): Defaults to the shared transport.
+    Returns:
+        dict: A dictionary containing the success status, transcript content, URL, and any error.
+    """
+    return await asyncio.to_thread(read_youtube_transcript, url, transport)
+
+
+async def aread_webpage_content(url, max_chars: int | None = None, transport=None):
+    """
+    Async variant of read_webpage_content.
+    Parameters:
+        url (str): The URL of the webpage.
+        max_chars (int, optional): Maximum number of characters to return.
+        transport (HTTPTransport, optional): Defaults to the shared transport.
+    Returns:
+        dict: A dictionary containing the success status, content, URL, and any error.
+    """
+    transport = transport or get_transport()
+    cached = _cache_lookup("webpage", url, allow_stale=True)
+    if cached and not cached["stale"]:
+        return _cached_result(cached, max_chars)
+    headers = {**WEBPAGE_HEADERS, **_revalidation_headers(cached)}
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            start_time = time.perf_counter()
+            async with transport.astream(url, headers=headers) as response:
+                if cached and response.status_code == 304:
+                    _cache_refresh("webpage", url)
+                    return _cached_result(cached, max_chars)
+                response.raise_for_status()
+
+                # Reject binaries before downloading them
+                content_type = response.headers.get("Content-Type", "")
+                if not _is_text_content(content_type):
+                    return _unsupported_content(url, content_type)
+                body, truncated = bytearray(), False
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    body.extend(chunk)
+                    if len(body) >= MAX_PAGE_BYTES:
+                        body, truncated = body[:MAX_PAGE_BYTES], True
+                        break
+
+            fetch_time = time.perf_counter() - start_time
+            # Parsing is CPU bound; keep it off the event loop
+            result = await asyncio.to_thread(
+                _page_result, url, bytes(body), content_type, fetch_time, truncated
+            )
+            _cache_store("webpage", url, result, _validators(response.headers))
+            return _truncate(result, max_chars)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 403:
+                return {
+                    "success": False,
+                    "content": None,
+                    "error": f"Access forbidden (403). The website may be blocking automated access: {url}",
+                }
+            return {
+                "success": False,
+                "content": None,
+                "error": f"HTTP Error: {e}",
+            }
+        except httpx.HTTPError as e:
+            if attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+            return {
+                "success": False,
+                "content": None,
+                "error": f"Failed to fetch the webpage after {MAX_RETRIES} attempts: {e}",
+            }
+
+    return {
+        "success": False,
+        "content": None,
+        "error": f"Failed to fetch the webpage after {MAX_RETRIES} attempts due to unknown reasons.",
+    }
+
+
 AVAILABLE_ACTIONS = {
     "read_wiki_entry": {
         "function": read_wiki_entry,
+        "async_function": aread_wiki_entry,
+        "url_patterns": [r"^https?://([\w-]+\.)?(m\.)?wikipedia\.org/wiki/"],
         "description": "Reads the summary of a Wikipedia entry from a given Wikipedia URL.",
     },
     "read_youtube_transcript": {
         "function": read_youtube_transcript,
+        "async_function": aread_youtube_transcript,
+        "url_patterns": [
+            r"^https?://((www|m)\.)?youtube\.com/(watch\?|shorts/|live/)",
+            r"^https?://youtu\.be/",
+        ],
         "description": "Retrieves the transcript of a YouTube video from a given YouTube URL. Applicable only to YouTube links.",
     },
     "read_webpage_content": {
         "function": read_webpage_content,
+        "async_function": aread_webpage_content,
+        # Any other http(s) link is read as a plain webpage
+        "fallback": True,
         "description": "Fetches and extracts the text content from a webpage URL.",
     },
 }
+
+
+def route_links(links, actions=AVAILABLE_ACTIONS):
+    """
+    Assigns links to actions without an LLM call.
+    A link goes to the first action with a matching "url_patterns" regex; other
+    http(s) links go to the action flagged "fallback".
+    Returns:
+        tuple: (action_plan for the routed links, list of links left unrouted)
+    """
+    fallback = next((name for name, info in actions.items() if info.get("fallback")), None)
+    action_plan, unrouted = [], []
+    for link in links:
+        action_name = next(
+            (
+                name
+                for name, info in actions.items()
+                if any(re.search(pattern, link) for pattern in info.get("url_patterns", []))
+            ),
+            None,
+        )
+        reason = "URL matches the action's link pattern"
+        if action_name is None and fallback and re.match(r"^https?://", link):
+            action_name, reason = fallback, "Default reader for web links"
+        if action_name is None:
+            unrouted.append(link)
+            continue
+        action_plan.append(
+            {"action_name": action_name, "params": {"url": link}, "reason": reason}
+        )
+    return action_plan, unrouted
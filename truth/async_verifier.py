@@ -0,0 +1,613 @@
+import asyncio
+import time
+from typing import List, Dict
+import httpx
+from loguru import logger
+from .context import VerificationContext
+from .http import HTTPTransport
+from .metrics import MetricsRegistry
+from .ratelimit import LLMScheduler
+from .similarity import StatementIndex
+from .verifier import (
+    VerifierAgent,
+    MISTRAL_API_KEY,
+    BRAVE_API_KEY,
+    BRAVE_SEARCH_URL,
+    FAST_SEARCH_RESULTS,
+    TIMEOUT_ERRORS,
+    _aggregate_usage,
+    action_key,
+    direct_query,
+    estimate_tokens,
+    parse_query,
+    _discussion_result,
+    discussion_sources,
+)
+
+# asyncio.wait_for raises asyncio.TimeoutError, a TimeoutError only since 3.11
+ASYNC_TIMEOUT_ERRORS = TIMEOUT_ERRORS + (asyncio.TimeoutError,)
+
+
+class AsyncVerifierAgent(VerifierAgent):
+    """
+    asyncio counterpart of VerifierAgent.
+
+    Mistral is called through its async client and every HTTP request (Brave
+    search and the source readers) goes through the transport's pooled
+    httpx.AsyncClient, so one event loop can keep many verifications in flight
+    without a thread each. Prompts and result parsing are shared with
+    VerifierAgent. Each call gathers its state in its own VerificationContext,
+    so one agent can run any number of verifications concurrently.
+    """
+
+    def __init__(
+        self,
+        mistral_api_key=MISTRAL_API_KEY,
+        brave_api_key=BRAVE_API_KEY,
+        model="mistral-small-latest",
+        max_concurrent_actions: int = 4,
+        requests_per_second: float | None = None,
+        llm_cache=None,
+        search_cache=None,
+        transport: HTTPTransport | None = None,
+        planner: str = "rules",
+        retrieval_top_k: int = 8,
+        context_token_budget: int | None = 2000,
+        metrics: MetricsRegistry | None = None,
+        mistral_server_url: str | None = None,
+        brave_search_url: str = BRAVE_SEARCH_URL,
+        http_client: httpx.AsyncClient | None = None,
+        llm_scheduler: LLMScheduler | None = None,
+        speculative: bool = False,
+        fast: bool = False,
+        statement_index: StatementIndex | None = None,
+    ):
+        super().__init__(
+            mistral_api_key=mistral_api_key,
+            brave_api_key=brave_api_key,
+            model=model,
+            max_concurrent_actions=max_concurrent_actions,
+            requests_per_second=requests_per_second,
+            llm_cache=llm_cache,
+            search_cache=search_cache,
+            transport=transport,
+            planner=planner,
+            retrieval_top_k=retrieval_top_k,
+            context_token_budget=context_token_budget,
+            metrics=metrics,
+            mistral_server_url=mistral_server_url,
+            brave_search_url=brave_search_url,
+            llm_scheduler=llm_scheduler,
+            speculative=speculative,
+            fast=fast,
+            statement_index=statement_index,
+        )
+        if http_client is not None:
+            # Route requests through a caller-provided client, e.g. for tests
+            self.transport = HTTPTransport(async_client=http_client)
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self.transport.async_client
+
+    async def aclose(self):
+        """Closes the transport's connections; the shared transport stays usable."""
+        await self.transport.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _chat(
+        self,
+        prompt: str,
+        ctx: VerificationContext,
+        response_format: Dict | None = None,
+        cacheable=False,
+        stage: str = "llm",
+    ) -> str:
+        with self._span(ctx, stage, model=self.model) as span:
+            cache_key = (
+                self._llm_cache_key(prompt, response_format) if cacheable else None
+            )
+            cached = self._llm_cache_get(cache_key, ctx)
+            if cacheable:
+                span["cache_hit"] = cached is not None
+            if cached is not None:
+                return cached
+
+            kwargs = {"response_format": response_format} if response_format else {}
+            start_time = time.time()
+            response = await self.llm_scheduler.acall(
+                lambda: self.mistral_client.chat.complete_async(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **kwargs,
+                    **self._timeout_kwargs(ctx, stage),
+                ),
+                prompt_tokens=estimate_tokens(prompt),
+                deadline=ctx.expires_at,
+            )
+            self._add_usage(ctx, total_time=time.time() - start_time)
+            return self._chat_content(response, ctx, span, cache_key)
+
+    async def formulate_question(
+        self, statement: str, ctx: VerificationContext | None = None
+    ):
+        ctx = ctx or VerificationContext()
+        prompt = self.build_question_prompt(statement)
+        try:
+            question = (
+                await self._chat(
+                    prompt, ctx, cacheable=True, stage="formulate_question"
+                )
+            ).strip()
+        except ASYNC_TIMEOUT_ERRORS:
+            if ctx.expires_at is None:
+                raise
+            logger.warning("Question formulation timed out, using the statement")
+            question = statement
+        self.log_event("Formulate Question", statement, question)
+        return question
+
+    async def formulate_query(
+        self, statement: str, ctx: VerificationContext | None = None
+    ):
+        ctx = ctx or VerificationContext()
+        query = direct_query(statement)
+        if query is None:
+            prompt = self.build_query_prompt(statement)
+            try:
+                content = await self._chat(
+                    prompt,
+                    ctx,
+                    response_format={"type": "json_object"},
+                    cacheable=True,
+                    stage="formulate_question",
+                )
+            except ASYNC_TIMEOUT_ERRORS:
+                if ctx.expires_at is None:
+                    raise
+                logger.warning("Query formulation timed out, using the statement")
+                content = ""
+            query = parse_query(content, statement)
+        self.log_event("Formulate Query", statement, query)
+        return query
+
+    async def perform_web_search(
+        self,
+        question: str,
+        num_results: int = 3,
+        ctx: VerificationContext | None = None,
+    ):
+        ctx = ctx or VerificationContext()
+        with self._span(ctx, "web_search", url=self.brave_search_url) as span:
+            cached = self._cached_search(question, num_results)
+            span["cache_hit"] = cached is not None
+            if cached is not None:
+                span["results"] = len(cached)
+                return cached
+
+            headers = {"X-Subscription-Token": self.brave_api_key}
+            params = {"q": question}
+            timeout = self._search_timeout(ctx)
+            if timeout == 0:
+                span["error"] = "deadline"
+                return []
+            start_time = time.time()
+            try:
+                # wait_for also bounds the wait for a pooled connection
+                response = await asyncio.wait_for(
+                    self.transport.aget(
+                        self.brave_search_url, headers=headers, params=params
+                    ),
+                    timeout.get("timeout"),
+                )
+                response.raise_for_status()
+                links = self._parse_search_results(response.json(), num_results)
+                self._store_search(question, num_results, links)
+                self.log_event("Web Search", question, links)
+                span["results"] = len(links)
+                return links
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                logger.error(f"Web search failed: {str(e) or type(e).__name__}")
+                span["error"] = str(e) or type(e).__name__
+                return []
+            finally:
+                self._add_usage(ctx, total_time=time.time() - start_time)
+
+    async def plan_actions(
+        self, query: str, links: List[str], ctx: VerificationContext | None = None
+    ) -> List[Dict]:
+        ctx = ctx or VerificationContext()
+        routed, links = self._route_links(query, links)
+        if not links:
+            ctx.action_plan = routed
+            return ctx.action_plan
+
+        prompt = self.build_plan_prompt(query, links)
+        try:
+            content = await self._chat(
+                prompt,
+                ctx,
+                response_format={"type": "json_object"},
+                cacheable=True,
+                stage="plan_actions",
+            )
+        except ASYNC_TIMEOUT_ERRORS:
+            if ctx.expires_at is None:
+                raise
+            ctx.action_plan = routed + self._fallback_plan(links)
+            return ctx.action_plan
+        ctx.action_plan = routed + self._parse_action_plan(content, query, links)
+        return ctx.action_plan
+
+    async def _run_action(self, action_meta):
+        action_name = action_meta["action_name"]
+        params = action_meta["params"]
+        logger.info(f"Taking action: {action_name} with params: {params}")
+        if action_name not in self.available_actions:
+            logger.warning(f"Action {action_name} not available")
+            return None
+
+        try:
+            info = self.available_actions[action_name]
+            # Actions registered with only a sync function run in a thread
+            if info.get("async_function") is None:
+                return await asyncio.to_thread(
+                    info["function"], **params, transport=self.transport
+                )
+            return await info["async_function"](**params, transport=self.transport)
+        except Exception as e:
+            logger.warning(f"Error during action {action_name}: {str(e)}")
+            return None
+
+    async def _timed_action(
+        self, action_meta, ctx: VerificationContext, prefetch=False
+    ):
+        with self._action_span(ctx, action_meta, prefetch) as span:
+            observation = await self._run_action(action_meta)
+            self._describe_observation(span, observation)
+        return observation
+
+    def _start_prefetch(self, links: List[str], ctx: VerificationContext):
+        """
+        Starts the prefetch plan in ctx.prefetches. Returns the semaphore the
+        planned actions must share, or None when nothing was prefetched.
+        """
+        plan = self._prefetch_plan(links)
+        if not plan:
+            return None
+        semaphore = asyncio.Semaphore(self.max_concurrent_actions)
+
+        async def run(action_meta):
+            async with semaphore:
+                return await self._timed_action(action_meta, ctx, True)
+
+        for action_meta in plan:
+            ctx.prefetches[action_key(action_meta)] = asyncio.ensure_future(
+                run(action_meta)
+            )
+        return semaphore
+
+    async def _discard_prefetches(self, ctx: VerificationContext):
+        """Cancels the prefetches the plan did not use."""
+        unused = list(ctx.prefetches.values())
+        super()._discard_prefetches(ctx)
+        if unused:
+            await asyncio.gather(*unused, return_exceptions=True)
+
+    async def take_action(self, action_meta, ctx: VerificationContext | None = None):
+        ctx = ctx or VerificationContext()
+        start_time = time.time()
+        observation = await self._timed_action(action_meta, ctx)
+        self._add_usage(ctx, total_time=time.time() - start_time)
+
+        if observation is not None:
+            self._record_observation(
+                ctx, action_meta["action_name"], action_meta["params"], observation
+            )
+        return observation
+
+    async def take_actions(
+        self,
+        action_plan: List[Dict],
+        ctx: VerificationContext | None = None,
+        semaphore: asyncio.Semaphore | None = None,
+    ):
+        ctx = ctx or VerificationContext()
+        if not action_plan:
+            await self._discard_prefetches(ctx)
+            return []
+
+        # Shared with the prefetches, when given, to stay within the limit
+        semaphore = semaphore or asyncio.Semaphore(self.max_concurrent_actions)
+
+        async def run(action_meta):
+            async with semaphore:
+                return await self._timed_action(action_meta, ctx)
+
+        start_time = time.time()
+        prefetched = [self._take_prefetched(a, ctx) for a in action_plan]
+        # Unused prefetches would hold slots the plan needs
+        await self._discard_prefetches(ctx)
+        tasks = [
+            task or asyncio.ensure_future(run(a))
+            for a, task in zip(action_plan, prefetched)
+        ]
+        done, pending = await asyncio.wait(
+            tasks, timeout=ctx.stage_timeout("actions")
+        )
+        # Only with a deadline can actions still be running: cancel them
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        observations = [task.result() if task in done else None for task in tasks]
+        self._add_usage(ctx, total_time=time.time() - start_time)
+        self._drop_unfinished(
+            ctx, [a for a, task in zip(action_plan, tasks) if task not in done]
+        )
+
+        for action_meta, observation in zip(action_plan, observations):
+            if observation is not None:
+                self._record_observation(
+                    ctx, action_meta["action_name"], action_meta["params"], observation
+                )
+        return observations
+
+    async def verify_statement(
+        self,
+        statement: str,
+        ctx: VerificationContext | None = None,
+        deadline: float | None = None,
+    ):
+        ctx = ctx or VerificationContext()
+        if deadline is not None:
+            ctx.set_deadline(deadline)
+        with self._span(ctx, "verify_statement"):
+            result = await self._verify_statement(statement, ctx)
+        result["spans"] = list(ctx.spans)
+        return result
+
+    async def _verify_statement(self, statement: str, ctx: VerificationContext):
+        # A near-duplicate of a verified statement reuses its verdict or evidence
+        match = self._similar_statement(statement, ctx)
+        if match is not None and match["similarity"] >= self.statement_index.threshold:
+            return self._reused_result(statement, match, ctx)
+        if match is not None:
+            question, links = self._seed_evidence(statement, match, ctx)
+        else:
+            question, links = await self._gather_evidence(statement, ctx)
+
+        prompt = self.build_statement_prompt(statement, question, ctx)
+        try:
+            verification_result = (
+                await self._chat(
+                    prompt,
+                    ctx,
+                    response_format={"type": "json_object"},
+                    stage="verdict",
+                )
+            ).strip()
+        except ASYNC_TIMEOUT_ERRORS:
+            if ctx.expires_at is None:
+                raise
+            return self._late_statement_result(statement, links, ctx)
+        result = self._parse_statement_result(
+            verification_result, statement, links, ctx
+        )
+        return self._remember(statement, question, links, match, result, ctx)
+
+    async def _gather_evidence(self, statement: str, ctx: VerificationContext):
+        # Formulate the question (and in fast mode the search query) from the statement
+        if self.fast:
+            query = await self.formulate_query(statement, ctx)
+            question = query["question"]
+        else:
+            query = None
+            question = await self.formulate_question(statement, ctx)
+
+        # Perform web search based on the question; fast mode picks from more
+        # results, so that its preferred sources can change what is read
+        if query:
+            links = await self.perform_web_search(
+                query["search_query"], FAST_SEARCH_RESULTS, ctx
+            )
+        else:
+            links = await self.perform_web_search(question, ctx=ctx)
+        # Proceed even if no links are found
+        if not links:
+            logger.warning("No search results found.")
+            links = []
+
+        # In speculative mode the top links are read while the plan is made
+        semaphore = self._start_prefetch(links, ctx)
+        try:
+            # Plan actions using the search results
+            if query:
+                action_plan = self.plan_from_query(query, links, ctx)
+            else:
+                action_plan = await self.plan_actions(question, links, ctx)
+            # Proceed even if no action plan is found
+            if not action_plan:
+                logger.warning("No action plan determined for verification.")
+                action_plan = []
+
+            # Execute the planned actions and collect observations
+            await self.take_actions(action_plan, ctx, semaphore)
+        finally:
+            await self._discard_prefetches(ctx)
+        return question, links
+
+    async def verify_uma_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext | None = None,
+    ):
+        ctx = ctx or VerificationContext()
+        with self._span(ctx, "verify_uma_vote"):
+            result = await self._verify_uma_vote(contract_description, message, ctx)
+        result["spans"] = list(ctx.spans)
+        return result
+
+    async def _verify_uma_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext,
+    ):
+        await self._fetch_sources(message["sources"], ctx)
+        return await self._judge_uma_vote(contract_description, message, ctx)
+
+    async def _fetch_sources(self, sources: List[str], ctx: VerificationContext):
+        # if there are links provided, use them to verify the statement
+        if sources:
+            action_plan = await self.plan_actions(
+                "Fetch more context from the sources", sources, ctx
+            )
+            await self.take_actions(action_plan, ctx)
+
+    async def _judge_uma_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext,
+    ):
+        prompt = self.build_uma_vote_prompt(contract_description, message, ctx)
+        content = await self._chat(
+            prompt, ctx, response_format={"type": "json_object"}, stage="verdict"
+        )
+        return self._parse_uma_vote_result(content, message)
+
+    async def _verify_discussion_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        evidence: VerificationContext,
+    ):
+        ctx = self._evidence_context(evidence)
+        try:
+            with self._span(ctx, "verify_uma_vote"):
+                result = await self._judge_uma_vote(contract_description, message, ctx)
+        except Exception as e:
+            result = self._failed_vote_result(message, e)
+        result["spans"] = list(ctx.spans)
+        result["usage"] = ctx.usage.summary()
+        return [result], ctx
+
+    async def _verify_vote_pack(
+        self,
+        contract_description: str,
+        messages: List[Dict[str, str]],
+        evidence: VerificationContext,
+    ):
+        ctx = self._evidence_context(evidence)
+        try:
+            with self._span(ctx, "verify_uma_votes", votes=len(messages)):
+                prompt = self.build_uma_votes_prompt(
+                    contract_description, messages, ctx
+                )
+                content = await self._chat(
+                    prompt,
+                    ctx,
+                    response_format={"type": "json_object"},
+                    stage="verdict",
+                )
+            results = self._parse_uma_votes_result(content, messages)
+        except Exception as e:
+            results = [self._failed_vote_result(message, e) for message in messages]
+        return results, ctx
+
+    async def verify_discussion(
+        self,
+        parsed: Dict,
+        concurrency: int = 4,
+        pack_token_budget: int | None = None,
+        on_result=None,
+    ):
+        start_time = time.time()
+        description, messages = parsed["description"], parsed["messages"]
+        evidence = VerificationContext()
+        sources = discussion_sources(messages)
+        await self._fetch_sources(sources, evidence)
+
+        if pack_token_budget is None:
+            packs = [[index] for index in range(len(messages))]
+            jobs = [
+                self._verify_discussion_vote(description, message, evidence)
+                for message in messages
+            ]
+        else:
+            packs = self._vote_packs(description, messages, evidence, pack_token_budget)
+            jobs = [
+                self._verify_vote_pack(
+                    description, [messages[i] for i in pack], evidence
+                )
+                for pack in packs
+            ]
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(position, job):
+            async with semaphore:
+                outcome = await job
+            if on_result is not None:
+                for index, result in zip(packs[position], outcome[0]):
+                    on_result(index, result)
+            return outcome
+
+        outcomes = await asyncio.gather(
+            *(run(position, job) for position, job in enumerate(jobs))
+        )
+        return _discussion_result(outcomes, sources, evidence, start_time)
+
+    async def _verify_batch_item(self, statement: str, deadline: float | None = None):
+        ctx = VerificationContext(deadline)
+        try:
+            result = await self.verify_statement(statement, ctx)
+        except Exception as e:
+            result = self._failed_statement_result(statement, e)
+            result["spans"] = list(ctx.spans)
+        result["usage"] = ctx.usage.summary()
+        return result
+
+    async def iter_verify_statements(
+        self,
+        statements: List[str],
+        concurrency: int = 4,
+        deadline: float | None = None,
+    ):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(index, statement):
+            async with semaphore:
+                return index, await self._verify_batch_item(statement, deadline)
+
+        tasks = [
+            asyncio.ensure_future(run(index, statement))
+            for index, statement in enumerate(statements)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def verify_statements(
+        self,
+        statements: List[str],
+        concurrency: int = 4,
+        deadline: float | None = None,
+    ):
+        start_time = time.time()
+        results = [None] * len(statements)
+        async for index, result in self.iter_verify_statements(
+            statements, concurrency, deadline
+        ):
+            results[index] = result
+        return {"results": results, "usage": _aggregate_usage(results, start_time)}
@@ -0,0 +1,191 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "truth"
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTLs, bounded by `max_entries`.
+    Exposes the same get/set/touch interface as SQLiteCache.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float | None = 3600):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, allow_stale: bool = False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, meta, expires_at = entry
+            stale = expires_at is not None and expires_at <= time.time()
+            if stale and not allow_stale:
+                return None
+            self._entries.move_to_end(key)
+        return {"value": value, "meta": meta or {}, "stale": stale}
+
+    def set(self, key: str, value, ttl: float | None = None, meta: dict | None = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (value, meta, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key: str, ttl: float | None = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            if key in self._entries:
+                value, meta, _ = self._entries[key]
+                self._entries[key] = (value, meta, time.time() + ttl if ttl else None)
+                self._entries.move_to_end(key)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache stored in a single SQLite file.
+
+    Values are JSON-serialised and zlib-compressed. Every entry has its own
+    TTL; expired entries are still returned when `allow_stale=True` so callers
+    can revalidate them (e.g. with ETag / Last-Modified) instead of refetching.
+    When the compressed payloads exceed `max_bytes`, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_CACHE_DIR / "cache.sqlite",
+        max_bytes: int = 256 * 1024 * 1024,
+        default_ttl: float | None = 24 * 3600,
+    ):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    meta TEXT,
+                    size INTEGER NOT NULL,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+            )
+
+    def get(self, key: str, allow_stale: bool = False):
+        """
+        Returns {"value", "meta", "stale"} for the key, or None on a miss.
+        Expired entries count as misses unless allow_stale is set.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, meta, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            stale = row[2] is not None and row[2] <= now
+            if stale and not allow_stale:
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return {
+            "value": json.loads(zlib.decompress(row[0])),
+            "meta": json.loads(row[1]) if row[1] else {},
+            "stale": stale,
+        }
+
+    def set(self, key: str, value, ttl: float | None = None, meta: dict | None = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    blob,
+                    json.dumps(meta) if meta else None,
+                    len(blob),
+                    now + ttl if ttl else None,
+                    now,
+                ),
+            )
+            self._evict()
+
+    def touch(self, key: str, ttl: float | None = None):
+        """Extends the lifetime of an entry, e.g. after a 304 Not Modified."""
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE entries SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + ttl if ttl else None, now, key),
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+
+    def size(self) -> int:
+        with self._lock:
+            return self._total_size()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _total_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        excess = self._total_size() - self.max_bytes
+        if excess <= 0:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at ASC"
+        )
+        victims = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
@@ -0,0 +1,114 @@
+import threading
+import time
+from typing import Dict, List
+
+# Usage counters tracked per call and accumulated per agent
+USAGE_COUNTERS = (
+    "total_time",
+    "total_prompt_tokens",
+    "total_completion_tokens",
+    "total_cost",
+    "llm_cache_hits",
+    "cached_prompt_tokens",
+    "cached_completion_tokens",
+    "saved_cost",
+)
+
+# Share of a verification's deadline reserved for each stage, in pipeline order.
+# A stage may use whatever earlier stages left over, but never the shares of
+# the stages after it, so the verdict always gets its time.
+STAGE_SHARES = {
+    "formulate_question": 0.1,
+    "web_search": 0.1,
+    "plan_actions": 0.15,
+    "actions": 0.35,
+    "verdict": 0.3,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """A stage had no time left before the verification's deadline."""
+
+
+class Usage:
+    """Thread-safe time, token and cost counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for counter in USAGE_COUNTERS:
+            setattr(self, counter, 0)
+
+    def add(self, **amounts):
+        with self._lock:
+            for counter, amount in amounts.items():
+                setattr(self, counter, getattr(self, counter) + amount)
+
+    def merge(self, other: "Usage"):
+        self.add(**{counter: getattr(other, counter) for counter in USAGE_COUNTERS})
+
+    def summary(self) -> Dict:
+        return {
+            "total_time": round(self.total_time, 2),  # in seconds
+            "total_prompt_tokens": self.total_prompt_tokens,
+            "total_completion_tokens": self.total_completion_tokens,
+            "total_cost": round(self.total_cost, 4),  # in dollars
+            "llm_cache_hits": self.llm_cache_hits,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "cached_completion_tokens": self.cached_completion_tokens,
+            "saved_cost": round(self.saved_cost, 4),  # in dollars
+        }
+
+
+class VerificationContext:
+    """
+    State of a single verification call: the action plan, the observations
+    gathered by its actions (keyed by action name, in plan order), its usage
+    and the timing spans of each stage and action.
+    A fresh context is created per call, so one agent can serve many callers.
+
+    Parameters:
+        deadline (float, optional): Seconds the whole verification may take,
+            split across stages by STAGE_SHARES. Sources whose actions did not
+            finish in time are listed in dropped_sources.
+    """
+
+    def __init__(self, deadline: float | None = None):
+        self.action_plan: List[Dict] = []
+        self.observations: Dict[str, List[Dict]] = {}
+        self.usage = Usage()
+        self.spans: List[Dict] = []
+        self.dropped_sources: List[str] = []
+        # Actions started speculatively while the plan was being made, keyed
+        # by action_key(); take_actions reuses those the plan asks for
+        self.prefetches: Dict = {}
+        self.budget = None
+        self.expires_at = None
+        self._lock = threading.Lock()
+        if deadline is not None:
+            self.set_deadline(deadline)
+
+    def set_deadline(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float | None:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def stage_timeout(self, stage: str) -> float | None:
+        """Seconds `stage` may take: what is left minus the later stages' shares."""
+        if self.expires_at is None:
+            return None
+        stages = list(STAGE_SHARES)
+        later = stages[stages.index(stage) + 1 :] if stage in STAGE_SHARES else []
+        reserved = sum(STAGE_SHARES[name] for name in later) * self.budget
+        return max(0.0, self.remaining() - reserved)
+
+    def record_observation(self, action_name: str, observation: Dict):
+        self.observations.setdefault(action_name, []).append(observation)
+
+    def add_span(self, span: Dict):
+        # Action spans are added from worker threads
+        with self._lock:
+            self.spans.append(span)
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPTransport:
+    """
+    Shared HTTP plumbing for Brave search and the source readers.
+
+    Sync callers go through a pooled requests.Session, async callers through an
+    httpx.AsyncClient (HTTP/2 when the optional `h2` package is installed), so
+    connections to the same host are kept alive and reused across requests.
+    Both sides apply default timeouts. The async side caps concurrent
+    connections per host; the sync side keeps up to that many alive per host
+    and opens (then closes) extra ones rather than block a caller, which
+    could hold a search past its stage timeout.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 100,
+        max_connections_per_host: int = 10,
+        http2: bool = True,
+        async_client: httpx.AsyncClient | None = None,
+    ):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._session = None
+        self._session_lock = threading.Lock()
+        # An injected client is used as-is and never closed by the transport
+        self._external_client = async_client
+        self._async_client = None
+        self._async_loop = None
+        self._host_limits = {}
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.max_connections,
+                    pool_maxsize=self.max_connections_per_host,
+                    pool_block=False,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def get(self, url, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", (self.connect_timeout, self.timeout))
+        return self.session.get(url, **kwargs)
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """The async client for the running event loop, created on first use."""
+        if self._external_client is not None:
+            return self._external_client
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            # Connections cannot be shared across event loops
+            self._async_client = httpx.AsyncClient(
+                http2=self.http2,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._async_loop = loop
+            self._host_limits = {}
+        return self._async_client
+
+    async def aget(self, url, **kwargs) -> httpx.Response:
+        client = self.async_client
+        async with self._host_limit(url):
+            return await client.get(url, **kwargs)
+
+    @asynccontextmanager
+    async def astream(self, url, **kwargs):
+        """Streams a GET response; the body is read by the caller inside the block."""
+        client = self.async_client
+        async with self._host_limit(url):
+            async with client.stream("GET", url, **kwargs) as response:
+                yield response
+
+    def _host_limit(self, url) -> asyncio.Semaphore:
+        host = urlparse(str(url)).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return self._host_limits[host]
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+_default_transport = HTTPTransport()
+
+
+def get_transport() -> HTTPTransport:
+    return _default_transport
+
+
+def set_transport(transport: HTTPTransport):
+    """Replaces the process-wide transport used when none is passed explicitly."""
+    global _default_transport
+    _default_transport = transport
@@ -0,0 +1,139 @@
+import math
+import threading
+from collections import deque
+from typing import Dict
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Running count and sum of observed values, with quantiles computed over the
+    most recent `window` observations so memory stays bounded under load.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        # Nearest-rank quantile
+        rank = max(1, math.ceil(q * len(ordered)))
+        return ordered[rank - 1]
+
+    def summary(self) -> Dict:
+        result = {"count": self.count, "sum": round(self.sum, 6)}
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = self.quantile(q)
+        return result
+
+
+class MetricsRegistry:
+    """
+    In-process histograms and counters keyed by metric name and labels.
+    `summary()` returns p50/p95/p99 per series and `to_prometheus()` renders
+    everything in the Prometheus text exposition format.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.window)
+            self._histograms[key].observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self._histograms.get((name, tuple(sorted(labels.items()))))
+
+    def counter(self, name: str, **labels) -> float:
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self) -> Dict:
+        """
+        Returns:
+            dict: {metric name: [{"labels", "count", "sum", "p50", "p95", "p99"}]}
+            for histograms and {metric name: [{"labels", "value"}]} for counters.
+        """
+        result = {}
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                result.setdefault(name, []).append(
+                    {"labels": dict(labels), **histogram.summary()}
+                )
+            for (name, labels), value in sorted(self._counters.items()):
+                result.setdefault(name, []).append(
+                    {"labels": dict(labels), "value": value}
+                )
+        return result
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            # Histograms are exported as summaries with precomputed quantiles
+            typed = set()
+            for (name, labels), histogram in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} summary")
+                    typed.add(name)
+                for q in QUANTILES:
+                    series = _labels(labels + (("quantile", str(q)),))
+                    lines.append(f"{name}{series} {histogram.quantile(q)}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_default_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    return _default_metrics
+
+
+def set_metrics(metrics: MetricsRegistry):
+    """Replaces the process-wide registry used when an agent is given none."""
+    global _default_metrics
+    _default_metrics = metrics
@@ -0,0 +1,364 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+import httpx
+from loguru import logger
+from mistralai.models import NoResponseError
+from .context import DeadlineExceeded
+from .metrics import get_metrics
+
+# Statuses worth retrying; the first two mean the provider is throttling us
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = THROTTLE_STATUSES + (500, 502, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at per_minute / 60 per second, holding
+    at most burst_seconds worth of tokens.
+
+    reserve() takes the tokens straight away, going into debt if needed, and
+    returns how long the caller has to wait for them, so the same bucket can
+    be shared by threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, per_minute: float | None = None, burst_seconds: float = 1.0):
+        self.rate = per_minute / 60 if per_minute else 0.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._level -= amount
+            return max(0.0, -self._level / self.rate)
+
+    def adjust(self, amount: float):
+        """Takes (or with a negative amount, returns) tokens after the fact."""
+        if not self.rate:
+            return
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+class LLMScheduler:
+    """
+    Admission control shared by every Mistral call of the agents and
+    DiscussionParser.
+
+    Calls wait for both a requests/min and a tokens/min bucket, then for one of
+    `concurrency` slots. The slot count adapts AIMD style: while saturated it
+    grows by one per window of successful calls up to max_concurrency, and it
+    halves when the provider throttles with a 429 or 503 (once per window:
+    throttles of calls sent before the last cut are ignored), so the agent
+    settles at the provider's real throughput instead of retrying into a wall.
+    Throttled and transient failures are retried with full-jitter exponential
+    backoff, or after the server's Retry-After, which also pauses every other
+    call.
+
+    Parameters:
+        requests_per_minute (float, optional): Request budget; None for unlimited.
+        tokens_per_minute (float, optional): Prompt plus completion token budget.
+        burst_seconds (float): Seconds of budget that may be spent at once.
+        initial_concurrency (int): Concurrent calls allowed before any feedback.
+        min_concurrency (int), max_concurrency (int): Bounds of the adaptive limit.
+        max_retries (int): Retries per call before the error is raised.
+        base_delay (float), max_delay (float): Backoff bounds, in seconds.
+        completion_tokens (int): Completion tokens assumed when reserving
+            tokens; the estimate is corrected from the response's usage.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        burst_seconds: float = 1.0,
+        initial_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        completion_tokens: int = 256,
+        metrics=None,
+    ):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.concurrency = float(
+            min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.completion_tokens = completion_tokens
+        self.metrics = metrics
+        self.in_flight = 0
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failed": 0}
+        self._paused_until = 0.0
+        # Calls are numbered as they start; see _failed
+        self._started = 0
+        self._decreased_at = 0
+        self._condition = threading.Condition()
+        # (loop, future) of coroutines waiting for a slot, in arrival order;
+        # released slots are handed to them directly, see _wake
+        self._async_waiters = deque()
+
+    def call(self, fn, prompt_tokens: int = 0, deadline: float | None = None):
+        """
+        Runs fn() under the limits, retrying throttled and transient failures.
+        With a deadline (time.monotonic() based), raises DeadlineExceeded rather
+        than wait for the buckets or a concurrency slot, or retry, past it.
+        """
+        tokens = prompt_tokens + self.completion_tokens
+        for attempt in range(self.max_retries + 1):
+            delay = self._reserve(tokens, deadline)
+            if delay > 0:
+                time.sleep(delay)
+            with self._condition:
+                while (ticket := self._try_acquire()) is None:
+                    if deadline is None:
+                        self._condition.wait()
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._expire(tokens)
+                    self._condition.wait(remaining)
+            try:
+                response = fn()
+            except Exception as e:
+                retry_delay = self._failed(e, tokens, attempt, ticket, deadline)
+                if retry_delay is None:
+                    raise
+                time.sleep(retry_delay)
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._succeeded(response, tokens)
+            return response
+
+    async def acall(self, fn, prompt_tokens: int = 0, deadline: float | None = None):
+        """
+        Async counterpart of call(); fn() returns an awaitable. Coroutines
+        waiting for a slot are queued and served in arrival order.
+        """
+        tokens = prompt_tokens + self.completion_tokens
+        for attempt in range(self.max_retries + 1):
+            delay = self._reserve(tokens, deadline)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            ticket = await self._acquire_async(tokens, deadline)
+            try:
+                response = await fn()
+            except Exception as e:
+                retry_delay = self._failed(e, tokens, attempt, ticket, deadline)
+                if retry_delay is None:
+                    raise
+                await asyncio.sleep(retry_delay)
+                continue
+            except BaseException:
+                # e.g. the task was cancelled
+                self._release()
+                raise
+            self._succeeded(response, tokens)
+            return response
+
+    def _reserve(self, tokens: int, deadline: float | None = None) -> float:
+        now = time.monotonic()
+        pause = max(0.0, self._paused_until - now)
+        delay = max(pause, self.requests.reserve(1), self.tokens.reserve(tokens))
+        if deadline is not None and now + delay >= deadline:
+            self._expire(tokens)
+        return delay
+
+    def _expire(self, tokens: int):
+        """Returns a reservation that can no longer be used before the deadline."""
+        self.tokens.adjust(-tokens)
+        self.requests.adjust(-1)
+        raise DeadlineExceeded("No time left for the Mistral call")
+
+    def _try_acquire(self) -> int | None:
+        """Takes a slot and returns the call's number, or None if all are busy."""
+        # Called with self._condition held
+        if self.in_flight >= int(self.concurrency):
+            return None
+        self.in_flight += 1
+        self._started += 1
+        return self._started
+
+    async def _acquire_async(self, tokens: int, deadline: float | None) -> int:
+        """
+        Takes a slot for a coroutine, queueing behind earlier coroutines
+        without polling. Raises DeadlineExceeded if none frees up in time.
+        """
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if not self._async_waiters:
+                ticket = self._try_acquire()
+                if ticket is not None:
+                    return ticket
+            waiter = loop.create_future()
+            self._async_waiters.append((loop, waiter))
+        timeout = None if deadline is None else deadline - time.monotonic()
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._abandon(loop, waiter)
+            self._expire(tokens)
+        except BaseException:
+            self._abandon(loop, waiter)
+            raise
+
+    def _abandon(self, loop, waiter):
+        """Forgets a waiter that stopped waiting, giving back a slot it was handed."""
+        with self._condition:
+            try:
+                self._async_waiters.remove((loop, waiter))
+            except ValueError:
+                pass
+        # A slot handed over just before the waiter gave up; if the handoff is
+        # still scheduled, _grant gives it back instead
+        if waiter.done() and not waiter.cancelled():
+            self._release()
+
+    def _grant(self, waiter, ticket: int):
+        # Runs on the waiter's loop
+        if waiter.done():
+            self._release()
+        else:
+            waiter.set_result(ticket)
+
+    def _wake(self):
+        """Hands free slots to waiting coroutines in order, then to one thread."""
+        # Called with self._condition held
+        while self._async_waiters and self.in_flight < int(self.concurrency):
+            loop, waiter = self._async_waiters.popleft()
+            if waiter.done():
+                continue
+            ticket = self._try_acquire()
+            try:
+                loop.call_soon_threadsafe(self._grant, waiter, ticket)
+            except RuntimeError:
+                # The waiter's loop is closed
+                self.in_flight -= 1
+        self._condition.notify()
+
+    def _release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._wake()
+
+    def _succeeded(self, response, tokens: int):
+        usage = getattr(response, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if isinstance(total_tokens, int):
+            self.tokens.adjust(total_tokens - tokens)
+        with self._condition:
+            self.stats["calls"] += 1
+            # Additive increase: one more slot per window of successful calls,
+            # only while the current limit is actually in use
+            if self.in_flight >= int(self.concurrency):
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1 / self.concurrency
+                )
+        self._release()
+
+    def _failed(
+        self,
+        error: Exception,
+        tokens: int,
+        attempt: int,
+        ticket: int,
+        deadline: float | None = None,
+    ) -> float | None:
+        """Releases the slot; returns the delay before a retry, or None to give up."""
+        self.tokens.adjust(-tokens)
+        status = getattr(error, "status_code", None)
+        throttled = status in THROTTLE_STATUSES
+        retryable = status in RETRY_STATUSES or isinstance(
+            error, (httpx.TransportError, NoResponseError)
+        )
+        retry_after = _retry_after(getattr(error, "headers", None))
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        now = time.monotonic()
+        out_of_time = deadline is not None and now + delay >= deadline
+        with self._condition:
+            if throttled:
+                self.stats["throttled"] += 1
+                # Multiplicative decrease, unless the call was already in flight
+                # when the limit was last cut
+                if ticket > self._decreased_at:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self._decreased_at = self._started
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            give_up = not retryable or attempt >= self.max_retries or out_of_time
+            self.stats["failed" if give_up else "retries"] += 1
+        self._release()
+        if give_up:
+            return None
+
+        reason = "throttled" if throttled else "error"
+        (self.metrics or get_metrics()).inc("truth_llm_retries_total", reason=reason)
+        logger.warning(
+            f"Mistral call failed ({status or type(error).__name__}), "
+            f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s "
+            f"at concurrency {int(self.concurrency)}"
+        )
+        return delay
+
+    def summary(self):
+        with self._condition:
+            return {
+                **self.stats,
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+            }
+
+
+def _retry_after(headers) -> float | None:
+    """Seconds from a Retry-After header, given as a number or an HTTP date."""
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+_default_scheduler = LLMScheduler()
+
+
+def get_scheduler() -> LLMScheduler:
+    return _default_scheduler
+
+
+def set_scheduler(scheduler: LLMScheduler):
+    """Replaces the process-wide scheduler used when none is given."""
+    global _default_scheduler
+    _default_scheduler = scheduler
@@ -0,0 +1,126 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how in is it of on or"
+    " the this that to was were what when where which who will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def chunk_text(text: str, max_words: int = 120, overlap: int = 20) -> List[str]:
+    """Splits text into passages of at most max_words, overlapping by `overlap` words."""
+    words = text.split()
+    if len(words) <= max_words:
+        return [" ".join(words)] if words else []
+    step = max(1, max_words - overlap)
+    return [
+        " ".join(words[start : start + max_words])
+        for start in range(0, len(words) - overlap, step)
+    ]
+
+
+class BM25Index:
+    """Small in-memory inverted index scored with Okapi BM25."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_lengths = {}
+
+    def add(self, doc_id, text: str):
+        terms = Counter(tokenize(text))
+        self.doc_lengths[doc_id] = sum(terms.values())
+        for term, frequency in terms.items():
+            self.postings[term][doc_id] = frequency
+
+    def search(self, query: str, top_k: int | None = None):
+        """Returns (doc_id, score) pairs for documents sharing a term with the query."""
+        if not self.doc_lengths:
+            return []
+        n_docs = len(self.doc_lengths)
+        avg_length = sum(self.doc_lengths.values()) / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length
+                scores[doc_id] += (
+                    idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+                )
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k] if top_k else ranked
+
+
+def select_passages(
+    context: Dict[str, List[Dict]],
+    query: str,
+    top_k: int = 8,
+    token_budget: int = 1500,
+    max_words: int = 120,
+) -> List[Dict]:
+    """
+    Ranks passages from the gathered observations against the query and keeps
+    the best ones within token_budget. Everything is kept when it all fits,
+    and a source none of whose passages ranked keeps its lead passage if there
+    is room, so evidence phrased differently from the query is not lost.
+    Returns:
+        list: One entry per source, {"action", "url", "passages"} with passages
+        in document order, or {"action", "url", "error"} for failed reads.
+    """
+    index = BM25Index()
+    passages = {}
+    sources = []
+    for action_name, observations in context.items():
+        for observation in observations:
+            source = {"action": action_name, "url": observation.get("url")}
+            if not observation.get("success") or not observation.get("content"):
+                sources.append({**source, "error": observation.get("error")})
+                continue
+            source_id = len(sources)
+            sources.append({**source, "passages": []})
+            for position, passage in enumerate(
+                chunk_text(observation["content"], max_words=max_words)
+            ):
+                passages[(source_id, position)] = passage
+                index.add((source_id, position), passage)
+
+    costs = {doc_id: estimate_tokens(passage) for doc_id, passage in passages.items()}
+    if sum(costs.values()) <= token_budget:
+        selected = list(passages)
+    else:
+        used = 0
+        selected = []
+        for doc_id, _ in index.search(query, top_k):
+            if used + costs[doc_id] > token_budget:
+                continue
+            used += costs[doc_id]
+            selected.append(doc_id)
+        covered = {source_id for source_id, _ in selected}
+        for doc_id in passages:
+            source_id, position = doc_id
+            if position or source_id in covered:
+                continue
+            if used + costs[doc_id] <= token_budget:
+                used += costs[doc_id]
+                selected.append(doc_id)
+
+    for source_id, position in sorted(selected):
+        sources[source_id]["passages"].append(passages[(source_id, position)])
+    return [
+        source for source in sources if "error" in source or source["passages"]
+    ]
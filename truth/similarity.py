@@ -0,0 +1,200 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, FrozenSet, List, Tuple
+from .retrieval import tokenize
+
+# Words that flip a statement's meaning; they are kept as tokens and must agree
+NEGATIONS = frozenset({"not", "no", "never", "nor", "none", "without"})
+# Mersenne prime modulus of the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+
+def statement_words(statement: str) -> List[str]:
+    """
+    The words of a statement in order: lowercased, without stopwords, with
+    "n't" read as "not" and plural/tense endings folded, so "Will X happen?"
+    and "X happens" share their words.
+    """
+    text = re.sub(r"n't\b", " not", statement.lower())
+    return [_stem(word) for word in tokenize(text)]
+
+
+def statement_tokens(statement: str) -> FrozenSet[str]:
+    """
+    The shingles compared between statements: its words and its ordered word
+    pairs, so "A beat B" and "B beat A" share their words but not their pairs.
+    """
+    words = statement_words(statement)
+    pairs = (f"{first} {second}" for first, second in zip(words, words[1:]))
+    return frozenset(words).union(pairs)
+
+
+def _stem(word: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+def _guard(tokens: FrozenSet[str]) -> Tuple:
+    """
+    What two statements must share to be near-duplicates at all: the same
+    numbers (dates, prices, counts) and the same polarity.
+    """
+    words = [token for token in tokens if " " not in token]
+    numbers = frozenset(word for word in words if any(c.isdigit() for c in word))
+    negated = sum(word in NEGATIONS for word in words) % 2
+    return numbers, negated
+
+
+def _token_hash(token: str) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class StatementIndex:
+    """
+    In-process near-duplicate index over verified statements.
+
+    Statements are reduced to shingle sets (statement_tokens) and indexed with
+    MinHash signatures split into LSH bands, so a lookup only compares the
+    entries sharing a band with the query instead of every entry. Candidates
+    are then scored by their exact Jaccard similarity and must have the same
+    numbers and polarity as the query. Entries expire after their TTL and the
+    least recently used are evicted beyond max_entries.
+
+    Parameters:
+        threshold (float): Similarity from which a match's verdict is reused.
+        seed_threshold (float, optional): Lower similarity from which a match's
+            evidence seeds a fresh verdict; None to only reuse verdicts.
+        num_perm (int): MinHash signature length.
+        bands (int): LSH bands; num_perm / bands rows each. More bands find
+            less similar candidates at the cost of more comparisons.
+        max_entries (int): Entries kept before the least recently used go.
+        default_ttl (float, optional): Seconds an entry stays valid.
+        seed (int): Seeds the MinHash permutations.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        seed_threshold: float | None = None,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_entries: int = 10_000,
+        default_ttl: float | None = 24 * 3600,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.seed_threshold = seed_threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_perm)
+        ]
+        # key -> (tokens, guard, band keys, value, expires_at), in LRU order
+        self._entries = OrderedDict()
+        self._buckets = [defaultdict(set) for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    @property
+    def min_similarity(self) -> float:
+        if self.seed_threshold is None:
+            return self.threshold
+        return min(self.threshold, self.seed_threshold)
+
+    def signature(self, tokens: FrozenSet[str]) -> List[int]:
+        hashes = [_token_hash(token) for token in tokens] or [0]
+        return [
+            min((a * h + b) % _PRIME for h in hashes) for a, b in self._permutations
+        ]
+
+    def _band_keys(self, tokens: FrozenSet[str]) -> List[Tuple]:
+        signature = self.signature(tokens)
+        return [
+            tuple(signature[band * self.rows : (band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def add(self, statement: str, value, ttl: float | None = None):
+        """Indexes a statement with the value to return for its near-duplicates."""
+        ttl = self.default_ttl if ttl is None else ttl
+        tokens = statement_tokens(statement)
+        # Statements with the same shingles share an entry
+        key = "|".join(sorted(tokens)) or statement
+        band_keys = self._band_keys(tokens)
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (tokens, _guard(tokens), band_keys, value, expires_at)
+            for band, band_key in enumerate(band_keys):
+                self._buckets[band][band_key].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def query(self, statement: str) -> Dict | None:
+        """
+        Returns:
+            dict: The most similar live entry with at least min_similarity, as
+            {"similarity", "value"}, or None.
+        """
+        tokens = statement_tokens(statement)
+        guard = _guard(tokens)
+        band_keys = self._band_keys(tokens)
+        now = time.time()
+        best, best_similarity = None, 0.0
+        with self._lock:
+            candidates = set()
+            for band, band_key in enumerate(band_keys):
+                candidates |= self._buckets[band].get(band_key, set())
+            for key in candidates:
+                entry_tokens, entry_guard, _, _, expires_at = self._entries[key]
+                if expires_at is not None and expires_at <= now:
+                    self._remove(key)
+                    continue
+                if entry_guard != guard:
+                    continue
+                similarity = jaccard(tokens, entry_tokens)
+                if similarity > best_similarity:
+                    best, best_similarity = key, similarity
+            if best is None or best_similarity < self.min_similarity:
+                return None
+            self._entries.move_to_end(best)
+            value = self._entries[best][3]
+        return {"similarity": round(best_similarity, 4), "value": value}
+
+    def _remove(self, key: str):
+        # Called with self._lock held
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band, band_key in enumerate(entry[2]):
+            bucket = self._buckets[band]
+            bucket[band_key].discard(key)
+            if not bucket[band_key]:
+                del bucket[band_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for bucket in self._buckets:
+                bucket.clear()
+
+    def __len__(self):
+        return len(self._entries)
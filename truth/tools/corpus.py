@@ -0,0 +1,291 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable
+from loguru import logger
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError as e:
+    raise ImportError(
+        "The corpus tools need numpy, pandas and pyarrow: "
+        "pip install 'truth[analytics]'"
+    ) from e
+
+from .discussion_parser import DESCRIPTION_AUTHOR
+
+P_VALUES = ["P1", "P2", "P3", "P4"]
+TIMESTAMP_FORMAT = "%Y-%m-%d, %I:%M %p"
+
+
+class DiscussionCorpus:
+    """
+    Many parsed discussions (DiscussionParser output) held as columns, one row
+    per message, so metrics over thousands of disputes are computed with
+    vectorized group-bys instead of per-message Python loops.
+
+    Attributes:
+        messages (pd.DataFrame): dispute, user, timestamp, P, has_evidence,
+            has_rationale, num_sources, is_author, resolved; plus evidence,
+            rationale and sources when loaded with keep_text=True.
+        disputes (pd.DataFrame): description per dispute, indexed by dispute.
+    """
+
+    def __init__(self, messages: pd.DataFrame, disputes: pd.DataFrame):
+        self.messages = messages
+        self.disputes = disputes
+
+    @classmethod
+    def from_parsed(
+        cls, discussions: Dict[str, Dict], keep_text: bool = False
+    ) -> "DiscussionCorpus":
+        """
+        Parameters:
+            discussions (dict): {dispute id: parsed discussion}.
+            keep_text (bool): Also keep evidence, rationale and sources.
+        """
+        columns = {
+            name: []
+            for name in (
+                "dispute",
+                "user",
+                "timestamp",
+                "P",
+                "has_evidence",
+                "has_rationale",
+                "num_sources",
+                "is_author",
+                "resolved",
+            )
+        }
+        texts = {"evidence": [], "rationale": [], "sources": []}
+        descriptions = {}
+        for dispute, parsed in discussions.items():
+            descriptions[dispute] = parsed.get("description", "")
+            for message in parsed.get("messages", []):
+                user = message.get("user", "")
+                columns["dispute"].append(dispute)
+                columns["user"].append(user)
+                columns["timestamp"].append(message.get("timestamp") or None)
+                columns["P"].append(message.get("P") or None)
+                columns["has_evidence"].append(bool(message.get("evidence")))
+                columns["has_rationale"].append(bool(message.get("rationale")))
+                columns["num_sources"].append(len(message.get("sources") or []))
+                columns["is_author"].append(user == DESCRIPTION_AUTHOR)
+                columns["resolved"].append(
+                    "resolved" in message.get("content", "").lower()
+                )
+                if keep_text:
+                    texts["evidence"].append(message.get("evidence", ""))
+                    texts["rationale"].append(message.get("rationale", ""))
+                    texts["sources"].append(list(message.get("sources") or []))
+
+        messages = pd.DataFrame(columns)
+        messages["dispute"] = messages["dispute"].astype("category")
+        messages["user"] = messages["user"].astype("category")
+        # Parsed once per column rather than once per message
+        messages["timestamp"] = pd.to_datetime(
+            messages["timestamp"], format=TIMESTAMP_FORMAT, errors="coerce"
+        )
+        messages["P"] = pd.Categorical(messages["P"], categories=P_VALUES)
+        messages["num_sources"] = messages["num_sources"].astype(np.int32)
+        if keep_text:
+            for name, values in texts.items():
+                messages[name] = values
+
+        disputes = pd.DataFrame(
+            {"description": pd.Series(descriptions, dtype="string")}
+        )
+        disputes.index.name = "dispute"
+        return cls(messages, disputes)
+
+    @classmethod
+    def from_files(
+        cls, paths: Iterable, root=None, keep_text: bool = False
+    ) -> "DiscussionCorpus":
+        """
+        Loads parsed_discussions.json files. Each dispute is named after its
+        file's directory, relative to root when given.
+        """
+        discussions = {}
+        for path in map(Path, paths):
+            with open(path, "r", encoding="utf-8") as f:
+                parsed = json.load(f)
+            name = path.parent.relative_to(root) if root is not None else path.parent
+            discussions[str(name)] = parsed
+        logger.info(f"Loaded {len(discussions)} parsed discussions")
+        return cls.from_parsed(discussions, keep_text)
+
+    @classmethod
+    def from_directory(
+        cls, root, pattern="**/parsed_discussions.json", keep_text: bool = False
+    ) -> "DiscussionCorpus":
+        root = Path(root)
+        return cls.from_files(sorted(root.glob(pattern)), root, keep_text)
+
+    def save(self, directory):
+        """Writes the corpus as Parquet files for fast reloads."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.messages.to_parquet(directory / "messages.parquet", index=False)
+        self.disputes.to_parquet(directory / "disputes.parquet")
+        logger.info(f"Corpus written to: {directory}")
+
+    @classmethod
+    def load(cls, directory) -> "DiscussionCorpus":
+        directory = Path(directory)
+        return cls(
+            pd.read_parquet(directory / "messages.parquet"),
+            pd.read_parquet(directory / "disputes.parquet"),
+        )
+
+    def metrics(self) -> pd.DataFrame:
+        """
+        The DiscussionParser.calculate_metrics fields for every dispute.
+        Returns:
+            pd.DataFrame: One row per dispute, with one column per P value
+            instead of the p_value_distribution dict.
+        """
+        messages = self.messages
+        disputes = pd.Index(self.disputes.index, name="dispute")
+        voters = messages[~messages["is_author"]]
+        grouped = voters.groupby("dispute", observed=True)
+
+        total_messages = (
+            messages.groupby("dispute", observed=True).size().reindex(disputes)
+        )
+        evidence = voters["has_evidence"]
+        linked = evidence & (voters["num_sources"] > 0)
+        sums = (
+            pd.DataFrame(
+                {
+                    "dispute": voters["dispute"],
+                    "evidence_count": evidence,
+                    "evidence_with_links_count": linked,
+                    "total_links": voters["num_sources"].where(evidence, 0),
+                    "rationale_count": voters["has_rationale"],
+                }
+            )
+            .groupby("dispute", observed=True)
+            .sum()
+            .reindex(disputes)
+        )
+        p_counts = (
+            pd.crosstab(voters["dispute"], voters["P"], dropna=True)
+            .reindex(index=disputes, columns=P_VALUES)
+            .fillna(0)
+            .astype(np.int64)
+        )
+        result = pd.DataFrame(index=disputes)
+        result["total_messages"] = total_messages.fillna(0).astype(np.int64)
+        result["unique_users"] = (
+            grouped["user"].nunique().reindex(disputes).fillna(0).astype(np.int64)
+        )
+        for p_value in P_VALUES:
+            result[p_value] = p_counts[p_value]
+        for column in sums.columns:
+            result[column] = sums[column].fillna(0).astype(np.int64)
+
+        total = result["total_messages"].replace(0, np.nan)
+        result["evidence_percentage"] = (
+            result["evidence_count"] / total * 100
+        ).fillna(0)
+        result["evidence_with_links_percentage"] = (
+            result["evidence_with_links_count"]
+            / result["evidence_count"].replace(0, np.nan)
+            * 100
+        ).fillna(0)
+        result["rationale_percentage"] = (
+            result["rationale_count"] / total * 100
+        ).fillna(0)
+        result["time_span"] = (
+            grouped["timestamp"].max() - grouped["timestamp"].min()
+        ).reindex(disputes)
+        # idxmax keeps the first of tied columns, like Counter.most_common
+        result["most_common_p_value"] = p_counts.idxmax(axis=1)
+        resolved = messages["resolved"] & messages["is_author"]
+        result["resolution_status"] = np.where(
+            resolved.groupby(messages["dispute"], observed=True)
+            .any()
+            .reindex(disputes, fill_value=False),
+            "Resolved",
+            "Unresolved",
+        )
+        return result
+
+    def dispute_metrics(self, dispute: str) -> Dict:
+        """One dispute's metrics in the DiscussionParser.calculate_metrics format."""
+        row = self.metrics().loc[dispute]
+        time_span = row["time_span"]
+        most_common = row["most_common_p_value"]
+        return {
+            "total_messages": int(row["total_messages"]),
+            "unique_users": int(row["unique_users"]),
+            "p_value_distribution": {p: int(row[p]) for p in P_VALUES},
+            "evidence_count": int(row["evidence_count"]),
+            "evidence_percentage": float(row["evidence_percentage"]),
+            "evidence_with_links_count": int(row["evidence_with_links_count"]),
+            "evidence_with_links_percentage": float(
+                row["evidence_with_links_percentage"]
+            ),
+            "total_links": int(row["total_links"]),
+            "rationale_count": int(row["rationale_count"]),
+            "rationale_percentage": float(row["rationale_percentage"]),
+            "time_span": (
+                str(time_span.to_pytimedelta())
+                if not pd.isna(time_span) and time_span
+                else "N/A"
+            ),
+            "most_common_p_value": (most_common, int(row[most_common])),
+            "resolution_status": row["resolution_status"],
+        }
+
+    def aggregates(self, metrics: pd.DataFrame | None = None) -> Dict:
+        """
+        Cross-dispute statistics.
+        Returns:
+            dict: Corpus sizes, overall P-value shares, evidence/rationale
+            rates, the distribution of messages and time spans per dispute,
+            and how often each P value is the most common one.
+        """
+        metrics = self.metrics() if metrics is None else metrics
+        voters = self.messages[~self.messages["is_author"]]
+        p_totals = metrics[P_VALUES].sum()
+        votes = int(p_totals.sum())
+        spans = metrics["time_span"].dropna()
+        per_user = voters.groupby("user", observed=True)["dispute"].nunique()
+        linked = voters["has_evidence"] & (voters["num_sources"] > 0)
+        return {
+            "disputes": len(metrics),
+            "messages": int(metrics["total_messages"].sum()),
+            "unique_users": int(voters["user"].nunique()),
+            "repeat_users": int((per_user > 1).sum()),
+            "p_value_share": {
+                p: float(p_totals[p] / votes) if votes else 0.0 for p in P_VALUES
+            },
+            "evidence_rate": _mean(voters["has_evidence"]),
+            "evidence_with_links_rate": _mean(linked),
+            "rationale_rate": _mean(voters["has_rationale"]),
+            "messages_per_dispute": _distribution(metrics["total_messages"]),
+            "time_span_hours": _distribution(spans.dt.total_seconds() / 3600),
+            "most_common_p_value_share": {
+                p: _mean(metrics["most_common_p_value"] == p) for p in P_VALUES
+            },
+            "resolved_share": _mean(metrics["resolution_status"] == "Resolved"),
+        }
+
+
+def _mean(values: pd.Series) -> float:
+    return float(values.mean()) if len(values) else 0.0
+
+
+def _distribution(values: pd.Series) -> Dict:
+    if values.empty:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    quantiles = np.quantile(values.to_numpy(dtype=float), [0.5, 0.95])
+    return {
+        "mean": float(values.mean()),
+        "p50": float(quantiles[0]),
+        "p95": float(quantiles[1]),
+        "max": float(values.max()),
+    }
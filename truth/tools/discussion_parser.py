@@ -1,50 +1,162 @@
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 import os
+import time
 from pathlib import Path
 from mistralai import Mistral
 from loguru import logger
 import dotenv
+from ..ratelimit import LLMScheduler, get_scheduler
+from ..retrieval import estimate_tokens
+from .transcript import (
+    MESSAGE_HEADER,
+    chunk_transcript,
+    message_blocks,
+    parse_block,
+    preparse,
+    split_messages,
+    vote_remainder,
+)
 
 dotenv.load_dotenv(dotenv_path=Path(__file__).parent.parent.parent / ".env")
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "")
 
+# Messages at the start of a chunk compared against the end of the previous one
+SEAM_WINDOW = 3
+# "llm" structures the whole transcript with Mistral, "hybrid" extracts the
+# mechanical fields with regexes and asks Mistral only for evidence/rationale,
+# "structural" makes no LLM call at all
+PARSE_MODES = ("llm", "hybrid", "structural")
+DESCRIPTION_AUTHOR = "bruna.uma"
+
+
+class RunningMetrics:
+    """
+    The counters behind DiscussionParser.calculate_metrics, updated one message
+    at a time so a growing discussion is tallied in O(new messages).
+    """
+
+    def __init__(self):
+        self.total_messages = 0
+        self.p_values = Counter({"P1": 0, "P2": 0, "P3": 0, "P4": 0})
+        self.evidence_count = 0
+        self.rationale_count = 0
+        self.users = set()
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.evidence_with_links_count = 0
+        self.total_links = 0
+        self.resolution_status = "Unresolved"
+
+    def add(self, message):
+        self.total_messages += 1
+        if message["user"] == DESCRIPTION_AUTHOR:
+            if "resolved" in message.get("content", "").lower():
+                self.resolution_status = "Resolved"
+            return
+
+        self.users.add(message["user"])
+        if message["P"]:
+            self.p_values[message["P"]] += 1
+        if message["evidence"]:
+            self.evidence_count += 1
+            if message["sources"]:
+                self.evidence_with_links_count += 1
+                self.total_links += len(message["sources"])
+        if message["rationale"]:
+            self.rationale_count += 1
+        if message["timestamp"]:
+            timestamp = datetime.strptime(message["timestamp"], "%Y-%m-%d, %I:%M %p")
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+
+    def summary(self):
+        total_messages = self.total_messages
+        evidence_count = self.evidence_count
+        time_span = (
+            self.last_timestamp - self.first_timestamp
+            if self.first_timestamp is not None
+            else None
+        )
+        return {
+            "total_messages": total_messages,
+            "unique_users": len(self.users),
+            "p_value_distribution": dict(self.p_values),
+            "evidence_count": evidence_count,
+            "evidence_percentage": (
+                (evidence_count / total_messages) * 100 if total_messages > 0 else 0
+            ),
+            "evidence_with_links_count": self.evidence_with_links_count,
+            "evidence_with_links_percentage": (
+                (self.evidence_with_links_count / evidence_count) * 100
+                if evidence_count > 0
+                else 0
+            ),
+            "total_links": self.total_links,
+            "rationale_count": self.rationale_count,
+            "rationale_percentage": (
+                (self.rationale_count / total_messages) * 100
+                if total_messages > 0
+                else 0
+            ),
+            "time_span": str(time_span) if time_span else "N/A",
+            "most_common_p_value": (
+                self.p_values.most_common(1)[0] if self.p_values else None
+            ),
+            "resolution_status": self.resolution_status,
+        }
+
 
 class DiscussionParser:
     def __init__(
         self,
         api_key: str = MISTRAL_API_KEY,
         model: str = "mistral-small-latest",
+        server_url: str | None = None,
+        llm_scheduler: LLMScheduler | None = None,
     ):
         self.api_key = api_key
         self.model = model
+        # Alternative Mistral-compatible endpoint, e.g. the benchmarks/ stand-in
+        self.server_url = server_url
+        # Rate limits and retries, shared with the agents by default
+        self.llm_scheduler = llm_scheduler or get_scheduler()
         self.content = None
         self.parsed = None
         self.metrics = None
         self.filepath = None
+        # Incremental state: running metrics and text not yet parsed
+        self._tally = None
+        self._tail = ""
         logger.info(f"DiscussionParser initialized with model: {model}")
 
-    def parse_from_file(self, filepath):
+    def parse_from_file(self, filepath, **kwargs):
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File {filepath} does not exist")
         with open(filepath, "r", encoding="utf-8") as file:
             self.content = file.read()
         self.filepath = filepath
-        return self.parse()
+        return self.parse(**kwargs)
 
-    def parse_from_str(self, content):
+    def parse_from_str(self, content, **kwargs):
         self.content = content
-        return self.parse()
-
-    def parse(self):
-        if not self.content:
-            raise ValueError(
-                "No content to parse. Use parse_from_file or parse_from_str first."
-            )
-
-        client = Mistral(api_key=self.api_key)
-        prompt = f"""
+        return self.parse(**kwargs)
+
+    def build_prompt(self, content: str, include_description: bool = True) -> str:
+        note = (
+            ""
+            if include_description
+            else """
+        This is a later part of a longer discussion whose description has already been extracted.
+        Use the description only as context: return an empty string for "description" and do not
+        include the message that contains the description.
+        """
+        )
+        return f"""
         You are an AI assistant tasked with analyzing a Discord discussion about a prediction market smart contract. 
         A prediction market smart contract allows individuals to make predictions and place bets on the likelihood of different outcomes for a future event. These types of contracts can be used for any kind of events such as: Sports games, Cryptocurrency price predictions, Product launches, Political policy decisions.
         This smart contract enables the creation of prediction markets based on any off-chain event with three possible outcomes, two of which are chosen by the market creator and the third reflecting the remaining outcomes (i.e. tie or a draw in a sporting event).
@@ -90,83 +202,279 @@ class DiscussionParser:
 
         Here's the Discord discussion to analyze:
 
-        {self.content}
-
+        {content}
+        {note}
         Please provide the structured JSON output based on this discussion.
         """
 
-        chat_response = client.chat.complete(
-            model=self.model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                },
-            ],
-            response_format={"type": "json_object"},
+    def build_semantic_prompt(self, messages) -> str:
+        rendered = "\n\n".join(
+            f"[{index}] {message['user']}: {message['text']}"
+            for index, message in messages
         )
+        return f"""
+        You are an AI assistant analyzing the messages of a Discord discussion about a prediction market dispute.
+        For each numbered message, extract:
+        - evidence: Any factual information or links provided to support the user's position, as direct quotes or links.
+        - rationale: Any reasoning or explanation given by the user for their position.
+        If a field is not present in a message, use an empty string for that field.
 
-        self.parsed = json.loads(chat_response.choices[0].message.content)
-        return self.parsed
+        Messages:
 
-    def calculate_metrics(self):
-        messages = self.parsed["messages"]
-        total_messages = len(messages)
-
-        p_values = Counter({"P1": 0, "P2": 0, "P3": 0, "P4": 0})
-        evidence_count = 0
-        rationale_count = 0
-        users = set()
-        timestamps = []
-        evidence_with_links_count = 0
-        total_links = 0
-        resolution_status = "Unresolved"
+        {rendered}
 
-        for message in messages:
-            if message["user"] == "bruna.uma":
-                if "resolved" in message.get("content", "").lower():
-                    resolution_status = "Resolved"
-                continue
-
-            users.add(message["user"])
-            if message["P"]:
-                p_values[message["P"]] += 1
-            if message["evidence"]:
-                evidence_count += 1
-                if message["sources"]:
-                    evidence_with_links_count += 1
-                    total_links += len(message["sources"])
-            if message["rationale"]:
-                rationale_count += 1
-            if message["timestamp"]:
-                timestamps.append(
-                    datetime.strptime(message["timestamp"], "%Y-%m-%d, %I:%M %p")
-                )
+        Return a JSON object of the form:
+        {{"messages": [{{"index": 1, "evidence": "...", "rationale": "..."}}, ...]}}
+        """
 
-        time_span = max(timestamps) - min(timestamps) if timestamps else None
-        self.metrics = {
-            "total_messages": total_messages,
-            "unique_users": len(users),
-            "p_value_distribution": dict(p_values),
-            "evidence_count": evidence_count,
-            "evidence_percentage": (
-                (evidence_count / total_messages) * 100 if total_messages > 0 else 0
-            ),
-            "evidence_with_links_count": evidence_with_links_count,
-            "evidence_with_links_percentage": (
-                (evidence_with_links_count / evidence_count) * 100
-                if evidence_count > 0
-                else 0
+    def _complete_json(self, client, prompt: str):
+        chat_response = self.llm_scheduler.call(
+            lambda: client.chat.complete(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
             ),
-            "total_links": total_links,
-            "rationale_count": rationale_count,
-            "rationale_percentage": (
-                (rationale_count / total_messages) * 100 if total_messages > 0 else 0
-            ),
-            "time_span": str(time_span) if time_span else "N/A",
-            "most_common_p_value": p_values.most_common(1)[0] if p_values else None,
-            "resolution_status": resolution_status,
-        }
+            prompt_tokens=estimate_tokens(prompt),
+        )
+        return json.loads(chat_response.choices[0].message.content)
+
+    def _parse_chunk(self, client, content: str, include_description: bool = True):
+        prompt = self.build_prompt(content, include_description)
+        return self._complete_json(client, prompt)
+
+    def parse(
+        self, chunk_chars: int | None = None, concurrency: int = 4, mode: str = "llm"
+    ):
+        """
+        Structures the transcript with Mistral.
+        Parameters:
+            chunk_chars (int, optional): Split longer transcripts on message
+                boundaries into chunks of about this many characters, each
+                carrying the Description, and parse them concurrently.
+            concurrency (int): Chunks parsed at the same time.
+            mode (str): "llm", "hybrid" or "structural", see PARSE_MODES.
+                The last two read user, timestamp, P and sources with regexes
+                and keep each message's raw body under "text".
+        Returns:
+            dict: {"description", "messages"}.
+        """
+        if not self.content:
+            raise ValueError(
+                "No content to parse. Use parse_from_file or parse_from_str first."
+            )
+        if mode not in PARSE_MODES:
+            raise ValueError(f"Unknown parse mode: {mode}. Use one of {PARSE_MODES}.")
+
+        self._tally, self._tail = None, ""
+        if mode != "llm":
+            self.parsed = preparse(self.content)
+            if mode == "hybrid":
+                self._extract_semantics(
+                    self.parsed["messages"], chunk_chars, concurrency
+                )
+            return self.parsed
+
+        client = Mistral(api_key=self.api_key, server_url=self.server_url)
+        if chunk_chars is None or len(self.content) <= chunk_chars:
+            self.parsed = self._parse_chunk(client, self.content)
+            return self.parsed
+
+        chunks = chunk_transcript(self.content, chunk_chars)
+        logger.info(f"Parsing discussion in {len(chunks)} chunks")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            parts = list(
+                executor.map(
+                    lambda index: self._parse_chunk(client, chunks[index], index == 0),
+                    range(len(chunks)),
+                )
+            )
+        self.parsed = self._merge_chunks(parts)
+        return self.parsed
+
+    def append(
+        self,
+        text: str,
+        complete: bool = True,
+        mode: str = "structural",
+        concurrency: int = 4,
+    ):
+        """
+        Parses only the messages in newly appended transcript text and updates
+        self.parsed and self.metrics with them.
+        Parameters:
+            text (str): Transcript text following what was already given, e.g.
+                the output of transcript.render_message for a live message.
+            complete (bool): Whether text ends on a message boundary. If not,
+                e.g. when tailing a file, the last message is held back until
+                the next header arrives or flush() is called.
+            mode (str): "structural" or "hybrid", see PARSE_MODES.
+            concurrency (int): Mistral calls at the same time in hybrid mode.
+        Returns:
+            list: The newly parsed messages.
+        """
+        if mode not in ("structural", "hybrid"):
+            raise ValueError(
+                f"Incremental parsing supports structural and hybrid modes, not {mode}."
+            )
+        self.content = (self.content or "") + text
+        self._tail += text
+        if self._tally is None:
+            # Continue from a full parse if there was one
+            self._tally = RunningMetrics()
+            for message in (self.parsed or {}).get("messages", []):
+                self._tally.add(message)
+
+        ready = self._take_ready(complete)
+        if not ready:
+            return []
+        if self.parsed is None:
+            self.parsed = preparse(ready)
+            messages = list(self.parsed["messages"])
+        else:
+            messages = [parse_block(block) for block in message_blocks(ready)[1]]
+            self.parsed["messages"].extend(messages)
+        if mode == "hybrid":
+            self._extract_semantics(messages, concurrency=concurrency)
+        for message in messages:
+            self._tally.add(message)
+        self.metrics = self._tally.summary()
+        return messages
+
+    def flush(self, mode: str = "structural", concurrency: int = 4):
+        """Parses a message held back by append(complete=False)."""
+        return self.append("", complete=True, mode=mode, concurrency=concurrency)
+
+    def follow(
+        self,
+        filepath,
+        mode: str = "structural",
+        poll_interval: float = 1.0,
+        stop=None,
+        concurrency: int = 4,
+    ):
+        """
+        Tails a transcript file, parsing text as it is appended.
+        Parameters:
+            stop (threading.Event, optional): Stops following once set and no
+                new text is left; without it the generator runs until closed.
+        Yields:
+            list: The messages parsed from each new piece of the file.
+        """
+        self.filepath = filepath
+        with open(filepath, "r", encoding="utf-8") as file:
+            while True:
+                text = file.read()
+                if text:
+                    messages = self.append(
+                        text, complete=False, mode=mode, concurrency=concurrency
+                    )
+                    if messages:
+                        yield messages
+                elif stop is not None and stop.is_set():
+                    break
+                else:
+                    time.sleep(poll_interval)
+        messages = self.flush(mode, concurrency)
+        if messages:
+            yield messages
+
+    def _take_ready(self, complete: bool) -> str:
+        """
+        Splits off the buffered text whose messages are known to be whole.
+        Until the description has been parsed, nothing is ready without a header.
+        """
+        starts = [match.start() for match in MESSAGE_HEADER.finditer(self._tail)]
+        if self.parsed is None and not starts:
+            return ""
+        if complete:
+            ready, self._tail = self._tail, ""
+        elif len(starts) < 2:
+            return ""
+        else:
+            ready, self._tail = self._tail[: starts[-1]], self._tail[starts[-1] :]
+        return ready
+
+    def _extract_semantics(self, messages, chunk_chars=None, concurrency=4):
+        """
+        Fills in evidence and rationale of pre-parsed messages. Bare votes such
+        as "P4" carry neither, so only the other messages are sent to Mistral,
+        in batches of about chunk_chars characters.
+        """
+        pending = [
+            (index, message)
+            for index, message in enumerate(messages, start=1)
+            if vote_remainder(message["text"])
+        ]
+        if not pending:
+            return
+        budget = chunk_chars or sum(len(message["text"]) for _, message in pending)
+        batches, current, size = [], [], 0
+        for index, message in pending:
+            if current and size + len(message["text"]) > budget:
+                batches.append(current)
+                current, size = [], 0
+            current.append((index, message))
+            size += len(message["text"])
+        batches.append(current)
+
+        client = Mistral(api_key=self.api_key, server_url=self.server_url)
+
+        def extract(batch):
+            return self._complete_json(client, self.build_semantic_prompt(batch))
+
+        logger.info(
+            f"Extracting evidence of {len(pending)} messages in {len(batches)} batches"
+        )
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            replies = list(executor.map(extract, batches))
+        for reply in replies:
+            for entry in reply.get("messages", []):
+                try:
+                    index = int(entry.get("index"))
+                except (TypeError, ValueError):
+                    continue
+                if not 1 <= index <= len(messages):
+                    continue
+                message = messages[index - 1]
+                message["evidence"] = entry.get("evidence") or ""
+                message["rationale"] = entry.get("rationale") or ""
+
+    def _merge_chunks(self, parts):
+        """
+        Concatenates the chunks' messages in order. Every chunk repeats the
+        description, so its message is dropped from later chunks, as are
+        messages repeated across a chunk seam.
+        """
+        preamble, _ = split_messages(self.content)
+        headers = list(MESSAGE_HEADER.finditer(preamble))
+        description_author = (
+            (headers[-1]["user"], headers[-1]["timestamp"]) if headers else None
+        )
+
+        merged = {"description": parts[0].get("description", ""), "messages": []}
+        for index, part in enumerate(parts):
+            messages = part.get("messages", [])
+            if index > 0:
+                messages = [
+                    message
+                    for message in messages
+                    if (message.get("user"), message.get("timestamp"))
+                    != description_author
+                ]
+                seam = {_message_key(m) for m in merged["messages"][-SEAM_WINDOW:]}
+                while messages and _message_key(messages[0]) in seam:
+                    messages.pop(0)
+            merged["messages"].extend(messages)
+        return merged
+
+    def calculate_metrics(self):
+        if self._tally is not None:
+            self.metrics = self._tally.summary()
+            return self.metrics
+        tally = RunningMetrics()
+        for message in self.parsed["messages"]:
+            tally.add(message)
+        self.metrics = tally.summary()
         return self.metrics
 
     def write(
@@ -224,6 +532,13 @@ class DiscussionParser:
         print(f"Resolution Status: {self.metrics['resolution_status']}")
 
 
+def _message_key(message):
+    return tuple(
+        str(message.get(field, ""))
+        for field in ("user", "timestamp", "P", "evidence", "rationale")
+    )
+
+
 # Example usage
 if __name__ == "__main__":
     parser = DiscussionParser()
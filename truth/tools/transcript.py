@@ -0,0 +1,129 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# "username 2024-10-03, 5:37 PM" on a line of its own starts every Discord message
+MESSAGE_HEADER = re.compile(
+    r"^(?P<user>\S+) (?P<timestamp>\d{4}-\d{2}-\d{2}, \d{1,2}:\d{2} [AP]M)[ \t]*$",
+    re.MULTILINE,
+)
+
+
+def message_blocks(content: str) -> Tuple[str, List[str]]:
+    """
+    Returns:
+        tuple: The text before the first message header and one text block
+        per message, each starting with its header.
+    """
+    starts = [match.start() for match in MESSAGE_HEADER.finditer(content)]
+    if not starts:
+        return content, []
+    blocks = [
+        content[start:end] for start, end in zip(starts, starts[1:] + [len(content)])
+    ]
+    return content[: starts[0]], blocks
+
+
+def split_messages(content: str) -> Tuple[str, List[str]]:
+    """
+    Splits a copied Discord transcript on message boundaries.
+    Returns:
+        tuple: The preamble (everything up to and including the message that
+        holds "Description:") and one text block per following message.
+    """
+    head, blocks = message_blocks(content)
+    if not blocks:
+        return content, []
+    description_index = next(
+        (i for i, block in enumerate(blocks) if "Description:" in block), -1
+    )
+    preamble = head + "".join(blocks[: description_index + 1])
+    return preamble, blocks[description_index + 1 :]
+
+
+def chunk_transcript(content: str, max_chars: int) -> List[str]:
+    """
+    Splits a transcript into chunks of whole messages of about max_chars each.
+    Every chunk starts with the preamble so the Description stays attached.
+    """
+    preamble, blocks = split_messages(content)
+    budget = max(1, max_chars - len(preamble))
+    groups, current, size = [], [], 0
+    for block in blocks:
+        if current and size + len(block) > budget:
+            groups.append(current)
+            current, size = [], 0
+        current.append(block)
+        size += len(block)
+    if current:
+        groups.append(current)
+    return [preamble + "".join(group) for group in groups] or [content]
+
+
+# A vote is a P token opening the message, optionally followed by its outcome
+VOTE = re.compile(
+    r"^\s*P(?P<p>[1-4])\b(?:\s*-?\s*(?:yes|no|unknown|too early)\b)?", re.IGNORECASE
+)
+URL = re.compile(r"https?://[^\s<>\"'\]]+")
+# Lines the Discord web client adds when a transcript is copied
+NOISE_LINES = frozenset({"Discord user avatar"})
+
+
+def message_text(block: str) -> str:
+    """The body of a message block, without its header and client noise."""
+    lines = block.splitlines()[1:]
+    return "\n".join(line for line in lines if line.strip() not in NOISE_LINES).strip()
+
+
+def extract_urls(text: str) -> List[str]:
+    urls = (url.rstrip(".,;:!?)") for url in URL.findall(text))
+    return list(dict.fromkeys(urls))
+
+
+def vote_remainder(text: str) -> str:
+    """What a message says besides its vote, e.g. "" for a bare "P4 - Too Early"."""
+    return VOTE.sub("", text, count=1).strip()
+
+
+def parse_block(block: str) -> Dict:
+    """Reads one message block into the DiscussionParser message format."""
+    header = MESSAGE_HEADER.match(block)
+    text = message_text(block)
+    vote = VOTE.match(text)
+    return {
+        "user": header["user"],
+        "timestamp": header["timestamp"],
+        "P": f"P{vote['p']}" if vote else "",
+        "evidence": "",
+        "sources": extract_urls(text),
+        "rationale": "",
+        "text": text,
+    }
+
+
+def render_message(user: str, created_at: datetime, content: str) -> str:
+    """
+    Formats a message, e.g. a discord.py Message's author name, created_at and
+    content, as it appears in a copied transcript.
+    """
+    hour = created_at.strftime("%I").lstrip("0")
+    stamp = f"{created_at:%Y-%m-%d}, {hour}:{created_at:%M %p}"
+    return f"{user} {stamp}\n{content.strip()}\n\n"
+
+
+def preparse(content: str) -> Dict:
+    """
+    Extracts the mechanical fields of a transcript without an LLM: the
+    description, and each message's user, timestamp, P value and source URLs.
+    Returns:
+        dict: {"description", "messages"} in the DiscussionParser format, with
+        empty "evidence"/"rationale" and the raw message body under "text".
+    """
+    preamble, blocks = split_messages(content)
+    description = ""
+    if "Description:" in preamble:
+        description = message_text("\n" + preamble.split("Description:", 1)[1])
+    return {
+        "description": description,
+        "messages": [parse_block(block) for block in blocks],
+    }
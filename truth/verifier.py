@@ -1,36 +1,132 @@
+import copy
+import hashlib
 import os
+import re
+import httpx
 import requests
 import time
+from contextlib import contextmanager
 from typing import List, Dict
 from loguru import logger
 from dotenv import load_dotenv
 from mistralai import Mistral
 import json
-from .actions import AVAILABLE_ACTIONS
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from .actions import AVAILABLE_ACTIONS, route_links
+from .context import DeadlineExceeded, Usage, VerificationContext
+from .http import HTTPTransport, get_transport
+from .metrics import MetricsRegistry, get_metrics
+from .ratelimit import LLMScheduler, get_scheduler
+from .retrieval import STOPWORDS, estimate_tokens, select_passages
+from .similarity import StatementIndex
 
 load_dotenv()
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "")
 BRAVE_API_KEY = os.getenv("BRAVE_API_KEY", "")
+BRAVE_SEARCH_URL = "https://api.search.brave.com/res/v1/web/search"
+
+# Context windows used to cap packed vote prompts
+MODEL_CONTEXT_TOKENS = {
+    "mistral-small-2409": 32_000,
+    "mistral-small-latest": 32_000,
+    "mistral-large-2407": 128_000,
+    "mistral-large-latest": 128_000,
+}
+# Instructions of the packed vote prompt, and the reply expected per vote
+PACKED_PROMPT_TOKENS = 400
+PACKED_VOTE_REPLY_TOKENS = 120
+# A statement already phrased as a yes/no question needs no reformulation
+YES_NO_QUESTION = re.compile(
+    r"^(is|are|was|were|am|do|does|did|will|would|can|could|has|have|had|"
+    r"should|shall|may|might|must)\b[^?]*\?$",
+    re.IGNORECASE,
+)
+# Search results fast mode chooses the sources to read from
+FAST_SEARCH_RESULTS = 6
+# Fields of a verdict reused for near-duplicate statements
+VERDICT_FIELDS = ("result", "confidence", "explanation", "sources")
+# Evidence kept per near-duplicate index entry when the agent sends full context
+INDEXED_EVIDENCE_TOKENS = 2000
+# Errors of a stage that ran out of its share of a verification's deadline
+TIMEOUT_ERRORS = (DeadlineExceeded, httpx.TimeoutException, requests.Timeout)
 
 
 class VerifierAgent:
+    """
+    Verifies statements and UMA votes with Mistral, Brave search and the
+    source readers in AVAILABLE_ACTIONS.
+
+    The agent only holds shared, thread-safe resources (clients, transport,
+    caches, LLM scheduler and the aggregate usage). Everything a single
+    verification gathers lives in a VerificationContext created per call, so
+    one agent can serve many threads at once.
+    """
+
     def __init__(
         self,
         mistral_api_key=MISTRAL_API_KEY,
         brave_api_key=BRAVE_API_KEY,
         model="mistral-small-latest",
+        max_concurrent_actions: int = 4,
+        requests_per_second: float | None = None,
+        llm_cache=None,
+        search_cache=None,
+        transport: HTTPTransport | None = None,
+        planner: str = "rules",
+        retrieval_top_k: int = 8,
+        context_token_budget: int | None = 2000,
+        metrics: MetricsRegistry | None = None,
+        mistral_server_url: str | None = None,
+        brave_search_url: str = BRAVE_SEARCH_URL,
+        llm_scheduler: LLMScheduler | None = None,
+        speculative: bool = False,
+        fast: bool = False,
+        statement_index: StatementIndex | None = None,
     ):
-        self.mistral_client = Mistral(api_key=mistral_api_key)
+        # mistral_server_url / brave_search_url point the agent at other endpoints,
+        # e.g. the local stand-ins in benchmarks/
+        self.mistral_client = Mistral(
+            api_key=mistral_api_key, server_url=mistral_server_url
+        )
+        self.brave_search_url = brave_search_url
+        # Connection pools for Brave and the source readers, shared process-wide by default
+        self.transport = transport or get_transport()
+        # Optional truth.cache.MemoryCache / SQLiteCache for repeatable prompts
+        self.llm_cache = llm_cache
+        # Optional cache of Brave results, keyed on the normalized query
+        self.search_cache = search_cache
+        # Optional truth.similarity.StatementIndex; near-duplicates of verified
+        # statements reuse their verdict, or seed a new one with their evidence
+        self.statement_index = statement_index
+        # Rate limits, retries and adaptive concurrency for every Mistral call.
+        # Shared process-wide by default; requests_per_second gives the agent its own
+        if llm_scheduler is None and requests_per_second:
+            llm_scheduler = LLMScheduler(requests_per_minute=requests_per_second * 60)
+        self.llm_scheduler = llm_scheduler or get_scheduler()
         self.brave_api_key = brave_api_key
         self.model = model
         self.available_actions = AVAILABLE_ACTIONS
-        self.action_plan = []
-        self.context = {}
-        # Initialize total time and cost tracking
-        self.total_time = 0.0
-        self.total_prompt_tokens = 0
-        self.total_completion_tokens = 0
-        self.total_cost = 0.0
+        # "rules" routes links by URL pattern and asks the LLM only about the
+        # rest; "llm" always plans with the LLM
+        if planner not in ("rules", "llm"):
+            raise ValueError(f"Unknown planner: {planner}")
+        self.planner = planner
+        # Start reading the top search results while the planner LLM call runs;
+        # prefetches the plan does not use are discarded
+        self.speculative = speculative
+        # One JSON call yields the question, the search query and the preferred
+        # sources, and links are planned by URL pattern without a planning call
+        self.fast = fast
+        # Only the top-k passages most relevant to the question, within the
+        # token budget, reach the final prompt; None sends the full context
+        self.retrieval_top_k = retrieval_top_k
+        self.context_token_budget = context_token_budget
+        # Upper bound on planned actions fetched in parallel per verification
+        self.max_concurrent_actions = max(1, max_concurrent_actions)
+        # Usage accumulated over every call made through this agent
+        self.usage = Usage()
+        # Latency, size and token histograms fed by every span, shared process-wide by default
+        self.metrics = metrics or get_metrics()
         logger.success(f"Verifier Agent initialized with model: {model}")
 
     def log_event(
@@ -55,44 +151,301 @@ class VerifierAgent:
             f"Event: {event}\nInput: {input_data}\nOutput: {output_preview}\n---"
         )
 
-    def formulate_question(self, statement: str):
-        prompt = f"Convert the following statement into a clear and concise yes/no question:\n\n{statement}"
-        start_time = time.time()
-        response = self.mistral_client.chat.complete(
-            model=self.model, messages=[{"role": "user", "content": prompt}]
+    def reset_usage(self):
+        self.usage = Usage()
+
+    def usage_summary(self):
+        return self.usage.summary()
+
+    def _add_usage(self, ctx: VerificationContext, **amounts):
+        """Counts usage against both the call's context and the agent's total."""
+        ctx.usage.add(**amounts)
+        self.usage.add(**amounts)
+
+    @contextmanager
+    def _span(self, ctx: VerificationContext, stage: str, **attrs):
+        """
+        Times one stage of a verification. The yielded dict can be annotated
+        (url, bytes, tokens, cache_hit); on exit it is added to ctx.spans and
+        fed to the metrics registry.
+        """
+        span = {"stage": stage, **attrs, "start": time.time()}
+        start_time = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span["duration"] = round(time.perf_counter() - start_time, 6)
+            ctx.add_span(span)
+            self._observe_span(span)
+
+    def _observe_span(self, span: Dict):
+        labels = {"stage": span["stage"]}
+        if "action" in span:
+            labels["action"] = span["action"]
+        self.metrics.observe("truth_stage_duration_seconds", span["duration"], **labels)
+        if span.get("bytes") is not None:
+            self.metrics.observe("truth_stage_bytes", span["bytes"], **labels)
+        for kind in ("prompt", "completion"):
+            if span.get(f"{kind}_tokens") is not None:
+                self.metrics.observe(
+                    "truth_llm_tokens", span[f"{kind}_tokens"], kind=kind, **labels
+                )
+        if "cache_hit" in span:
+            result = "hit" if span["cache_hit"] else "miss"
+            self.metrics.inc("truth_cache_lookups_total", result=result, **labels)
+
+    def _llm_cache_key(self, prompt: str, response_format: Dict | None):
+        payload = json.dumps([self.model, prompt, response_format], sort_keys=True)
+        return "llm:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _llm_cache_get(self, cache_key: str | None, ctx: VerificationContext):
+        if cache_key is None or self.llm_cache is None:
+            return None
+        entry = self.llm_cache.get(cache_key)
+        if entry is None:
+            return None
+        cached = entry["value"]
+        # Cached calls are not billed; they are counted separately
+        self._add_usage(
+            ctx,
+            llm_cache_hits=1,
+            cached_prompt_tokens=cached["prompt_tokens"],
+            cached_completion_tokens=cached["completion_tokens"],
+            saved_cost=self._cost_of(
+                cached["prompt_tokens"], cached["completion_tokens"]
+            ),
+        )
+        return cached["content"]
+
+    def _llm_cache_set(self, cache_key: str | None, content: str, response):
+        if cache_key is None or self.llm_cache is None:
+            return
+        usage = response.usage
+        self.llm_cache.set(
+            cache_key,
+            {
+                "content": content,
+                "prompt_tokens": usage.prompt_tokens if usage else 0,
+                "completion_tokens": usage.completion_tokens if usage else 0,
+            },
         )
-        elapsed_time = time.time() - start_time
-        self.total_time += elapsed_time
 
+    def _chat(
+        self,
+        prompt: str,
+        ctx: VerificationContext,
+        response_format: Dict | None = None,
+        cacheable=False,
+        stage: str = "llm",
+    ) -> str:
+        """
+        Sends a single-turn prompt to Mistral, tracks usage and returns the content.
+        Cacheable prompts are answered from llm_cache when possible.
+        """
+        with self._span(ctx, stage, model=self.model) as span:
+            cache_key = (
+                self._llm_cache_key(prompt, response_format) if cacheable else None
+            )
+            cached = self._llm_cache_get(cache_key, ctx)
+            if cacheable:
+                span["cache_hit"] = cached is not None
+            if cached is not None:
+                return cached
+
+            kwargs = {"response_format": response_format} if response_format else {}
+            start_time = time.time()
+            response = self.llm_scheduler.call(
+                lambda: self.mistral_client.chat.complete(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    **kwargs,
+                    **self._timeout_kwargs(ctx, stage),
+                ),
+                prompt_tokens=estimate_tokens(prompt),
+                deadline=ctx.expires_at,
+            )
+            self._add_usage(ctx, total_time=time.time() - start_time)
+            return self._chat_content(response, ctx, span, cache_key)
+
+    @staticmethod
+    def _timeout_kwargs(ctx: VerificationContext, stage: str) -> Dict:
+        """Mistral's timeout_ms for a stage of a call with a deadline."""
+        timeout = ctx.stage_timeout(stage)
+        if timeout is None:
+            return {}
+        if timeout <= 0:
+            raise DeadlineExceeded(f"No time left for {stage}")
+        return {"timeout_ms": max(1, int(timeout * 1000))}
+
+    def _chat_content(self, response, ctx: VerificationContext, span, cache_key):
         # Extract token usage and calculate cost
-        self.update_usage_and_cost(response)
+        self.update_usage_and_cost(response, ctx)
+        if response.usage:
+            span["prompt_tokens"] = response.usage.prompt_tokens
+            span["completion_tokens"] = response.usage.completion_tokens
+
+        content = response.choices[0].message.content
+        self._llm_cache_set(cache_key, content, response)
+        return content
 
-        question = response.choices[0].message.content.strip()
+    def build_question_prompt(self, statement: str) -> str:
+        return f"Convert the following statement into a clear and concise yes/no question:\n\n{statement}"
+
+    def formulate_question(self, statement: str, ctx: VerificationContext | None = None):
+        ctx = ctx or VerificationContext()
+        prompt = self.build_question_prompt(statement)
+        try:
+            question = self._chat(
+                prompt, ctx, cacheable=True, stage="formulate_question"
+            ).strip()
+        except TIMEOUT_ERRORS:
+            if ctx.expires_at is None:
+                raise
+            logger.warning("Question formulation timed out, using the statement")
+            question = statement
         self.log_event("Formulate Question", statement, question)
         return question
 
-    def perform_web_search(self, question: str, num_results: int = 3):
-        url = "https://api.search.brave.com/res/v1/web/search"
-        headers = {"X-Subscription-Token": self.brave_api_key}
-        params = {"q": question}
-        start_time = time.time()
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            results = response.json()
-            links = [
-                result["url"] for result in results.get("web", {}).get("results", [])
-            ][:num_results]
-            self.log_event("Web Search", question, links)
-            return links
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Web search failed: {str(e)}")
-            return []
-        finally:
-            elapsed_time = time.time() - start_time
-            self.total_time += elapsed_time
+    def build_query_prompt(self, statement: str) -> str:
+        return f"""Prepare a web search to verify the following statement.
+
+Statement:
+{statement}
+
+Reply with a JSON object with the following fields:
 
-    def plan_actions(self, query: str, links: List[str]) -> List[Dict]:
+{{
+    "question": "The statement as a clear and concise yes/no question",
+    "search_query": "A short web search query for the evidence",
+    "preferred_sources": ["Domains most likely to hold the evidence, e.g. wikipedia.org; can be empty"]
+}}
+"""
+
+    def formulate_query(self, statement: str, ctx: VerificationContext | None = None):
+        """
+        Fast mode's single call before the search.
+        Returns:
+            dict: "question", "search_query" and "preferred_sources". A statement
+            that already is a yes/no question is used as is, without a call.
+        """
+        ctx = ctx or VerificationContext()
+        query = direct_query(statement)
+        if query is None:
+            prompt = self.build_query_prompt(statement)
+            try:
+                content = self._chat(
+                    prompt,
+                    ctx,
+                    response_format={"type": "json_object"},
+                    cacheable=True,
+                    stage="formulate_question",
+                )
+            except TIMEOUT_ERRORS:
+                if ctx.expires_at is None:
+                    raise
+                logger.warning("Query formulation timed out, using the statement")
+                content = ""
+            query = parse_query(content, statement)
+        self.log_event("Formulate Query", statement, query)
+        return query
+
+    def plan_from_query(
+        self,
+        query: Dict,
+        links: List[str],
+        ctx: VerificationContext | None = None,
+        num_sources: int = 3,
+    ) -> List[Dict]:
+        """
+        Fast mode's plan: of the (FAST_SEARCH_RESULTS) search results, the
+        num_sources to read, those from the preferred sources first, routed
+        by URL pattern. Links no rule matches are skipped.
+        """
+        ctx = ctx or VerificationContext()
+        preferred = [domain.lower() for domain in query["preferred_sources"]]
+        links = sorted(
+            links, key=lambda link: not any(d in link.lower() for d in preferred)
+        )
+        ctx.action_plan, skipped = route_links(links, self.available_actions)
+        ctx.action_plan = ctx.action_plan[:num_sources]
+        if skipped:
+            logger.warning(f"No action for links: {skipped}")
+        self.log_event(
+            "Plan Actions (fast)",
+            {"question": query["question"], "links": links},
+            ctx.action_plan,
+        )
+        return ctx.action_plan
+
+    def _parse_search_results(self, results: Dict, num_results: int) -> List[str]:
+        return [result["url"] for result in results.get("web", {}).get("results", [])][
+            :num_results
+        ]
+
+    def _search_cache_key(self, question: str, num_results: int):
+        return f"search:{num_results}:{normalize_query(question)}"
+
+    def _cached_search(self, question: str, num_results: int):
+        if self.search_cache is None:
+            return None
+        entry = self.search_cache.get(self._search_cache_key(question, num_results))
+        if entry is None:
+            return None
+        self.log_event("Web Search (cached)", question, entry["value"])
+        return list(entry["value"])
+
+    def _store_search(self, question: str, num_results: int, links: List[str]):
+        if self.search_cache is not None:
+            self.search_cache.set(self._search_cache_key(question, num_results), links)
+
+    def perform_web_search(
+        self,
+        question: str,
+        num_results: int = 3,
+        ctx: VerificationContext | None = None,
+    ):
+        ctx = ctx or VerificationContext()
+        with self._span(ctx, "web_search", url=self.brave_search_url) as span:
+            cached = self._cached_search(question, num_results)
+            span["cache_hit"] = cached is not None
+            if cached is not None:
+                span["results"] = len(cached)
+                return cached
+
+            headers = {"X-Subscription-Token": self.brave_api_key}
+            params = {"q": question}
+            timeout = self._search_timeout(ctx)
+            if timeout == 0:
+                span["error"] = "deadline"
+                return []
+            start_time = time.time()
+            try:
+                response = self.transport.get(
+                    self.brave_search_url, headers=headers, params=params, **timeout
+                )
+                response.raise_for_status()
+                links = self._parse_search_results(response.json(), num_results)
+                self._store_search(question, num_results, links)
+                self.log_event("Web Search", question, links)
+                span["results"] = len(links)
+                return links
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Web search failed: {str(e)}")
+                span["error"] = str(e)
+                return []
+            finally:
+                self._add_usage(ctx, total_time=time.time() - start_time)
+
+    def _search_timeout(self, ctx: VerificationContext):
+        """Request kwargs bounding the search by its share of the deadline, or 0."""
+        timeout = ctx.stage_timeout("web_search")
+        if timeout is None:
+            return {}
+        if timeout <= 0:
+            return 0
+        return {"timeout": min(timeout, self.transport.timeout)}
+
+    def build_plan_prompt(self, query: str, links: List[str]) -> str:
         # Prepare action descriptions
         action_descriptions = "\n".join(
             [
@@ -102,7 +455,7 @@ class VerifierAgent:
         )
         logger.debug(f"Action descriptions: {action_descriptions}")
 
-        prompt = f"""As an AI agent, plan a sequence of actions to verify the following query based on the provided links.
+        return f"""As an AI agent, plan a sequence of actions to verify the following query based on the provided links.
 You have the following actions available:
 {action_descriptions}
 
@@ -126,25 +479,15 @@ Example:
     ]
 }}
 """
-        start_time = time.time()
-        response = self.mistral_client.chat.complete(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-        )
-        elapsed_time = time.time() - start_time
-        self.total_time += elapsed_time
-
-        # Extract token usage and calculate cost
-        self.update_usage_and_cost(response)
 
+    def _parse_action_plan(self, content: str, query: str, links: List[str]):
         try:
-            plan_data = json.loads(response.choices[0].message.content)
-            self.action_plan = plan_data.get("action_plan", [])
+            plan_data = json.loads(content)
+            action_plan = plan_data.get("action_plan", [])
             self.log_event(
-                "Plan Actions", {"question": query, "links": links}, self.action_plan
+                "Plan Actions", {"question": query, "links": links}, action_plan
             )
-            return self.action_plan
+            return action_plan
         except (json.JSONDecodeError, KeyError) as e:
             logger.warning(f"Failed to parse action plan: {str(e)}")
             self.log_event(
@@ -154,7 +497,99 @@ Example:
             )
             return []
 
-    def take_action(self, action_meta):
+    def _route_links(self, query: str, links: List[str]):
+        """Splits links into a rule-based plan and the links still needing the LLM."""
+        if self.planner != "rules":
+            return [], links
+        routed, unrouted = route_links(links, self.available_actions)
+        if routed:
+            self.log_event(
+                "Route Links", {"question": query, "links": links}, routed
+            )
+        return routed, unrouted
+
+    def plan_actions(
+        self, query: str, links: List[str], ctx: VerificationContext | None = None
+    ) -> List[Dict]:
+        ctx = ctx or VerificationContext()
+        routed, links = self._route_links(query, links)
+        if not links:
+            ctx.action_plan = routed
+            return ctx.action_plan
+
+        prompt = self.build_plan_prompt(query, links)
+        try:
+            content = self._chat(
+                prompt,
+                ctx,
+                response_format={"type": "json_object"},
+                cacheable=True,
+                stage="plan_actions",
+            )
+        except TIMEOUT_ERRORS:
+            if ctx.expires_at is None:
+                raise
+            ctx.action_plan = routed + self._fallback_plan(links)
+            return ctx.action_plan
+        ctx.action_plan = routed + self._parse_action_plan(content, query, links)
+        return ctx.action_plan
+
+    def _prefetch_plan(self, links: List[str]) -> List[Dict]:
+        """
+        The actions worth starting before the plan is known: the top links,
+        each with the reader the URL router picks (the default reader for
+        plain webpages). None when planning needs no LLM call anyway.
+        """
+        # Fast mode makes no planning call to overlap with
+        if not self.speculative or self.fast:
+            return []
+        links = links[: self.max_concurrent_actions]
+        plan, unrouted = route_links(links, self.available_actions)
+        if self.planner == "rules" and not unrouted:
+            return []
+        return plan
+
+    def _start_prefetch(self, links: List[str], ctx: VerificationContext):
+        """
+        Starts the prefetch plan in ctx.prefetches. Returns the executor, which
+        the planned actions must share so that together they stay within
+        max_concurrent_actions, or None when nothing was prefetched.
+        """
+        plan = self._prefetch_plan(links)
+        if not plan:
+            return None
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_actions)
+        for action_meta in plan:
+            ctx.prefetches[action_key(action_meta)] = executor.submit(
+                self._timed_action, action_meta, ctx, True
+            )
+        return executor
+
+    def _take_prefetched(self, action_meta, ctx: VerificationContext):
+        prefetched = ctx.prefetches.pop(action_key(action_meta), None)
+        if prefetched is not None:
+            self.metrics.inc("truth_prefetch_total", result="used")
+        return prefetched
+
+    def _discard_prefetches(self, ctx: VerificationContext):
+        """Cancels the prefetches the plan did not use; running ones are ignored."""
+        for prefetched in ctx.prefetches.values():
+            prefetched.cancel()
+            self.metrics.inc("truth_prefetch_total", result="wasted")
+        ctx.prefetches.clear()
+
+    def _fallback_plan(self, links: List[str]) -> List[Dict]:
+        """Routes links by URL pattern alone when the planner ran out of time."""
+        logger.warning("Planning ran out of time, routing links by URL pattern")
+        plan, _ = route_links(links, self.available_actions)
+        return plan
+
+    def _record_observation(self, ctx, action_name, params, observation):
+        ctx.record_observation(action_name, observation)
+        self.log_event(f"Action Taken: {action_name}", params, observation, False)
+
+    def _run_action(self, action_meta):
+        """Runs a planned action and returns its observation without recording it."""
         action_name = action_meta["action_name"]
         params = action_meta["params"]
         logger.info(f"Taking action: {action_name} with params: {params}")
@@ -163,29 +598,119 @@ Example:
             return None
 
         action_function = self.available_actions[action_name]["function"]
-        start_time = time.time()
         try:
-            observation = action_function(**params)
-            elapsed_time = time.time() - start_time
-            self.total_time += elapsed_time
-
-            self.context[action_name] = self.context.get(action_name, []) + [
-                observation
-            ]
-            self.log_event(f"Action Taken: {action_name}", params, observation, False)
-            return observation
+            return action_function(**params, transport=self.transport)
         except Exception as e:
             logger.warning(f"Error during action {action_name}: {str(e)}")
             return None
 
-    def update_usage_and_cost(self, response):
+    def _action_span(self, ctx: VerificationContext, action_meta, prefetch=False):
+        attrs = {"prefetch": True} if prefetch else {}
+        return self._span(
+            ctx,
+            "action",
+            action=action_meta["action_name"],
+            url=action_meta["params"].get("url"),
+            **attrs,
+        )
+
+    @staticmethod
+    def _describe_observation(span: Dict, observation):
+        if observation is None:
+            span["success"] = False
+            return
+        span["success"] = bool(observation.get("success"))
+        span["cache_hit"] = bool(observation.get("cached"))
+        stats = observation.get("stats") or {}
+        if "bytes" in stats:
+            span["bytes"] = stats["bytes"]
+        elif observation.get("content"):
+            span["bytes"] = len(observation["content"].encode("utf-8"))
+
+    def _timed_action(self, action_meta, ctx: VerificationContext, prefetch=False):
+        with self._action_span(ctx, action_meta, prefetch) as span:
+            observation = self._run_action(action_meta)
+            self._describe_observation(span, observation)
+        return observation
+
+    def take_action(self, action_meta, ctx: VerificationContext | None = None):
+        ctx = ctx or VerificationContext()
+        start_time = time.time()
+        observation = self._timed_action(action_meta, ctx)
+        self._add_usage(ctx, total_time=time.time() - start_time)
+
+        if observation is not None:
+            self._record_observation(
+                ctx, action_meta["action_name"], action_meta["params"], observation
+            )
+        return observation
+
+    def take_actions(
+        self,
+        action_plan: List[Dict],
+        ctx: VerificationContext | None = None,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        """
+        Runs the actions of a plan concurrently, at most max_concurrent_actions
+        at a time, and merges their observations into the context in plan order.
+        Actions already prefetched into ctx.prefetches are not run again; the
+        others go to `executor` (the prefetches' one) when given.
+        """
+        ctx = ctx or VerificationContext()
+        if not action_plan:
+            self._discard_prefetches(ctx)
+            return []
+
+        start_time = time.time()
+        prefetched = [self._take_prefetched(a, ctx) for a in action_plan]
+        # Unused prefetches would hold workers the plan needs
+        self._discard_prefetches(ctx)
+        own_executor = executor is None
+        if own_executor:
+            workers = min(self.max_concurrent_actions, len(action_plan))
+            executor = ThreadPoolExecutor(max_workers=workers)
+        futures = [
+            future or executor.submit(self._timed_action, a, ctx)
+            for a, future in zip(action_plan, prefetched)
+        ]
+        done, _ = wait(futures, timeout=ctx.stage_timeout("actions"))
+        # Without a deadline every action is done. With one, actions still
+        # running are abandoned: their threads end with their own HTTP timeouts
+        # and their observations are discarded.
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        observations = [
+            future.result() if future in done else None for future in futures
+        ]
+        self._add_usage(ctx, total_time=time.time() - start_time)
+        self._drop_unfinished(
+            ctx, [a for a, future in zip(action_plan, futures) if future not in done]
+        )
+
+        for action_meta, observation in zip(action_plan, observations):
+            if observation is not None:
+                self._record_observation(
+                    ctx, action_meta["action_name"], action_meta["params"], observation
+                )
+        return observations
+
+    def _drop_unfinished(self, ctx: VerificationContext, action_plan: List[Dict]):
+        for action_meta in action_plan:
+            url = action_meta["params"].get("url")
+            logger.warning(f"Dropped {action_meta['action_name']} on {url}: deadline")
+            ctx.dropped_sources.append(url)
+
+    def update_usage_and_cost(self, response, ctx: VerificationContext):
         # Extract token usage and calculate cost
         usage = response.usage
         if usage:
-            self.total_prompt_tokens += usage.prompt_tokens
-            self.total_completion_tokens += usage.completion_tokens
-            cost = self.calculate_cost(response)
-            self.total_cost += cost
+            self._add_usage(
+                ctx,
+                total_prompt_tokens=usage.prompt_tokens,
+                total_completion_tokens=usage.completion_tokens,
+                total_cost=self.calculate_cost(response),
+            )
         else:
             logger.warning("No usage data available in the response.")
 
@@ -193,7 +718,9 @@ Example:
         usage = response.usage
         if not usage:
             return 0.0
+        return self._cost_of(usage.prompt_tokens, usage.completion_tokens)
 
+    def _cost_of(self, prompt_tokens: int, completion_tokens: int) -> float:
         # Pricing per million tokens
         pricing = {
             "mistral-large-2407": {"input": 2.0, "output": 6.0},
@@ -207,39 +734,31 @@ Example:
         output_cost_per_token = model_pricing["output"] / 1_000_000
 
         cost = (
-            usage.prompt_tokens * input_cost_per_token
-            + usage.completion_tokens * output_cost_per_token
+            prompt_tokens * input_cost_per_token
+            + completion_tokens * output_cost_per_token
         )
         return cost
 
-    def verify_statement(self, statement: str):
-        total_start_time = time.time()
-        # Formulate the question from the statement
-        question = self.formulate_question(statement)
-
-        # Perform web search based on the question
-        links = self.perform_web_search(question)
-        # Proceed even if no links are found
-        if not links:
-            logger.warning("No search results found.")
-            links = []
-
-        # Plan actions using the search results
-        action_plan = self.plan_actions(question, links)
-        # Proceed even if no action plan is found
-        if not action_plan:
-            logger.warning("No action plan determined for verification.")
-            action_plan = []
-
-        # Execute the planned actions and collect observations
-        for action in action_plan:
-            self.take_action(action)
+    def render_context(self, query: str, ctx: VerificationContext) -> str:
+        """Serialises the gathered context for a prompt, keeping the passages relevant to query."""
+        if self.context_token_budget is None:
+            return json.dumps(ctx.observations, indent=2)
+        passages = select_passages(
+            ctx.observations,
+            query,
+            top_k=self.retrieval_top_k,
+            token_budget=self.context_token_budget,
+        )
+        return json.dumps(passages, indent=2)
 
+    def build_statement_prompt(
+        self, statement: str, question: str, ctx: VerificationContext
+    ) -> str:
         # Prepare the context information for the prompt
-        context_info = json.dumps(self.context, indent=2)
+        context_info = self.render_context(f"{statement}\n{question}", ctx)
 
         # Updated prompt with more descriptive information
-        prompt = f"""
+        return f"""
 As an AI verifier, you are given a statement to verify. The statement has been reformulated into a question to help gather relevant information. Use the context gathered based on this question to verify the original statement.
 
 Statement:
@@ -263,20 +782,14 @@ Based on the context, provide a verification result as a short JSON object with
     "sources": ["List of URLs used to gather the context (can be empty if none)"]
 }}
 """
-        start_time = time.time()
-        response = self.mistral_client.chat.complete(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-        )
-        elapsed_time = time.time() - start_time
-        self.total_time += elapsed_time
-
-        # Extract token usage and calculate cost
-        self.update_usage_and_cost(response)
-
-        verification_result = response.choices[0].message.content.strip()
 
+    def _parse_statement_result(
+        self,
+        verification_result: str,
+        statement: str,
+        links: List[str],
+        ctx: VerificationContext,
+    ):
         try:
             verification_data = json.loads(verification_result)
             # Ensure 'sources' is a list of strings
@@ -291,15 +804,8 @@ Based on the context, provide a verification result as a short JSON object with
                 verification_data,
                 verbose=False,
             )
-            # Clear the context after verification
-
-            total_elapsed_time = time.time() - total_start_time
-
             # Include time and cost information in the result
-            verification_data["total_time"] = round(self.total_time, 2)  # in seconds
-            verification_data["total_prompt_tokens"] = self.total_prompt_tokens
-            verification_data["total_completion_tokens"] = self.total_completion_tokens
-            verification_data["total_cost"] = round(self.total_cost, 4)  # in dollars
+            verification_data.update(ctx.usage.summary())
 
             return verification_data
         except json.JSONDecodeError as e:
@@ -320,39 +826,302 @@ Based on the context, provide a verification result as a short JSON object with
                 "confidence": "Low",
                 "explanation": "Failed to parse verification result.",
                 "sources": links,
-                "usage": {
-                    "total_time": round(self.total_time, 2),
-                    "total_prompt_tokens": self.total_prompt_tokens,
-                    "total_completion_tokens": self.total_completion_tokens,
-                    "total_cost": round(self.total_cost, 4),
-                },
+                "usage": ctx.usage.summary(),
             }
 
-    def verify_uma_vote(self, contract_description: str, message: Dict[str, str]):
-        # if there are links provided, use them to verify the statement
-        if message["sources"]:
-            self.action_plan = self.plan_actions(
-                query="Fetch more context from the sources", links=message["sources"]
+    def verify_statement(
+        self,
+        statement: str,
+        ctx: VerificationContext | None = None,
+        deadline: float | None = None,
+    ):
+        """
+        Verifies a statement. Pass a VerificationContext to inspect the plan and
+        observations afterwards; otherwise a fresh one is used and discarded.
+        The result carries the timing spans of every stage under "spans".
+        Parameters:
+            deadline (float, optional): Seconds the call may take. Stages get
+                their share of it (see context.STAGE_SHARES), actions still
+                running at their cutoff are dropped and the verdict is reached
+                from the evidence that arrived. The result then lists the
+                "dropped_sources" and is flagged "partial" if any were dropped
+                or no verdict could be reached in time.
+        """
+        ctx = ctx or VerificationContext()
+        if deadline is not None:
+            ctx.set_deadline(deadline)
+        with self._span(ctx, "verify_statement"):
+            result = self._verify_statement(statement, ctx)
+        result["spans"] = list(ctx.spans)
+        return result
+
+    def _verify_statement(self, statement: str, ctx: VerificationContext):
+        # A near-duplicate of a verified statement reuses its verdict or evidence
+        match = self._similar_statement(statement, ctx)
+        if match is not None and match["similarity"] >= self.statement_index.threshold:
+            return self._reused_result(statement, match, ctx)
+        if match is not None:
+            question, links = self._seed_evidence(statement, match, ctx)
+        else:
+            question, links = self._gather_evidence(statement, ctx)
+
+        prompt = self.build_statement_prompt(statement, question, ctx)
+        try:
+            verification_result = self._chat(
+                prompt, ctx, response_format={"type": "json_object"}, stage="verdict"
+            ).strip()
+        except TIMEOUT_ERRORS:
+            if ctx.expires_at is None:
+                raise
+            return self._late_statement_result(statement, links, ctx)
+        result = self._parse_statement_result(
+            verification_result, statement, links, ctx
+        )
+        return self._remember(statement, question, links, match, result, ctx)
+
+    def _gather_evidence(self, statement: str, ctx: VerificationContext):
+        """
+        Runs the stages before the verdict.
+        Returns:
+            tuple: The question and the search result links.
+        """
+        # Formulate the question (and in fast mode the search query) from the statement
+        if self.fast:
+            query = self.formulate_query(statement, ctx)
+            question = query["question"]
+        else:
+            query = None
+            question = self.formulate_question(statement, ctx)
+
+        # Perform web search based on the question; fast mode picks from more
+        # results, so that its preferred sources can change what is read
+        if query:
+            links = self.perform_web_search(
+                query["search_query"], FAST_SEARCH_RESULTS, ctx
             )
-            for action in self.action_plan:
-                self.take_action(action)  # this will add the sources to the context
+        else:
+            links = self.perform_web_search(question, ctx=ctx)
+        # Proceed even if no links are found
+        if not links:
+            logger.warning("No search results found.")
+            links = []
+
+        # In speculative mode the top links are read while the plan is made
+        executor = self._start_prefetch(links, ctx)
+        try:
+            # Plan actions using the search results
+            if query:
+                action_plan = self.plan_from_query(query, links, ctx)
+            else:
+                action_plan = self.plan_actions(question, links, ctx)
+            # Proceed even if no action plan is found
+            if not action_plan:
+                logger.warning("No action plan determined for verification.")
+                action_plan = []
+
+            # Execute the planned actions and collect observations
+            self.take_actions(action_plan, ctx, executor)
+        finally:
+            self._discard_prefetches(ctx)
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        return question, links
 
+    def _similar_statement(self, statement: str, ctx: VerificationContext):
+        if self.statement_index is None:
+            return None
+        with self._span(ctx, "similar_statement") as span:
+            match = self.statement_index.query(statement)
+            span["cache_hit"] = match is not None
+            if match is not None:
+                span["similarity"] = match["similarity"]
+        return match
+
+    def _reused_result(self, statement: str, match: Dict, ctx: VerificationContext):
+        cached = match["value"]
+        logger.info(
+            f"Reusing the verdict on '{cached['statement']}' "
+            f"(similarity {match['similarity']})"
+        )
+        ctx.observations = copy.deepcopy(cached["observations"])
+        result = {
+            "statement": statement,
+            **copy.deepcopy(cached["result"]),
+            **ctx.usage.summary(),
+            "reused_from": _match_origin(match),
+        }
+        return self._flag_partial(result, ctx)
+
+    def _seed_evidence(self, statement: str, match: Dict, ctx: VerificationContext):
+        """Takes a similar statement's evidence instead of gathering it."""
+        cached = match["value"]
+        logger.info(
+            f"Seeding with the evidence on '{cached['statement']}' "
+            f"(similarity {match['similarity']})"
+        )
+        ctx.observations = copy.deepcopy(cached["observations"])
+        return statement, list(cached["links"])
+
+    def _remember(
+        self,
+        statement: str,
+        question: str,
+        links: List[str],
+        match: Dict | None,
+        result: Dict,
+        ctx: VerificationContext,
+    ):
+        """Indexes a conclusive verdict for its near-duplicates; returns the result."""
+        result = self._flag_partial(result, ctx)
+        if match is not None:
+            result["seeded_from"] = _match_origin(match)
+        conclusive = result.get("result") in ("Yes", "No", "Too Early")
+        if self.statement_index is None or not conclusive or result.get("partial"):
+            return result
+        self.statement_index.add(
+            statement,
+            {
+                "statement": statement,
+                "question": question,
+                "links": list(links),
+                "result": {field: result.get(field) for field in VERDICT_FIELDS},
+                "observations": self._indexed_evidence(
+                    f"{statement}\n{question}", ctx
+                ),
+            },
+        )
+        return result
+
+    def _indexed_evidence(self, query: str, ctx: VerificationContext) -> Dict:
+        """
+        The passages the verdict prompt kept (see render_context), shaped as
+        observations, so an index entry holds a few passages instead of pages.
+        """
+        sources = select_passages(
+            ctx.observations,
+            query,
+            top_k=self.retrieval_top_k,
+            token_budget=self.context_token_budget or INDEXED_EVIDENCE_TOKENS,
+        )
+        observations = {}
+        for source in sources:
+            observation = {"url": source["url"], "success": "error" not in source}
+            if "error" in source:
+                observation["error"] = source["error"]
+            else:
+                observation["content"] = "\n\n".join(source["passages"])
+            observations.setdefault(source["action"], []).append(observation)
+        return observations
+
+    def _late_statement_result(
+        self, statement: str, links: List[str], ctx: VerificationContext
+    ):
+        logger.warning(f"No verdict on '{statement}' before the deadline")
+        result = {
+            "statement": statement,
+            "result": "Unknown",
+            "confidence": "Low",
+            "explanation": "The deadline passed before a verdict could be reached.",
+            "sources": links,
+            **ctx.usage.summary(),
+        }
+        return self._flag_partial(result, ctx, verdict=False)
+
+    @staticmethod
+    def _flag_partial(result: Dict, ctx: VerificationContext, verdict=True):
+        if ctx.expires_at is not None:
+            result["dropped_sources"] = list(ctx.dropped_sources)
+            result["partial"] = bool(ctx.dropped_sources) or not verdict
+        return result
+
+    def _failed_statement_result(self, statement: str, error: Exception):
+        logger.error(f"Verification of '{statement}' failed: {str(error)}")
+        return {
+            "statement": statement,
+            "result": "Unknown",
+            "confidence": "Low",
+            "explanation": f"Verification failed: {str(error)}",
+            "sources": [],
+        }
+
+    def _verify_batch_item(self, statement: str, deadline: float | None = None):
+        ctx = VerificationContext(deadline)
+        try:
+            result = self.verify_statement(statement, ctx)
+        except Exception as e:
+            result = self._failed_statement_result(statement, e)
+            result["spans"] = list(ctx.spans)
+        result["usage"] = ctx.usage.summary()
+        return result
+
+    def iter_verify_statements(
+        self,
+        statements: List[str],
+        concurrency: int = 4,
+        deadline: float | None = None,
+    ):
+        """
+        Verifies statements with at most `concurrency` in flight and yields
+        (index, result) pairs as they complete. Each result carries its own
+        "usage"; the agent's usage accumulates across the batch. `deadline`
+        bounds each verification from when it starts, as in verify_statement.
+        """
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        try:
+            futures = {
+                executor.submit(self._verify_batch_item, statement, deadline): index
+                for index, statement in enumerate(statements)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def verify_statements(
+        self,
+        statements: List[str],
+        concurrency: int = 4,
+        deadline: float | None = None,
+    ):
+        """
+        Verifies a batch of statements concurrently.
+        Returns:
+            dict: "results" in input order, each with its own "usage", and an
+            aggregate "usage" for the whole batch.
+        """
+        start_time = time.time()
+        results = [None] * len(statements)
+        for index, result in self.iter_verify_statements(
+            statements, concurrency, deadline
+        ):
+            results[index] = result
+        return {"results": results, "usage": _aggregate_usage(results, start_time)}
+
+    def build_uma_vote_prompt(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext,
+    ) -> str:
         # Prepare the context information for the prompt
-        context_info = json.dumps(self.context, indent=2)
+        query = " ".join(
+            [
+                contract_description,
+                message.get("evidence") or message.get("Evidence", ""),
+                message.get("rationale") or message.get("Rationale", ""),
+            ]
+        )
+        context_info = self.render_context(query, ctx)
 
         # Prepare the prompt for the language model
-        prompt = f"""
+        return f"""
 You are an AI agent tasked with verifying whether the P value provided in a UMA vote is correct based on the contract description and the evidence provided.
 
 Contract Description:
 {contract_description}
 
 Vote Message:
-user: {message.get('user', 'Unknown')}
-timestamp: {message.get('timestamp', 'Unknown')}
-P value submitted: {message.get('P', '')}
-evidence: {message.get('Evidence', '')}
-rationale: {message.get('Rationale', '')}
+{_render_vote(message)}
 
 Context (information gathered from the sources):
 {context_info}
@@ -375,22 +1144,10 @@ Provide your response in the following JSON format:
 }}
 Return in short JSON object.
 """
-        # Call the language model
-        start_time = time.time()
-        response = self.mistral_client.chat.complete(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-        )
-        elapsed_time = time.time() - start_time
-        self.total_time += elapsed_time
-
-        # Extract token usage and calculate cost
-        self.update_usage_and_cost(response)
 
-        # Parse the response
+    def _parse_uma_vote_result(self, content: str, message: Dict[str, str]):
         try:
-            verification_result = json.loads(response.choices[0].message.content)
+            verification_result = json.loads(content)
             self.log_event(
                 "Verify UMA Vote",
                 {
@@ -400,7 +1157,6 @@ Return in short JSON object.
                 verification_result,
                 verbose=False,
             )
-            # self.context.clear()
             return verification_result
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse verification result: {str(e)}")
@@ -413,8 +1169,6 @@ Return in short JSON object.
                 "Failed to parse verification result",
                 verbose=False,
             )
-            # Clear the context after verification
-            self.context.clear()
             # Return a default result indicating the failure
             return {
                 "voted_P": message.get("P", ""),
@@ -423,6 +1177,387 @@ Return in short JSON object.
                 "explanation": "Failed to parse verification result.",
             }
 
+    def verify_uma_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext | None = None,
+    ):
+        ctx = ctx or VerificationContext()
+        with self._span(ctx, "verify_uma_vote"):
+            result = self._verify_uma_vote(contract_description, message, ctx)
+        result["spans"] = list(ctx.spans)
+        return result
+
+    def _verify_uma_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext,
+    ):
+        self._fetch_sources(message["sources"], ctx)
+        return self._judge_uma_vote(contract_description, message, ctx)
+
+    def _fetch_sources(self, sources: List[str], ctx: VerificationContext):
+        # if there are links provided, use them to verify the statement
+        if sources:
+            action_plan = self.plan_actions(
+                "Fetch more context from the sources", sources, ctx
+            )
+            # this will add the sources to the context
+            self.take_actions(action_plan, ctx)
+
+    def _judge_uma_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        ctx: VerificationContext,
+    ):
+        prompt = self.build_uma_vote_prompt(contract_description, message, ctx)
+        # Call the language model
+        content = self._chat(
+            prompt, ctx, response_format={"type": "json_object"}, stage="verdict"
+        )
+        # Parse the response
+        return self._parse_uma_vote_result(content, message)
+
+    def _failed_vote_result(self, message: Dict[str, str], error: Exception):
+        logger.error(f"Verification of vote by {message.get('user')} failed: {error}")
+        return {
+            "voted_P": message.get("P", ""),
+            "is_correct": False,
+            "confidence": "Low",
+            "explanation": f"Verification failed: {str(error)}",
+        }
+
+    def _evidence_context(self, evidence: VerificationContext):
+        """A fresh vote context that sees every observation in the shared pool."""
+        ctx = VerificationContext()
+        for action_name, observations in evidence.observations.items():
+            ctx.observations[action_name] = list(observations)
+        return ctx
+
+    def _verify_discussion_vote(
+        self,
+        contract_description: str,
+        message: Dict[str, str],
+        evidence: VerificationContext,
+    ):
+        ctx = self._evidence_context(evidence)
+        try:
+            with self._span(ctx, "verify_uma_vote"):
+                result = self._judge_uma_vote(contract_description, message, ctx)
+        except Exception as e:
+            result = self._failed_vote_result(message, e)
+        result["spans"] = list(ctx.spans)
+        result["usage"] = ctx.usage.summary()
+        return [result], ctx
+
+    def build_uma_votes_prompt(
+        self,
+        contract_description: str,
+        messages: List[Dict[str, str]],
+        ctx: VerificationContext,
+    ) -> str:
+        """One prompt judging several votes against a shared contract description."""
+        query = " ".join(
+            [contract_description]
+            + [
+                f"{message.get('evidence', '')} {message.get('rationale', '')}"
+                for message in messages
+            ]
+        )
+        context_info = self.render_context(query, ctx)
+        votes = "\n\n".join(
+            f"[{number}]\n{_render_vote(message)}"
+            for number, message in enumerate(messages, start=1)
+        )
+
+        return f"""
+You are an AI agent tasked with verifying whether the P values provided in several UMA votes are correct based on the contract description and the evidence provided.
+
+Contract Description:
+{contract_description}
+
+Context (information gathered from the sources):
+{context_info}
+
+Vote Messages:
+{votes}
+
+Instructions:
+- Analyze the contract description and understand the criteria for each P value (P1, P2, P3, P4).
+- Each message should contain P1, P2, P3, or P4. Note that description of P4 might missing in the contract description.
+- Judge every vote independently: evaluate its evidence, rationale and the context from sources.
+- Determine if the submitted P value is correct based on the contract description, evidence, and rationale.
+- If there is insufficient information to verify a vote, state that the verification is not possible.
+- Provide a confidence level for each vote based on the analysis.
+Provide your response in the following JSON format, with one entry per vote in the order given:
+
+{{
+    "votes": [
+        {{
+            "vote": 1,
+            "voted_P": "Px",
+            "is_correct": true/false,
+            "confidence": "Low"/"Medium"/"High",
+            "explanation": "Your explanation here."
+        }}
+    ]
+}}
+Return in short JSON object.
+"""
+
+    def _parse_uma_votes_result(self, content: str, messages: List[Dict[str, str]]):
+        """Per-vote results in message order; votes missing from the reply are marked failed."""
+        try:
+            entries = json.loads(content).get("votes", [])
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error(f"Failed to parse packed verification result: {str(e)}")
+            entries = []
+
+        by_number = {}
+        for position, entry in enumerate(entries, start=1):
+            if not isinstance(entry, dict):
+                continue
+            try:
+                number = int(entry.pop("vote", position))
+            except (TypeError, ValueError):
+                number = position
+            by_number.setdefault(number, entry)
+        results = []
+        for number, message in enumerate(messages, start=1):
+            entry = by_number.get(number)
+            if entry is None:
+                entry = {
+                    "voted_P": message.get("P", ""),
+                    "is_correct": False,
+                    "confidence": "Low",
+                    "explanation": "Failed to parse verification result.",
+                }
+            results.append(entry)
+        self.log_event("Verify UMA Votes", f"{len(messages)} votes", results, False)
+        return results
+
+    def _vote_packs(
+        self,
+        contract_description: str,
+        messages: List[Dict[str, str]],
+        evidence: VerificationContext,
+        token_budget: int,
+    ) -> List[List[int]]:
+        """
+        Groups message indexes into packs whose prompt and expected reply fit
+        in token_budget (capped at the model's context window).
+        """
+        budget = min(token_budget, MODEL_CONTEXT_TOKENS.get(self.model, 32_000))
+        if self.context_token_budget is None:
+            context_tokens = estimate_tokens(json.dumps(evidence.observations))
+        else:
+            context_tokens = self.context_token_budget
+        fixed = (
+            PACKED_PROMPT_TOKENS + estimate_tokens(contract_description) + context_tokens
+        )
+        costs = [
+            estimate_tokens(_render_vote(message)) + PACKED_VOTE_REPLY_TOKENS
+            for message in messages
+        ]
+        return _pack_by_budget(costs, budget - fixed)
+
+    def _verify_vote_pack(
+        self,
+        contract_description: str,
+        messages: List[Dict[str, str]],
+        evidence: VerificationContext,
+    ):
+        ctx = self._evidence_context(evidence)
+        try:
+            with self._span(ctx, "verify_uma_votes", votes=len(messages)):
+                prompt = self.build_uma_votes_prompt(
+                    contract_description, messages, ctx
+                )
+                content = self._chat(
+                    prompt,
+                    ctx,
+                    response_format={"type": "json_object"},
+                    stage="verdict",
+                )
+            results = self._parse_uma_votes_result(content, messages)
+        except Exception as e:
+            results = [self._failed_vote_result(message, e) for message in messages]
+        return results, ctx
+
+    def verify_discussion(
+        self,
+        parsed: Dict,
+        concurrency: int = 4,
+        pack_token_budget: int | None = None,
+        on_result=None,
+    ):
+        """
+        Verifies every vote of a DiscussionParser output.
+        Source URLs cited across all messages are deduplicated and fetched once,
+        in parallel; the votes are then judged concurrently against that shared
+        evidence pool.
+        Parameters:
+            parsed (dict): {"description", "messages"} as returned by DiscussionParser.parse.
+            concurrency (int): Prompts sent at the same time.
+            pack_token_budget (int, optional): Pack several votes into each prompt,
+                sharing one contract description, within this many tokens.
+                By default every vote gets its own prompt.
+            on_result (callable, optional): Called as on_result(index, result)
+                from the calling thread as soon as each vote is judged, in
+                completion order, e.g. to stream results into a UI.
+        Returns:
+            dict: "results" (one per message, in order), "sources" (the unique
+            URLs fetched), "spans" of the shared fetch and the aggregate "usage".
+        """
+        start_time = time.time()
+        description, messages = parsed["description"], parsed["messages"]
+        evidence = VerificationContext()
+        sources = discussion_sources(messages)
+        self._fetch_sources(sources, evidence)
+
+        if pack_token_budget is None:
+            packs = [[index] for index in range(len(messages))]
+            jobs = [
+                lambda message=message: self._verify_discussion_vote(
+                    description, message, evidence
+                )
+                for message in messages
+            ]
+        else:
+            packs = self._vote_packs(description, messages, evidence, pack_token_budget)
+            jobs = [
+                lambda pack=pack: self._verify_vote_pack(
+                    description, [messages[i] for i in pack], evidence
+                )
+                for pack in packs
+            ]
+        outcomes = [None] * len(jobs)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = {
+                executor.submit(job): position for position, job in enumerate(jobs)
+            }
+            for future in as_completed(futures):
+                position = futures[future]
+                outcomes[position] = future.result()
+                if on_result is not None:
+                    for index, result in zip(packs[position], outcomes[position][0]):
+                        on_result(index, result)
+        return _discussion_result(outcomes, sources, evidence, start_time)
+
+
+def discussion_sources(messages: List[Dict]) -> List[str]:
+    """Unique source URLs cited across messages, in first-cited order."""
+    return list(
+        dict.fromkeys(
+            url for message in messages for url in message.get("sources") or []
+        )
+    )
+
+
+def _match_origin(match: Dict) -> Dict:
+    return {"statement": match["value"]["statement"], "similarity": match["similarity"]}
+
+
+def direct_query(statement: str) -> Dict | None:
+    """The fast mode query for a statement that already is a yes/no question."""
+    statement = statement.strip()
+    if not YES_NO_QUESTION.match(statement):
+        return None
+    return {"question": statement, "search_query": statement, "preferred_sources": []}
+
+
+def parse_query(content: str, statement: str) -> Dict:
+    """Reads a formulate_query reply, falling back to the statement itself."""
+    try:
+        data = json.loads(content)
+    except (json.JSONDecodeError, TypeError):
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    question = str(data.get("question") or "").strip() or statement
+    preferred = data.get("preferred_sources")
+    if not isinstance(preferred, list):
+        preferred = []
+    return {
+        "question": question,
+        "search_query": str(data.get("search_query") or "").strip() or question,
+        "preferred_sources": [str(domain) for domain in preferred if domain],
+    }
+
+
+def action_key(action_meta: Dict) -> str:
+    """Identifies a planned action by its name and parameters."""
+    return json.dumps(
+        [action_meta["action_name"], action_meta.get("params", {})], sort_keys=True
+    )
+
+
+def _render_vote(message: Dict[str, str]) -> str:
+    return f"""user: {message.get('user', 'Unknown')}
+timestamp: {message.get('timestamp', 'Unknown')}
+P value submitted: {message.get('P', '')}
+evidence: {message.get('evidence') or message.get('Evidence', '')}
+rationale: {message.get('rationale') or message.get('Rationale', '')}"""
+
+
+def _pack_by_budget(costs: List[int], capacity: int) -> List[List[int]]:
+    """Greedily groups consecutive indexes so each group's cost fits in capacity."""
+    packs, current, used = [], [], 0
+    for index, cost in enumerate(costs):
+        if current and used + cost > capacity:
+            packs.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _discussion_result(outcomes, sources, evidence, start_time: float) -> Dict:
+    """Merges (results, ctx) outcomes, one per prompt, into a discussion result."""
+    usage = Usage()
+    usage.merge(evidence.usage)
+    for _, ctx in outcomes:
+        usage.merge(ctx.usage)
+    results = [result for results, _ in outcomes for result in results]
+    return {
+        "results": results,
+        "sources": sources,
+        "spans": list(evidence.spans),
+        "usage": {
+            "votes": len(results),
+            "prompts": len(outcomes),
+            "unique_sources": len(sources),
+            "wall_time": round(time.time() - start_time, 2),
+            **usage.summary(),
+        },
+    }
+
+
+def normalize_query(query: str) -> str:
+    """
+    Folds case, punctuation, whitespace and stopwords so that reformulations
+    such as "Is the Earth flat?" and "is earth flat" share a search cache entry.
+    """
+    words = re.findall(r"\w+", query.lower())
+    kept = [word for word in words if word not in STOPWORDS]
+    return " ".join(kept or words)
+
+
+def _aggregate_usage(results: List[Dict], start_time: float) -> Dict:
+    usages = [result["usage"] for result in results]
+    aggregate = {
+        "statements": len(results),
+        "wall_time": round(time.time() - start_time, 2),
+    }
+    for key in usages[0] if usages else []:
+        aggregate[key] = round(sum(u[key] for u in usages), 4)
+    return aggregate
+
 
 if __name__ == "__main__":
     verifier_agent = VerifierAgent()